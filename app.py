@@ -1,225 +1,341 @@
-from tkinter import font
 import dash
 from dash import html
 import dash_bootstrap_components as dbc
-from html_structure import get_3d_fig, get_main_layout
-import pandas as pd
+from html_structure import get_app_layout
 
-from dash.dependencies import Input, Output, State, MATCH, ALL
+from dash.dependencies import Input, Output, State, MATCH, ALL, ClientsideFunction
 from dash.exceptions import PreventUpdate
 
-from data.mock_data import get_steps
+from urllib.parse import parse_qs
 
-app = dash.Dash(
-    external_stylesheets=[
-        "assets/bootstrap.css",
-        dbc.icons.BOOTSTRAP, 
-        dbc.icons.FONT_AWESOME,
-    ]
-)
-# create html
-app.layout = get_main_layout()
+import config
+from asset_build import get_dash_assets, get_manifest, register_route as register_assets_route
+from background_jobs import get_manager as get_background_manager
+from figure_cache import figure_cache
+from helper_functions import get_progressive_fig_patch, get_refinement_patch, get_step_details
+from layout_cache import layout_cache
+from mesh_cache import mesh_cache
+from mesh_lod import get_lod
+from metrics import instrument_server, metrics, timed_callback
+from warmup import readiness, warm_up
 
+# cache counters, read when /metrics is scraped
+metrics.register_collector(lambda: {
+    "mesh_cache_bytes": mesh_cache.nbytes,
+    "mesh_cache_hits_total": mesh_cache.hits,
+    "mesh_cache_misses_total": mesh_cache.misses,
+    "figure_cache_entries": figure_cache.stats()["entries"],
+    "figure_cache_bytes": figure_cache.nbytes,
+    "figure_cache_builds_total": figure_cache.builds,
+    "figure_cache_evictions_total": figure_cache.evictions,
+    "warmup_seconds": readiness.warmup_s or 0,
+})
 
 
 # =======================
 # CALLBACKS
 # =======================
+# collected here and registered on every app created by create_app()
 
-# the callback block always refers to the function below
-@app.callback(
-    Output({"type": "minimizable_div", "index": MATCH}, "style"),
-    Output({"type": "minimized_div", "index": MATCH}, "style"),
-    Input({"type": "minimize_button", "index": MATCH}, "n_clicks"),
-    Input({"type": "maximize_button", "index": MATCH}, "n_clicks"),
-    State({"type": "minimizable_div", "index": MATCH}, "id"),
-    State({"type": "minimizable_div", "index": MATCH}, "style"),
-    State({"type": "minimized_div", "index": MATCH}, "style"),
-    prevent_initial_call=True
-)
-def on_showhide_divs(n_clicks_minimize, n_clicks_maximize, id_minimizable, style_minimizable, style_minimized):
-    """ triggered by minimize_buttons
-        hides the div to minimizes and shows the minimized div
-    """ 
-    event_button_id = dash.callback_context.triggered_id
-    # if event_button_id is None:
-    #     raise PreventUpdate("")
-    
-    # Check if the minimize button or the maximize button was clicked
-    if event_button_id["type"] == "minimize_button":
-        # Hide the minimizable div
-        if style_minimizable is None:
-            style_minimizable = {"display": "none"}
-        else:
-            style_minimizable.update({"display": "none"})
-            
-        # Show the minimized div
-        if style_minimized is None:
-            style_minimized = {}
-        else:
-            del style_minimized["display"]
-    
-    elif event_button_id["type"] == "maximize_button":
-        # Show the minimizable div
-        if style_minimizable is None:
-            style_minimizable = {}
-        else:
-            del style_minimizable["display"]
-            
-        # Hide the minimized div
-        if style_minimized is None:
-            style_minimized = {"display": "none"}
-        else:
-            style_minimized.update({"display": "none"})
-            
-    return style_minimizable, style_minimized
-
-@app.callback(
-    Output("col_body_left", "width"),
-    Output("col_body_center", "width"),
-    Output("col_body_right", "width"),
-    Input({"type": "minimizable_div", "index": ALL}, "style"),
-    State({"type": "minimizable_div", "index": ALL}, "id"),
-    prevent_initial_call=True
+_callbacks = []
+_clientside_callbacks = []
+
+
+def callback(*args, **kwargs):
+    """ same arguments as app.callback
+    """
+    def decorator(function):
+        _callbacks.append((args, kwargs, function))
+        return function
+    return decorator
+
+
+def clientside_callback(*args, **kwargs):
+    """ same arguments as app.clientside_callback
+    """
+    _clientside_callbacks.append((args, kwargs))
+
+
+def skip_callback(*args, **kwargs):
+    """ stands in for callback if a callback is resolved clientside instead
+    """
+    return lambda function: function
+
+# the graph is updated on the server unless the browser loads or switches the step figures itself
+graph_callback = callback if config.STEP_NAVIGATION == "server" else skip_callback
+# the step details are resolved on the server unless steps are navigated entirely in the browser
+step_callback = callback if config.STEP_NAVIGATION != "client" else skip_callback
+# the proxies of progressive step changes are refined by the server
+refine_callback = graph_callback if config.PROGRESSIVE_PROXY != "off" else skip_callback
+# the figures are built in background jobs (see background_jobs.py), whose result the browser polls
+figure_build = {"background": True, "interval": config.BACKGROUND_POLL_MS} if config.BACKGROUND_CALLBACKS else {}
+
+
+@callback(
+    Output("page", "children"),
+    Input("url", "search"),
+    Input("lod", "data"),
 )
-def on_div_minimized(minimizable_divs_styles, minimizable_divs_ids):
-    """ triggered after minimizable_div was opened oder closed
-        sets the column size to strech the visualization
+def render_page(search, lod):
+    """ creates the page of the product of the ?product= url parameter
+        in the level of detail of the client, from the snapshot of the layout
     """
-    
-    indices = [id["index"] for id in minimizable_divs_ids]
-    index_style_dict = {idx: style for idx, style in zip(indices, minimizable_divs_styles)}
-    
-    # Now we have a dict of
-    # { 
-    #   'div_1': { 'display': 'none', ...},
-    #   'div_2': { 'display': 'none', ...},
-    #   'div_3': { 'display': 'block', ...},
-    #   ...
-    # } 
-    
-    if index_style_dict["div_productmetadata"] is not None and "display" in index_style_dict["div_productmetadata"] and index_style_dict["div_productmetadata"]["display"] == "none" \
-        and index_style_dict["div_materiallist"] is not None and "display" in index_style_dict["div_materiallist"] and index_style_dict["div_materiallist"]["display"] == "none":
-        width_col_left = 1
-    else:
-        width_col_left = 3
-        
-    if index_style_dict["div_tools"] is not None and "display" in index_style_dict["div_tools"] and index_style_dict["div_tools"]["display"] == "none" \
-        and index_style_dict["div_steplist"] is not None and "display" in index_style_dict["div_steplist"] and index_style_dict["div_steplist"]["display"] == "none":
-        width_col_right = 1
-    else:
-        width_col_right = 3
-        
-    width_col_center = 12 - width_col_left - width_col_right
-    
-    return width_col_left, width_col_center, width_col_right
+    product_key = parse_qs((search or "").lstrip("?")).get("product", [None])[0]
+    return layout_cache.get(product_key, get_lod(lod))
 
 
-@app.callback(
+@graph_callback(
     Output("graph", "figure"),
     Output("current_step", "data"),
+    Output("refine_parts", "data"),
     Input({"type": "step_button", "index": ALL}, "n_clicks"),
     Input({"type": "step_nav_button", "index": ALL}, "n_clicks"),
-    prevent_initial_call=True
+    State("current_step", "data"),
+    State("lod", "data"),
+    State("product", "data"),
+    State("refine_parts", "data"),
+    prevent_initial_call=True,
+    **figure_build
 )
-def onclick_step_button(n_clicks1, n_clicks2):
+def onclick_step_button(n_clicks1, n_clicks2, previous_step_id, lod, product_key, refine_parts):
     """ triggered by clicking any step button or the step arrows
         updates graph and current step variable
+        the graph only receives the parts that were added or removed since the previous step,
+        on big step changes as proxies first (config.PROGRESSIVE_PROXY), see on_refine_interval
     """
     event_button_id = dash.callback_context.triggered_id
     # if event_button_id is None:
     #     raise PreventUpdate("")
     
     step_id = event_button_id["index"]
-    fig = get_3d_fig(step_id)
+    # proxies of the previous step that were not refined yet
+    unrefined = refine_parts["parts"] if refine_parts and refine_parts["step"] == previous_step_id else []
+    fig, unrefined = get_progressive_fig_patch(previous_step_id, step_id, get_lod(lod), product_key, unrefined)
     
-    return fig, step_id
+    return fig, step_id, {"step": step_id, "parts": unrefined}
 
 
-@app.callback(
+@refine_callback(
+    Output("graph", "figure", allow_duplicate=True),
+    Output("refine_parts", "data", allow_duplicate=True),
+    Output("refine_interval", "max_intervals"),
+    Input("current_step", "data"),
+    Input("refine_interval", "n_intervals"),
+    State("refine_parts", "data"),
+    State("lod", "data"),
+    State("product", "data"),
+    prevent_initial_call=True,
+    **figure_build
+)
+def on_refine_interval(current_step_id, n_intervals, refine_parts, lod, product_key):
+    """ triggered by the change to a new step and by the refine interval
+        replaces the proxies of the current step by the full geometry, PROGRESSIVE_BATCH_PARTS parts at a time
+        the interval is started again for a single tick by every update, so the requests never overlap
+        (a request still running when the step changes is dropped by dash)
+    """
+    if refine_parts["step"] != current_step_id or not refine_parts["parts"]:
+        raise PreventUpdate
+
+    batch = max(1, config.PROGRESSIVE_BATCH_PARTS)
+    refined_names, unrefined = refine_parts["parts"][:batch], refine_parts["parts"][batch:]
+    fig = get_refinement_patch(current_step_id, refined_names, get_lod(lod), product_key)
+
+    return fig, {"step": current_step_id, "parts": unrefined}, (n_intervals or 0) + 1 if unrefined else dash.no_update
+
+
+@step_callback(
     Output("div_step_description_stepname", "children"),
     Output("div_step_description_steptext", "children"),
     Output("div_tools_name", "children"),
     Output("div_tools_img", "src"),
+    Output("div_tools_img", "srcSet"),
     Output("div_danger_img", "src"),
+    Output("div_danger_img", "srcSet"),
     Output("p_notifs", "children"),
     Output("i_notifs", "className"),
     Output("div_notifs", "className"),
-    Input("current_step", "data")
+    Input("current_step", "data"),
+    State("product", "data"),
 )
-def on_step_changed(current_step_id):
+def on_step_changed(current_step_id, product_key):
     """ triggered by the change to a new step
         defines the new updated changes which (can) occur by switching to another step
         e.g. show critical hints and update step description
     """
     # Display step name and text in box under the graph
-    df_steps = get_steps()
-    step_name = df_steps.loc[current_step_id]["name"]
-    step_description = df_steps.loc[current_step_id]["description"]
-    
-    step_tools_name = df_steps.loc[current_step_id]["tools"]
-    step_tools_img = df_steps.loc[current_step_id]["tools_img_path"]
-    notifs = df_steps.loc[current_step_id]["notifications"]
-    
-    if not pd.isna(notifs):
-        i_notifs_class = "fa-solid fa-triangle-exclamation"
-        div_notifs_class = "border_div_notifs"
-    else:
-        i_notifs_class = ""
-        div_notifs_class = "no_border_div_notifs"
-    
-    
-    if not pd.isna(step_tools_img):
-        step_tools_img = "assets/img/" + step_tools_img
-    else:
-        step_tools_img = ""
-        
-    if current_step_id == "step14":
-        danger_img = "assets/img/danger.png"
-    else:
-        danger_img = ""
-        
-    
-    return step_name, step_description, step_tools_name, step_tools_img, danger_img, notifs, i_notifs_class, div_notifs_class
+    return get_step_details(current_step_id, product_key)
 
-@app.callback(
+
+# =======================
+# CLIENTSIDE CALLBACKS
+# =======================
+# resolved in the browser (assets/clientside.js), they only need data the page already holds
+
+# minimize and maximize buttons hide a div and show its minimized bar (or the other way round)
+clientside_callback(
+    ClientsideFunction(namespace="panels", function_name="on_showhide_divs"),
+    Output({"type": "minimizable_div", "index": MATCH}, "style"),
+    Output({"type": "minimized_div", "index": MATCH}, "style"),
+    Input({"type": "minimize_button", "index": MATCH}, "n_clicks"),
+    Input({"type": "maximize_button", "index": MATCH}, "n_clicks"),
+    State({"type": "minimizable_div", "index": MATCH}, "style"),
+    State({"type": "minimized_div", "index": MATCH}, "style"),
+    prevent_initial_call=True
+)
+
+# the visualization is stretched over the columns whose divs are all minimized
+clientside_callback(
+    ClientsideFunction(namespace="panels", function_name="on_div_minimized"),
+    Output("col_body_left", "width"),
+    Output("col_body_center", "width"),
+    Output("col_body_right", "width"),
+    Input({"type": "minimizable_div", "index": ALL}, "style"),
+    State({"type": "minimizable_div", "index": ALL}, "id"),
+    prevent_initial_call=True
+)
+
+# colors the button of the current step and points the step arrows to the previous and next step
+clientside_callback(
+    ClientsideFunction(namespace="steps", function_name="on_step_changed_2"),
     Output({"type": "step_button", "index": ALL}, "color"),
     Output({"type": "step_nav_button", "index": ALL}, "id"),
     Input("current_step", "data"),
     State({"type": "step_button", "index": ALL}, "id"),
     State({"type": "step_nav_button", "index": ALL}, "id"),
 )
-def on_step_changed_2(current_step_id, step_button_ids, tmp):
-    """ triggered by the change to a new step
-        sets step button color and re-calculates which step occurs after the step-nav-arrows
-    """
-    
-    # Extract the index from the id 
-    button_indices = [id["index"] for id in step_button_ids]
-    
-    button_colors_new = []
-    for button_index in button_indices:
-        if button_index == current_step_id:
-            button_colors_new.append("primary")
-        else:
-            button_colors_new.append("secondary")
-            
-    # Change step navigation button ID.
-    # Set the ID of the back navigation button to the previous step
-    
-    # Extract the index from the id 
-    button_indices = [id["index"] for id in step_button_ids]
-    
-    i = button_indices.index(current_step_id)
-    previous_button_index = {"type": "step_nav_button", "index": button_indices[i-1]}
-    next_button_index = {"type": "step_nav_button", "index": button_indices[i+1]}
-    
-    return button_colors_new, [previous_button_index, next_button_index]
-    
+
+# the images of all steps are preloaded once the step list is shown, and the time from a step change
+# to its loaded images is reported to the metrics
+clientside_callback(
+    ClientsideFunction(namespace="images", function_name="on_step_images"),
+    Output("step_images_preloaded", "data"),
+    Input("current_step", "data"),
+    Input({"type": "minimizable_div", "index": "div_steplist"}, "style"),
+    State("step_images", "data"),
+    State("step_images_preloaded", "data"),
+)
+
+# time from a step click to the first visible model of the step and to its fully refined model,
+# reported to the metrics
+if config.STEP_NAVIGATION == "server":
+    clientside_callback(
+        ClientsideFunction(namespace="progressive", function_name="on_model_changed"),
+        Output("model_timing", "data"),
+        Input({"type": "step_button", "index": ALL}, "n_clicks"),
+        Input({"type": "step_nav_button", "index": ALL}, "n_clicks"),
+        Input("graph", "figure"),
+        State("current_step", "data"),
+        State("refine_parts", "data"),
+        State("model_timing", "data"),
+        prevent_initial_call=True
+    )
+
+# level of detail from the ?lod= url parameter, or a lower one for devices with little memory or few cores
+clientside_callback(
+    ClientsideFunction(namespace="lod", function_name="detect_lod"),
+    Output("lod", "data"),
+    Input("url", "search"),
+)
+
+# choosing another product loads its page (?product=<key>)
+clientside_callback(
+    ClientsideFunction(namespace="product", function_name="select_product"),
+    Output("url", "search"),
+    Input("dd_product_variant", "value"),
+    State("url", "search"),
+    prevent_initial_call=True
+)
+
+# same behavior as the step callbacks above
+if config.STEP_NAVIGATION == "cached":
+    clientside_callback(
+        ClientsideFunction(namespace="steps", function_name="fetch_step_figure"),
+        Output("graph", "figure"),
+        Output("current_step", "data"),
+        Input({"type": "step_button", "index": ALL}, "n_clicks"),
+        Input({"type": "step_nav_button", "index": ALL}, "n_clicks"),
+        State("lod", "data"),
+        State("product", "data"),
+        prevent_initial_call=True
+    )
+
+if config.STEP_NAVIGATION == "client":
+    clientside_callback(
+        ClientsideFunction(namespace="steps", function_name="onclick_step_button"),
+        Output("graph", "figure"),
+        Output("current_step", "data"),
+        Input({"type": "step_button", "index": ALL}, "n_clicks"),
+        Input({"type": "step_nav_button", "index": ALL}, "n_clicks"),
+        State("client_steps", "data"),
+        prevent_initial_call=True
+    )
+
+    clientside_callback(
+        ClientsideFunction(namespace="steps", function_name="on_step_changed"),
+        Output("div_step_description_stepname", "children"),
+        Output("div_step_description_steptext", "children"),
+        Output("div_tools_name", "children"),
+        Output("div_tools_img", "src"),
+        Output("div_tools_img", "srcSet"),
+        Output("div_danger_img", "src"),
+        Output("div_danger_img", "srcSet"),
+        Output("p_notifs", "children"),
+        Output("i_notifs", "className"),
+        Output("div_notifs", "className"),
+        Input("current_step", "data"),
+        State("client_steps", "data"),
+    )
 
 # ===================
 # END OF CALLBACKS
 # ===================
 
+
+def create_app(app_env : str = None) -> dash.Dash:
+    """ creates the dash app with all callbacks and routes
+        app_env "dev" warms the caches in the background, "prod" before returning
+        (default: config.APP_ENV)
+    """
+
+    app_env = app_env or config.APP_ENV
+    # purged, hashed and precompressed css/js of python asset_build.py build, otherwise assets/*.css and assets/*.js
+    built_assets = get_dash_assets(get_manifest())
+
+    app = dash.Dash(
+        __name__,
+        external_stylesheets=[
+            *built_assets.pop("external_stylesheets"),
+            dbc.icons.BOOTSTRAP, 
+            dbc.icons.FONT_AWESOME,
+        ],
+        compress=True,  # gzip/brotli for callback responses and assets (Flask-Compress)
+        # superseded figure builds are cancelled, the running and cancelled jobs are counted at /metrics
+        background_callback_manager=get_background_manager() if config.BACKGROUND_CALLBACKS else None,
+        # the components of the page are created by the render_page callback
+        suppress_callback_exceptions=True,
+        **built_assets,
+    )
+    # create html, the page shell is served by a function so nothing is built before the first request
+    app.layout = get_app_layout
+
+    for args, kwargs, function in _callbacks:
+        app.callback(*args, **kwargs)(timed_callback(function) if config.METRICS_ENABLED else function)
+    for args, kwargs in _clientside_callbacks:
+        app.clientside_callback(*args, **kwargs)
+
+    # callback and request histograms at /metrics
+    if config.METRICS_ENABLED:
+        instrument_server(app.server)
+    # precompressed step figures, served at /figures/<product_key>/<step_id>.json
+    figure_cache.register_route(app.server)
+    # built assets with long-lived cache headers, at /assets-build/<hashed name>
+    register_assets_route(app.server)
+    # 503 until the caches are warm
+    readiness.register_route(app.server)
+
+    warm_up(background=app_env == "dev", freeze=app_env == "prod")
+    return app
+
+
 if __name__ == "__main__": 
-    app.run_server(debug=True)
\ No newline at end of file
+    create_app().run_server(debug=config.APP_ENV == "dev")
\ No newline at end of file
@@ -0,0 +1,522 @@
+""" build of the static assets: purged and minified css, the font weights the css uses,
+    webp versions of the step images in the sizes they are displayed in,
+    content-hashed file names and precompressed .gz/.br siblings
+
+    build it (again) after changing the css/js files in assets/ or the components of the layout:
+        python asset_build.py build
+    without a build the files in assets/ are served as they are
+
+    the css of assets/*.css is merged (in the order dash would include it) and every rule whose
+    classes or ids don't occur in the layout, the python sources of the layout or the js files is dropped,
+    the classes that dash-bootstrap-components adds itself are kept by SAFELIST
+"""
+import argparse
+import functools
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+from typing import Iterable, List, Optional, Set, Tuple
+
+import brotli
+from flask import Flask, Response, abort, request
+
+import config
+
+ASSETS_PATH = os.path.join(".", "assets")
+BUILD_PATH = os.path.join(".", "assets_build")
+BUILD_URL = "/assets-build/"
+MANIFEST_NAME = "manifest.json"
+
+# python files that create the components (and their classNames) of the page
+LAYOUT_SOURCES = ["html_structure.py", "helper_functions.py", "app.py"]
+
+# classes set by dash-bootstrap-components / bootstrap's javascript, not written in the layout
+# (dbc derives e.g. justify-content-between from dbc.Row(justify="between"))
+SAFELIST = [
+    r"row", r"col(-\w+)*", r"container(-\w+)?", r"g[xy]?-\d",
+    r"justify-content-\w+", r"align-(items|self|content)-\w+",
+    r"btn(-[\w-]+)?", r"active", r"disabled",
+    r"accordion(-[\w-]+)?", r"collapsed?", r"collapsing", r"show", r"fade",
+    r"table(-[\w-]+)?",
+    r"tooltip(-[\w-]+)?", r"bs-tooltip-\w+",
+]
+
+SPARTAN_WEIGHTS = {
+    100: "Thin", 200: "ExtraLight", 300: "Light", 400: "Regular", 500: "Medium",
+    600: "SemiBold", 700: "Bold", 800: "ExtraBold", 900: "Black",
+}
+FONT_WEIGHT_NAMES = {"normal": 400, "bold": 700, "lighter": 300, "bolder": 700}
+
+# the step images are displayed as pictograms of max-height 4em (64 css px) next to the tools,
+# except the danger banner at 85% of a col-3 column
+ICON_HEIGHT = 64
+IMAGE_DENSITIES = (1, 2, 3)
+BANNER_IMAGES = ("danger.png",)
+BANNER_WIDTHS = (320, 480, 640, 960)
+BANNER_SIZES = "22vw"
+WEBP_QUALITY = 80
+
+# hashed files never change, the browser may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+###############################
+# CSS
+###############################
+
+class CssRule:
+    """ a qualified rule (selectors and declarations) or an at-rule with nested rules (children)
+        or without a block (e.g. @charset)
+    """
+
+    __slots__ = ("prelude", "declarations", "children")
+
+    def __init__(self, prelude : str, declarations : Optional[List[str]] = None, children : Optional[List["CssRule"]] = None):
+        self.prelude = prelude
+        self.declarations = declarations
+        self.children = children
+
+
+def _strip_comments(css : str) -> str:
+    return re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+
+
+def _split_top_level(text : str, separator : str) -> List[str]:
+    """ splits text at separator outside of quotes and parentheses
+    """
+
+    parts, depth, quote, start = [], 0, None, 0
+    for index, char in enumerate(text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:index])
+            start = index + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def parse_css(css : str) -> List[CssRule]:
+    rules, _ = _parse_block(_strip_comments(css), 0)
+    return rules
+
+
+def _parse_block(css : str, position : int):
+    rules = []
+    prelude_start = position
+    quote = None
+    while position < len(css):
+        char = css[position]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == ";" and css[prelude_start:position].strip().startswith("@"):
+            rules.append(CssRule(css[prelude_start:position].strip()))
+            prelude_start = position + 1
+        elif char == "{":
+            prelude = " ".join(css[prelude_start:position].split())
+            if prelude.startswith(("@media", "@supports", "@document", "@layer", "@keyframes", "@-webkit-keyframes")):
+                children, position = _parse_block(css, position + 1)
+                rules.append(CssRule(prelude, children=children))
+            else:
+                end = _find_block_end(css, position + 1)
+                rules.append(CssRule(prelude, declarations=_split_top_level(css[position + 1:end], ";")))
+                position = end
+            prelude_start = position + 1
+        elif char == "}":
+            return rules, position
+        position += 1
+    return rules, position
+
+
+def _find_block_end(css : str, position : int) -> int:
+    quote = None
+    while position < len(css):
+        char = css[position]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "}":
+            return position
+        position += 1
+    return position
+
+
+def _get_selector_names(selector : str) -> Set[str]:
+    """ classes and ids a selector requires, :not(...) arguments and attribute selectors don't count
+    """
+
+    selector = re.sub(r":not\([^)]*\)", "", selector)
+    selector = re.sub(r"\[[^\]]*\]", "", selector)
+    return set(re.findall(r"[.#](-?[_a-zA-Z][\w-]*)", selector))
+
+
+def purge_rules(rules : List[CssRule], is_used) -> List[CssRule]:
+    """ drops the selectors whose classes or ids are not used, the rules left without selectors
+        and the keyframes no animation refers to
+    """
+
+    kept = _purge_selectors(rules, is_used)
+    animations = set()
+    for declaration in _iter_declarations(kept):
+        name, _, value = declaration.partition(":")
+        if name.strip() in ("animation", "animation-name", "-webkit-animation", "-webkit-animation-name"):
+            animations.update(re.findall(r"[\w-]+", value))
+    return _drop_keyframes(kept, animations)
+
+
+def _drop_keyframes(rules : List[CssRule], animations : Set[str]) -> List[CssRule]:
+    kept = []
+    for rule in rules:
+        if rule.prelude.startswith(("@keyframes", "@-webkit-keyframes")):
+            if rule.prelude.split()[-1] in animations:
+                kept.append(rule)
+        elif rule.children is not None:
+            children = _drop_keyframes(rule.children, animations)
+            if children:
+                kept.append(CssRule(rule.prelude, children=children))
+        else:
+            kept.append(rule)
+    return kept
+
+
+def _purge_selectors(rules : List[CssRule], is_used) -> List[CssRule]:
+    kept = []
+    for rule in rules:
+        if rule.prelude.startswith(("@keyframes", "@-webkit-keyframes")):
+            kept.append(rule)
+        elif rule.children is not None:
+            children = _purge_selectors(rule.children, is_used)
+            if children:
+                kept.append(CssRule(rule.prelude, children=children))
+        elif rule.declarations is None or rule.prelude.startswith("@"):
+            # @charset, @import, @font-face, @page
+            kept.append(rule)
+        else:
+            selectors = [
+                selector for selector in _split_top_level(rule.prelude, ",")
+                if all(is_used(name) for name in _get_selector_names(selector))
+            ]
+            if selectors and rule.declarations:
+                kept.append(CssRule(",".join(selectors), declarations=rule.declarations))
+    return kept
+
+
+def _minify_declaration(declaration : str) -> str:
+    name, _, value = declaration.partition(":")
+    return name.strip() + ":" + " ".join(value.split())
+
+
+def serialize_rules(rules : Iterable[CssRule]) -> str:
+    """ minified css of the rules
+    """
+
+    parts = []
+    for rule in rules:
+        if rule.children is not None:
+            parts.append(rule.prelude + "{" + serialize_rules(rule.children) + "}")
+        elif rule.declarations is None:
+            parts.append(rule.prelude + ";")
+        else:
+            parts.append(rule.prelude + "{" + ";".join(map(_minify_declaration, rule.declarations)) + "}")
+    return "".join(parts)
+
+
+def _iter_declarations(rules : Iterable[CssRule]):
+    for rule in rules:
+        if rule.prelude.startswith(("@keyframes", "@-webkit-keyframes")):
+            continue
+        if rule.children is not None:
+            yield from _iter_declarations(rule.children)
+        elif rule.declarations:
+            yield from rule.declarations
+
+
+def get_font_weights(rules : List[CssRule]) -> List[int]:
+    """ the font weights the css asks for, rounded to the weights of the font files
+    """
+
+    weights = {400}
+    for declaration in _iter_declarations(rules):
+        name, _, value = declaration.partition(":")
+        if name.strip() != "font-weight":
+            continue
+        value = value.replace("!important", "").strip()
+        if value in FONT_WEIGHT_NAMES:
+            weights.add(FONT_WEIGHT_NAMES[value])
+        elif value.isdigit():
+            weights.add(min(SPARTAN_WEIGHTS, key=lambda weight: abs(weight - int(value))))
+    return sorted(weights)
+
+
+###############################
+# USED NAMES
+###############################
+
+def get_content_words(paths : Iterable[str], extra_content : Iterable[str] = ()) -> Set[str]:
+    """ every word of the sources and of the rendered layouts, like the default extractor of PurgeCSS
+    """
+
+    words = set()
+    for path in paths:
+        with open(path, encoding="utf-8") as fp:
+            words.update(re.findall(r"[\w-]+", fp.read()))
+    for content in extra_content:
+        words.update(re.findall(r"[\w-]+", content))
+    return words
+
+
+def get_layout_contents() -> List[str]:
+    """ the serialized main layout of every product
+    """
+
+    from plotly.io.json import to_json_plotly
+
+    from data.catalog import product_catalog
+    from html_structure import get_app_layout, get_main_layout
+
+    contents = [to_json_plotly(get_app_layout())]
+    for product in product_catalog.get_products():
+        layout = get_main_layout(product.key)
+        # the figure data holds no classes
+        contents.append(re.sub(r'"figure":\s*\{.*?"layout"', '"figure": {"layout"', to_json_plotly(layout)))
+    return contents
+
+
+def make_is_used(words : Set[str]):
+    safelist = re.compile("^(" + "|".join(SAFELIST) + ")$")
+    return lambda name: name in words or bool(safelist.match(name))
+
+
+###############################
+# BUILD
+###############################
+
+def get_hashed_name(name : str, content : bytes) -> str:
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha1(content).hexdigest()[:12]}{extension}"
+
+
+def write_file(build_path : str, name : str, content : bytes, compress : bool = True) -> str:
+    """ writes the content under its hashed name with .gz and .br siblings, returns the hashed name
+        compress: False for already compressed formats (images)
+    """
+
+    hashed_name = get_hashed_name(name, content)
+    path = os.path.join(build_path, hashed_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fp:
+        fp.write(content)
+    if not compress:
+        return hashed_name
+    with open(path + ".gz", "wb") as fp:
+        fp.write(gzip.compress(content, compresslevel=9))
+    with open(path + ".br", "wb") as fp:
+        fp.write(brotli.compress(content, quality=11))
+    return hashed_name
+
+
+def get_image_sizes(name : str, width : int, height : int) -> List[Tuple[int, int, str]]:
+    """ (width, height, srcset descriptor) of the variants of an image, never larger than the source
+    """
+
+    if name in BANNER_IMAGES:
+        widths = [size for size in BANNER_WIDTHS if size <= width] or [width]
+        return [(size, round(height * size / width), f"{size}w") for size in widths]
+
+    sizes = []
+    for density in IMAGE_DENSITIES:
+        size = min(ICON_HEIGHT * density, height)
+        sizes.append((round(width * size / height), size, f"{density}x"))
+        if size == height:
+            break
+    return sizes
+
+
+def build_images(assets_path : str, build_path : str) -> dict:
+    """ writes the webp variants of the images of assets/img, returns per image its src, srcset and sizes
+        (the src is the variant of a 2x display, for browsers without srcset)
+    """
+
+    # only needed to build
+    from PIL import Image
+
+    images = {}
+    for path in sorted(glob.glob(os.path.join(assets_path, "img", "*"))):
+        name = os.path.basename(path)
+        with Image.open(path) as source:
+            source = source.convert("RGBA" if source.mode in ("RGBA", "LA", "P") else "RGB")
+            variants = []
+            for width, height, descriptor in get_image_sizes(name, *source.size):
+                buffer = io.BytesIO()
+                source.resize((width, height), Image.LANCZOS).save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+                content = buffer.getvalue()
+                stem = os.path.splitext(name)[0]
+                hashed_name = write_file(build_path, f"img/{stem}-{width}w.webp", content, compress=False)
+                variants.append((BUILD_URL + hashed_name, descriptor, len(content)))
+
+        images[name] = {
+            "src": variants[min(1, len(variants) - 1)][0],
+            "srcset": ", ".join(f"{url} {descriptor}" for url, descriptor, _ in variants),
+            "sizes": BANNER_SIZES if name in BANNER_IMAGES else "",
+            "bytes": {url: nbytes for url, _, nbytes in variants},
+            "source_bytes": os.path.getsize(path),
+        }
+    return images
+
+
+def build_assets(assets_path : str = ASSETS_PATH, build_path : str = BUILD_PATH, layout_contents : Optional[List[str]] = None) -> dict:
+    """ builds the assets into build_path and returns the manifest
+    """
+
+    css_paths = sorted(glob.glob(os.path.join(assets_path, "*.css")))
+    js_paths = sorted(glob.glob(os.path.join(assets_path, "*.js")))
+    if layout_contents is None:
+        layout_contents = get_layout_contents()
+
+    is_used = make_is_used(get_content_words(LAYOUT_SOURCES + js_paths, layout_contents))
+
+    rules = []
+    for path in css_paths:
+        with open(path, encoding="utf-8") as fp:
+            rules += parse_css(fp.read())
+    # the @font-face rules of the sources are replaced by one per used weight
+    rules = [rule for rule in rules if not rule.prelude.startswith(("@font-face", "@charset"))]
+    rules = purge_rules(rules, is_used)
+
+    if os.path.exists(build_path):
+        shutil.rmtree(build_path)
+
+    font_faces = []
+    fonts = []
+    for weight in get_font_weights(rules):
+        font_path = os.path.join(assets_path, "fonts", f"Spartan-{SPARTAN_WEIGHTS[weight]}.ttf")
+        with open(font_path, "rb") as fp:
+            font_name = write_file(build_path, "fonts/" + os.path.basename(font_path), fp.read())
+        fonts.append(font_name)
+        font_faces.append(CssRule("@font-face", declarations=[
+            'font-family:"Spartan"', f'src:url("{font_name}") format("truetype")',
+            f"font-weight:{weight}", "font-display:swap",
+        ]))
+
+    css = '@charset "UTF-8";' + serialize_rules(font_faces + rules)
+    manifest = {
+        "css": [write_file(build_path, "app.css", css.encode("utf-8"))],
+        "js": [],
+        "fonts": fonts,
+        "source_bytes": sum(os.path.getsize(path) for path in css_paths),
+        "css_bytes": len(css.encode("utf-8")),
+    }
+    for path in js_paths:
+        with open(path, "rb") as fp:
+            manifest["js"].append(write_file(build_path, os.path.basename(path), fp.read()))
+    manifest["images"] = build_images(assets_path, build_path)
+
+    with open(os.path.join(build_path, MANIFEST_NAME), "w") as fp:
+        json.dump(manifest, fp, indent=1)
+    return manifest
+
+
+###############################
+# SERVE
+###############################
+
+def load_manifest(build_path : str = BUILD_PATH) -> Optional[dict]:
+    try:
+        with open(os.path.join(build_path, MANIFEST_NAME)) as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_manifest() -> Optional[dict]:
+    """ manifest of the build the app serves, None without a build or if config.ASSET_BUILD is off
+    """
+
+    return load_manifest() if config.ASSET_BUILD else None
+
+
+def get_image_sources(name : str) -> Tuple[str, str]:
+    """ src and srcset of an image of assets/img, the original file (and no srcset) without a build
+    """
+
+    manifest = get_manifest()
+    image = manifest and manifest.get("images", {}).get(name)
+    if image is None:
+        return "assets/img/" + name, ""
+    return image["src"], image["srcset"]
+
+
+def get_dash_assets(manifest : Optional[dict]) -> dict:
+    """ the stylesheet, script and assets_ignore arguments of dash.Dash for the built assets,
+        empty without a build (dash then serves assets/*.css and assets/*.js itself)
+    """
+
+    if manifest is None:
+        return {"external_stylesheets": [], "external_scripts": []}
+    return {
+        "external_stylesheets": [BUILD_URL + name for name in manifest["css"]],
+        "external_scripts": [BUILD_URL + name for name in manifest["js"]],
+        # the sources of the built files
+        "assets_ignore": r"\.(css|js)$",
+    }
+
+
+def register_route(server : Flask, build_path : str = BUILD_PATH):
+    """ serves the built files at BUILD_URL, precompressed if the client accepts it
+    """
+
+    build_path = os.path.abspath(build_path)
+    mimetypes = {".css": "text/css", ".js": "application/javascript", ".ttf": "font/ttf", ".webp": "image/webp"}
+
+    def get_response(filename : str) -> Response:
+        path = os.path.abspath(os.path.join(build_path, filename))
+        extension = os.path.splitext(path)[1]
+        if not path.startswith(build_path + os.sep) or extension not in mimetypes or not os.path.isfile(path):
+            abort(404)
+
+        encoding = None
+        for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if candidate in request.accept_encodings and os.path.isfile(path + suffix):
+                encoding, path = candidate, path + suffix
+                break
+        with open(path, "rb") as fp:
+            response = Response(fp.read(), mimetype=mimetypes[extension])
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    server.add_url_rule(BUILD_URL + "<path:filename>", "assets_build", get_response)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the purged, hashed and precompressed static assets")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--output", default=BUILD_PATH, help="directory of the built files")
+    args = parser.parse_args()
+
+    manifest = build_assets(build_path=args.output)
+    print(f"css: {manifest['source_bytes']} -> {manifest['css_bytes']} bytes ({', '.join(manifest['css'])})")
+    print(f"fonts: {', '.join(manifest['fonts'])}")
+    print(f"js: {', '.join(manifest['js'])}")
+    for name, image in manifest["images"].items():
+        print(f"{name}: {image['source_bytes']} -> {', '.join(map(str, image['bytes'].values()))} bytes")
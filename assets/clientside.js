@@ -0,0 +1,245 @@
+// Clientside callbacks of the digital assembly app
+// Dash serves every file in assets/ automatically
+
+function get_triggered_id() {
+    // pattern-matching id of the triggering input, e.g. {"index": "step3", "type": "step_button"}.n_clicks
+    const prop_id = dash_clientside.callback_context.triggered[0].prop_id;
+    return JSON.parse(prop_id.slice(0, prop_id.lastIndexOf(".")));
+}
+
+function get_triggered_step_id() {
+    // id of the clicked step button or step arrow
+    return get_triggered_id().index;
+}
+
+function is_hidden(style) {
+    return Boolean(style) && style.display === "none";
+}
+
+function without_display(style) {
+    const shown = Object.assign({}, style);
+    delete shown.display;
+    return shown;
+}
+
+// the images of the current step that are still loading, see images.on_step_images
+const step_images = {
+    ids: ["div_tools_img", "div_danger_img"],
+    product: null,
+    step: null,
+    start: 0,
+    loading: new Set(),
+    report_url: null,
+    observed: new WeakSet(),
+    preloaded: [],
+};
+
+function report_step_image(event) {
+    // time from the step change to the loaded image and its encoded size (0 if the browser did not record it)
+    const img = event.target;
+    if (!step_images.loading.delete(img.id) || !step_images.report_url) {
+        return;
+    }
+    const entries = performance.getEntriesByName(img.currentSrc);
+    navigator.sendBeacon(step_images.report_url, JSON.stringify({
+        product: step_images.product,
+        step: step_images.step,
+        image: img.id,
+        seconds: (performance.now() - step_images.start) / 1000,
+        bytes: entries.length ? entries[entries.length - 1].encodedBodySize : 0,
+    }));
+}
+
+function report_model_timing(timing, stage) {
+    // time from the step click to the drawn model, measured once the browser painted the next frame
+    if (!timing.report_url) {
+        return;
+    }
+    requestAnimationFrame(function() {
+        setTimeout(function() {
+            navigator.sendBeacon(timing.report_url, JSON.stringify({
+                product: timing.product,
+                step: timing.step,
+                stage: stage,
+                seconds: (performance.now() - timing.start) / 1000,
+            }));
+        }, 0);
+    });
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+
+    lod: {
+
+        detect_lod: function(search) {
+            const requested = new URLSearchParams(search || "").get("lod");
+            if (requested !== null) {
+                return parseInt(requested, 10);
+            }
+
+            // capability hints of the browser (deviceMemory in GB, not available in every browser)
+            if ((navigator.deviceMemory && navigator.deviceMemory <= 2) ||
+                (navigator.hardwareConcurrency && navigator.hardwareConcurrency <= 2)) {
+                return 2;
+            }
+            if ((navigator.deviceMemory && navigator.deviceMemory <= 4) ||
+                (navigator.hardwareConcurrency && navigator.hardwareConcurrency <= 4)) {
+                return 1;
+            }
+            return null;
+        },
+    },
+
+    product: {
+
+        select_product: function(product_key, search) {
+            // keep the other url parameters (e.g. ?lod=)
+            const params = new URLSearchParams(search || "");
+            if (params.get("product") === product_key) {
+                return dash_clientside.no_update;
+            }
+            params.set("product", product_key);
+            return "?" + params.toString();
+        },
+    },
+
+    panels: {
+
+        on_showhide_divs: function(n_clicks_minimize, n_clicks_maximize, style_minimizable, style_minimized) {
+            // the styles are copied, dash compares the returned objects with the previous ones
+            if (get_triggered_id().type === "minimize_button") {
+                return [Object.assign({}, style_minimizable, {display: "none"}), without_display(style_minimized)];
+            }
+            return [without_display(style_minimizable), Object.assign({}, style_minimized, {display: "none"})];
+        },
+
+        on_div_minimized: function(minimizable_divs_styles, minimizable_divs_ids) {
+            const hidden = {};
+            minimizable_divs_ids.forEach(function(id, i) { hidden[id.index] = is_hidden(minimizable_divs_styles[i]); });
+
+            const width_col_left = hidden.div_productmetadata && hidden.div_materiallist ? 1 : 3;
+            const width_col_right = hidden.div_tools && hidden.div_steplist ? 1 : 3;
+            return [width_col_left, 12 - width_col_left - width_col_right, width_col_right];
+        },
+    },
+
+    steps: {
+
+        // STEP_NAVIGATION = "cached": the server answers with the precompressed figure
+        // (or 304 if the browser still has it), see figure_cache.py
+        fetch_step_figure: function(n_clicks1, n_clicks2, lod, product_key) {
+            const step_id = get_triggered_step_id();
+            const url = "figures/" + encodeURIComponent(product_key) + "/" + encodeURIComponent(step_id) + ".json";
+
+            // the graph and the current step are only changed together, a failed request changes neither
+            return fetch(url + "?lod=" + (lod === null || lod === undefined ? "" : lod))
+                .then(function(response) { return response.ok ? response.json() : null; })
+                .then(function(figure) { return figure ? [figure, step_id] : dash_clientside.no_update; })
+                .catch(function() { return dash_clientside.no_update; });
+        },
+
+        // STEP_NAVIGATION = "client"
+        // the step data is the client_steps store built by helper_functions.get_client_steps_data
+        onclick_step_button: function(n_clicks1, n_clicks2, client_steps) {
+            const step_id = get_triggered_step_id();
+
+            // toggle the visibility of the part traces, the geometry arrays are shared between all steps
+            const step = client_steps.steps[step_id];
+            const object_names = new Set(step.object_names);
+            const figure = {
+                data: client_steps.traces.map(function(trace) {
+                    return Object.assign({}, trace, {visible: object_names.has(trace.name)});
+                }),
+                // camera fitted to the parts of the step (CAMERA_AUTOFIT)
+                layout: step.camera ? Object.assign({}, client_steps.layout, {
+                    scene: Object.assign({}, client_steps.layout.scene, {camera: step.camera}),
+                }) : client_steps.layout,
+            };
+
+            return [figure, step_id];
+        },
+
+        on_step_changed: function(current_step_id, client_steps) {
+            return client_steps.steps[current_step_id].details;
+        },
+
+        // all step navigation modes
+        on_step_changed_2: function(current_step_id, step_button_ids, step_nav_button_ids) {
+            const button_indices = step_button_ids.map(function(id) { return id.index; });
+
+            const button_colors_new = button_indices.map(function(button_index) {
+                return button_index === current_step_id ? "primary" : "secondary";
+            });
+
+            // the step arrows point to the previous and next step
+            const i = button_indices.indexOf(current_step_id);
+            const n = button_indices.length;
+            const previous_button_index = {type: "step_nav_button", index: button_indices[(i - 1 + n) % n]};
+            const next_button_index = {type: "step_nav_button", index: button_indices[(i + 1) % n]};
+
+            return [button_colors_new, [previous_button_index, next_button_index]];
+        },
+    },
+
+    progressive: {
+
+        // model_timing store: the clicked step and whether its first and its fully refined model were reported
+        // refine_parts store: the parts of the current step still shown as proxies (app.on_refine_interval)
+        on_model_changed: function(n_clicks1, n_clicks2, figure, current_step_id, refine_parts, timing) {
+            const prop_ids = dash_clientside.callback_context.triggered.map(function(t) { return t.prop_id; });
+            if (prop_ids.indexOf("graph.figure") === -1) {
+                return Object.assign({}, timing, {
+                    step: get_triggered_step_id(), start: performance.now(), first: false, full: false,
+                });
+            }
+            if (timing.step !== current_step_id || timing.full) {
+                return dash_clientside.no_update;
+            }
+
+            const updated = Object.assign({}, timing);
+            if (!timing.first) {
+                report_model_timing(timing, "first");
+                updated.first = true;
+            }
+            if (refine_parts.step === current_step_id && !refine_parts.parts.length) {
+                report_model_timing(timing, "full");
+                updated.full = true;
+            }
+            return updated;
+        },
+    },
+
+    images: {
+
+        // step_images store: src, srcset and sizes of the images of all steps (helper_functions.get_step_images)
+        on_step_images: function(current_step_id, steplist_style, images, preloaded) {
+            if (current_step_id !== step_images.step) {
+                step_images.step = current_step_id;
+                step_images.start = performance.now();
+                step_images.loading = new Set(step_images.ids);
+                step_images.product = images.product;
+                step_images.report_url = images.report_url;
+            }
+            step_images.ids.forEach(function(id) {
+                const img = document.getElementById(id);
+                if (img && !step_images.observed.has(img)) {
+                    img.addEventListener("load", report_step_image);
+                    step_images.observed.add(img);
+                }
+            });
+
+            // the browser picks the same variant for the preloaded image as for the displayed one
+            if (preloaded || is_hidden(steplist_style)) {
+                return dash_clientside.no_update;
+            }
+            step_images.preloaded = images.images.map(function(image) {
+                const img = new Image();
+                img.sizes = image.sizes;
+                img.srcset = image.srcset;
+                img.src = image.src;
+                return img;
+            });
+            return true;
+        },
+    },
+});
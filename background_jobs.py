@@ -0,0 +1,159 @@
+""" background callbacks (config.BACKGROUND_CALLBACKS): the step figures are built in a process forked
+    for every request instead of on the flask worker thread, so slow builds don't hold up the other callbacks
+
+    the browser polls the result every config.BACKGROUND_POLL_MS. A job that is superseded before it is done
+    (a user clicking several steps quickly) is killed when the browser requests the figure of the next step,
+    so only the latest step is built and returned
+
+    the jobs are registered in the diskcache shared by all workers of the server:
+    - background_jobs_running: jobs that are still building
+    - background_jobs_started_total, background_jobs_cancelled_total
+    - background_job_seconds: time from the start of a job to its collected result (per process)
+"""
+import functools
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List
+
+from dash.long_callback import DiskcacheManager
+from flask import g, has_request_context
+
+import config
+from data.catalog import product_catalog
+from figure_cache import figure_cache
+from geometry_index import geometry_index
+from layout_cache import layout_cache
+from mesh_cache import mesh_cache
+from mesh_lod import lod_stores
+from metrics import metrics
+
+# registry entries of jobs whose result was never collected (e.g. the tab was closed) expire
+JOB_EXPIRE_S = 600
+
+metrics.histogram("background_job_seconds", "time from the start of a background job to its collected result")
+
+# created by get_manager, their locks are reset in the forked jobs as well
+_managers : List["ObservedDiskcacheManager"] = []
+
+
+class ObservedDiskcacheManager(DiskcacheManager):
+    """ DiskcacheManager that counts the started, running and cancelled jobs in its cache
+
+        the jobs are forked while no other thread uses the cache: sqlite keeps the locks of a process
+        in memory, a job forked during a read or write of another thread would wait for that lock forever
+    """
+
+    def __init__(self, cache):
+        self._job_names : Dict[object, str] = {}
+        self._lock = threading.RLock()
+        super().__init__(cache)
+
+    def reset_after_fork(self):
+        self._lock = threading.RLock()
+
+    def build_cache_key(self, fn, args, cache_args_to_ignore):
+        # dash derives the key from the arguments, two clients requesting the same step at once
+        # would share it and only the first one would receive the result
+        return super().build_cache_key(fn, args, cache_args_to_ignore) + uuid.uuid4().hex
+
+    def make_job_fn(self, fn, progress, key=None):
+        job_fn = super().make_job_fn(fn, progress, key)
+        self._job_names[job_fn] = fn.__name__
+        return job_fn
+
+    def call_job_fn(self, key, job_fn, args, context):
+        name = self._job_names.get(job_fn, "unknown")
+        with self._lock:
+            job = super().call_job_fn(key, job_fn, args, context)
+            self.handle.set(f"jobs/{job}", (name, time.time()), expire=JOB_EXPIRE_S)
+            self.handle.incr("jobs_started")
+        _set_request_callback(name)
+        return job
+
+    def get_result(self, key, job):
+        with self._lock:
+            entry = self.handle.get(f"jobs/{job}") if job else None
+            if entry is not None:
+                _set_request_callback(entry[0])
+                # unregistered before the finished job is terminated, which would count it as cancelled
+                if self.result_ready(key) and self.handle.delete(f"jobs/{job}"):
+                    metrics.observe("background_job_seconds", time.time() - entry[1], callback=entry[0])
+
+            return super().get_result(key, job)
+
+    def get_progress(self, key):
+        with self._lock:
+            return super().get_progress(key)
+
+    def result_ready(self, key):
+        with self._lock:
+            return super().result_ready(key)
+
+    def clear_cache_entry(self, key):
+        with self._lock:
+            super().clear_cache_entry(key)
+
+    def terminate_job(self, job):
+        with self._lock:
+            # the job is still registered if its result was not collected: it is cancelled
+            if job is not None and self.handle.delete(f"jobs/{job}"):
+                self.handle.incr("jobs_cancelled")
+            super().terminate_job(job)
+
+    def stats(self) -> dict:
+        """ job counters of all workers of the server
+        """
+
+        with self._lock:
+            jobs = [key[len("jobs/"):] for key in self.handle.iterkeys() if isinstance(key, str) and key.startswith("jobs/")]
+            started, cancelled = self.handle.get("jobs_started", 0), self.handle.get("jobs_cancelled", 0)
+        running = sum(1 for job in jobs if self.job_running(job))
+        return {
+            "running": running,
+            "started": started,
+            "cancelled": cancelled,
+        }
+
+
+def reset_locks_after_fork():
+    """ runs in every process forked once background callbacks are enabled (the jobs): they are forked from
+        the threaded server, a lock another thread held at that moment would never be released in the child
+    """
+
+    for instance in (metrics, mesh_cache, *lod_stores, geometry_index, product_catalog, figure_cache, layout_cache, *_managers):
+        instance.reset_after_fork()
+
+
+def _set_request_callback(name : str):
+    # the callback runs in the job, the request metrics are labelled here (see metrics.timed_callback)
+    if has_request_context():
+        g.metrics_callback = name
+
+
+@functools.lru_cache(maxsize=None)
+def get_manager(cache_path : str = config.BACKGROUND_CACHE_PATH) -> ObservedDiskcacheManager:
+    """ the manager of the background callbacks (one per process), its results and job registry are kept in cache_path
+    """
+
+    # imported here, diskcache (and multiprocess, psutil) are only needed with background callbacks
+    import diskcache
+
+    os.makedirs(cache_path, exist_ok=True)
+    manager = ObservedDiskcacheManager(diskcache.Cache(cache_path))
+    # registered once, with the first manager (not available on windows, where the jobs are spawned instead of forked)
+    if not _managers and hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=reset_locks_after_fork)
+    _managers.append(manager)
+
+    def collect():
+        stats = manager.stats()
+        return {
+            "background_jobs_running": stats["running"],
+            "background_jobs_started_total": stats["started"],
+            "background_jobs_cancelled_total": stats["cancelled"],
+        }
+
+    metrics.register_collector(collect)
+    return manager
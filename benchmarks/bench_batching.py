@@ -0,0 +1,109 @@
+""" compares the figure of every step with one trace per part and with batched traces (mesh_batch.py)
+    reports trace count, payload and server time per step
+
+    the draw time can only be measured in a browser: --html writes a page that draws every
+    step in both variants with plotly.js and shows the timings
+
+    run from the repository root:
+        python -m benchmarks.bench_batching [--lod 0] [--html batching.html]
+"""
+import argparse
+import gzip
+import json
+import time
+
+from plotly.io.json import to_json_plotly
+from plotly.offline import get_plotlyjs
+
+from data.catalog import get_step_catalog
+from helper_functions import get_3d_fig
+from mesh_cache import mesh_cache
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><script>{plotlyjs}</script></head>
+<body>
+<div id="graph" style="width: 800px; height: 600px"></div>
+<pre id="results">drawing...</pre>
+<script>
+const figures = {figures};
+const repeat = {repeat};
+
+async function draw_time(figure) {{
+    const timings = [];
+    for (let run = 0; run < repeat; run++) {{
+        Plotly.purge("graph");
+        const start = performance.now();
+        await Plotly.newPlot("graph", figure.data, figure.layout);
+        // wait for the frame in which the WebGL scene is drawn
+        await new Promise(requestAnimationFrame);
+        timings.push(performance.now() - start);
+    }}
+    return Math.min(...timings);
+}}
+
+(async function() {{
+    const lines = ["step       traces   per part ms   batched ms"];
+    for (const step_id of Object.keys(figures)) {{
+        const per_part = await draw_time(figures[step_id].per_part);
+        const batched = await draw_time(figures[step_id].batched);
+        lines.push(step_id.padEnd(10) + String(figures[step_id].per_part.data.length).padStart(7)
+            + per_part.toFixed(1).padStart(14) + batched.toFixed(1).padStart(13));
+    }}
+    document.getElementById("results").textContent = lines.join("\\n");
+}})();
+</script>
+</body>
+</html>
+"""
+
+
+def measure(step_id, lod, batch, repeat=3):
+    """ returns the figure json and the fastest time to build and serialize it in seconds
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        figure_json = to_json_plotly(get_3d_fig(step_id, lod, batch=batch))
+        timings.append(time.perf_counter() - start)
+    return figure_json, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lod", type=int, default=0, help="level of detail of the meshes")
+    parser.add_argument("--html", help="write a page that measures the draw time in the browser")
+    parser.add_argument("--repeat", type=int, default=5, help="draws per figure in the browser page")
+    args = parser.parse_args()
+
+    # parse every part once, so the timings only contain building and serializing the figures
+    for step_id in get_step_catalog().keys():
+        get_3d_fig(step_id, args.lod)
+
+    figures = {}
+    print(f"{'step':<8}{'traces':>8}{'batched':>9}{'json kB':>10}{'batched':>9}{'gzip kB':>10}{'batched':>9}{'ms':>8}{'batched':>9}")
+    for step_id in get_step_catalog().keys():
+        per_part_json, per_part_s = measure(step_id, args.lod, False)
+        batched_json, batched_s = measure(step_id, args.lod, True)
+        per_part, batched = json.loads(per_part_json), json.loads(batched_json)
+        figures[step_id] = {"per_part": per_part, "batched": batched}
+
+        print(
+            f"{step_id:<8}"
+            f"{len(per_part['data']):>8}{len(batched['data']):>9}"
+            f"{len(per_part_json) / 1000:>10.0f}{len(batched_json) / 1000:>9.0f}"
+            f"{len(gzip.compress(per_part_json.encode())) / 1000:>10.0f}{len(gzip.compress(batched_json.encode())) / 1000:>9.0f}"
+            f"{per_part_s * 1000:>8.1f}{batched_s * 1000:>9.1f}"
+        )
+
+    print(f"\nmesh cache: {mesh_cache.stats()}")
+
+    if args.html:
+        with open(args.html, "w") as fp:
+            fp.write(HTML_TEMPLATE.format(plotlyjs=get_plotlyjs(), figures=json.dumps(figures), repeat=args.repeat))
+        print(f"open {args.html} in a browser to measure the draw times")
+
+
+if __name__ == "__main__":
+    main()
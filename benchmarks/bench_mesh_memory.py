@@ -0,0 +1,90 @@
+""" memory of the part meshes as parsed (float64 positions, int64 indices, duplicate vertices)
+    and as loaded for the figures (welded, float32 positions, uint16/uint32 indices)
+
+    reports per part the vertex and face counts and the array bytes before and after,
+    the figure payload of a step and the resident memory of a worker process that loads it
+
+    run from the repository root:
+        python -m benchmarks.bench_mesh_memory [--step step15]
+"""
+import argparse
+import gzip
+import os
+import resource
+import subprocess
+import sys
+
+from plotly.io.json import to_json_plotly
+
+import config
+from data.catalog import get_step_catalog
+from mesh_store import get_part_names, read_part
+from obj_parser import GEOMETRY_PATH, compact_mesh, make_mesh3d, read_objfile
+
+
+def get_mesh_nbytes(mesh) -> int:
+    return mesh.vertices.nbytes + mesh.faces.nbytes + mesh.face_materials.nbytes
+
+
+def load_mesh(name, optimized):
+    """ returns a part as parsed or as loaded for the figures
+    """
+
+    if optimized:
+        return compact_mesh(read_part(name))
+    return read_objfile(os.path.join(GEOMETRY_PATH, name + ".obj"))
+
+
+def get_step_figure_json(step_id, optimized) -> str:
+    traces = []
+    for name in get_step_catalog().get(step_id).object_names:
+        mesh = load_mesh(name, optimized)
+        traces.append(make_mesh3d(mesh.vertices, mesh.faces, mesh.get_face_colors(), mesh.get_opacity(), name))
+    return to_json_plotly({"data": traces})
+
+
+def measure_worker(step_id, optimized) -> int:
+    """ resident memory (max rss in kB) of a fresh process that loads the figure of a step
+    """
+
+    output = subprocess.check_output([
+        sys.executable, "-m", "benchmarks.bench_mesh_memory", "--step", step_id, "--worker",
+        "optimized" if optimized else "parsed",
+    ])
+    return int(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--step", default="step15", help="step whose figure is measured")
+    parser.add_argument("--worker", choices=["parsed", "optimized"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        get_step_figure_json(args.step, args.worker == "optimized")
+        print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        return
+
+    print(f"{'part':<24}{'vertices':>10}{'welded':>8}{'faces':>8}{'kept':>8}{'kB':>8}{'compact':>9}")
+    totals = [0, 0]
+    for name in get_part_names():
+        parsed, optimized = load_mesh(name, False), load_mesh(name, True)
+        nbytes = get_mesh_nbytes(parsed), get_mesh_nbytes(optimized)
+        totals = [totals[0] + nbytes[0], totals[1] + nbytes[1]]
+        print(
+            f"{name:<24}{len(parsed.vertices):>10}{len(optimized.vertices):>8}"
+            f"{len(parsed.faces):>8}{len(optimized.faces):>8}"
+            f"{nbytes[0] / 1000:>8.1f}{nbytes[1] / 1000:>9.1f}"
+        )
+    print(f"{'total':<58}{totals[0] / 1000:>8.1f}{totals[1] / 1000:>9.1f}")
+
+    print(f"\nfigure of {args.step} (weld tolerance {config.MESH_WELD_TOLERANCE})")
+    print(f"{'':<12}{'json kB':>10}{'gzip kB':>10}{'worker rss MB':>15}")
+    for label, optimized in (("parsed", False), ("optimized", True)):
+        figure_json = get_step_figure_json(args.step, optimized).encode("utf-8")
+        rss_mb = measure_worker(args.step, optimized) / 1024
+        print(f"{label:<12}{len(figure_json) / 1000:>10.0f}{len(gzip.compress(figure_json)) / 1000:>10.0f}{rss_mb:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+""" side-by-side benchmark of obj_parser and dash_obj_in_3dmesh.geometry_tools
+    (tests/test_obj_parser.py checks that both produce identical geometry)
+
+    run from the repository root:
+        python -m benchmarks.bench_obj_parser
+"""
+import argparse
+import time
+
+from dash_obj_in_3dmesh import geometry_tools
+
+import obj_parser
+
+DEFAULT_PARTS = ["doggo-mesh", "HolzquaderL1", "HolzquaderL2", "HolzquaderS"]
+
+
+def best_time(function, repeat):
+    """ returns the fastest of several runs in seconds
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("parts", nargs="*", default=DEFAULT_PARTS, help="obj file names without extension")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'part':<16} {'geometry_tools':>15} {'obj_parser':>12} {'speedup':>8}")
+    for name in args.parts:
+        reference = best_time(lambda: geometry_tools.create_mesh_data(name), args.repeat)
+        vectorized = best_time(lambda: obj_parser.create_mesh_data(name), args.repeat)
+        print(
+            f"{name:<16} {reference * 1000:>12.1f} ms {vectorized * 1000:>9.1f} ms {reference / vectorized:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+""" compares the mesh array transport of the step figures:
+    json lists of numbers (what plotly < 6 sends) and base64 typed arrays (FIGURE_TRANSPORT=typed)
+
+    reports per step the time to encode the figure json, the payload and the time the browser
+    needs to parse it into arrays. The parse time is measured with node (JSON.parse, plus decoding
+    the base64 strings into typed arrays like plotly.js does), the column is empty without node.
+
+    run from the repository root:
+        python -m benchmarks.bench_transport [--lod 0]
+"""
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+from data.catalog import get_step_catalog
+from helper_functions import get_3d_fig
+
+MESH_ARRAYS = ("x", "y", "z", "i", "j", "k")
+
+NODE_SCRIPT = """
+const fs = require("fs");
+const DTYPES = {f4: Float32Array, f8: Float64Array, u1: Uint8Array, u2: Uint16Array, u4: Uint32Array, i4: Int32Array};
+
+function parse(text) {
+    const figure = JSON.parse(text);
+    for (const trace of figure.data) {
+        for (const key of ["x", "y", "z", "i", "j", "k"]) {
+            const spec = trace[key];
+            if (spec && spec.bdata) {
+                const bytes = Buffer.from(spec.bdata, "base64");
+                const TypedArray = DTYPES[spec.dtype];
+                const aligned = new Uint8Array(bytes).buffer;
+                trace[key] = new TypedArray(aligned, 0, bytes.length / TypedArray.BYTES_PER_ELEMENT);
+            }
+        }
+    }
+    return figure;
+}
+
+const repeat = parseInt(process.argv[2], 10);
+const results = {};
+for (const path of process.argv.slice(3)) {
+    const text = fs.readFileSync(path, "utf8");
+    parse(text);  // warm up
+    let best = Infinity;
+    for (let run = 0; run < repeat; run++) {
+        const start = process.hrtime.bigint();
+        parse(text);
+        best = Math.min(best, Number(process.hrtime.bigint() - start) / 1e6);
+    }
+    results[path] = best;
+}
+console.log(JSON.stringify(results));
+"""
+
+
+def to_json_lists(step_id, lod) -> str:
+    """ the figure json with json lists for the mesh arrays
+    """
+
+    figure = get_3d_fig(step_id, lod, transport="json")
+    # plotly >= 6 would send the numpy arrays as typed arrays as well
+    data = [
+        go.Mesh3d(trace, _validate=False, **{attribute: trace[attribute].tolist() for attribute in MESH_ARRAYS})
+        for trace in figure.data
+    ]
+    return to_json_plotly(go.Figure(data=data, layout=figure.layout, _validate=False))
+
+
+def to_json_typed(step_id, lod) -> str:
+    return to_json_plotly(get_3d_fig(step_id, lod, transport="typed"))
+
+
+def best_time(function, repeat):
+    """ returns the result and the fastest of several runs in seconds
+    """
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def measure_parse_times(figure_jsons, repeat):
+    """ returns the node parse time in ms of every figure json, or None without node
+    """
+
+    node = shutil.which("node")
+    if node is None:
+        return None
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for index, figure_json in enumerate(figure_jsons):
+            path = os.path.join(directory, f"{index}.json")
+            with open(path, "w") as fp:
+                fp.write(figure_json)
+            paths.append(path)
+        script = os.path.join(directory, "parse.js")
+        with open(script, "w") as fp:
+            fp.write(NODE_SCRIPT)
+
+        results = json.loads(subprocess.check_output([node, script, str(repeat)] + paths))
+    return [results[path] for path in paths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lod", type=int, default=0, help="level of detail of the meshes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    step_ids = get_step_catalog().keys()
+    # parse every part once, so the timings only contain building and encoding the figures
+    for step_id in step_ids:
+        get_3d_fig(step_id, args.lod)
+
+    rows = []
+    for step_id in step_ids:
+        lists_json, lists_s = best_time(lambda: to_json_lists(step_id, args.lod), args.repeat)
+        typed_json, typed_s = best_time(lambda: to_json_typed(step_id, args.lod), args.repeat)
+        rows.append((step_id, lists_json, lists_s, typed_json, typed_s))
+
+    parse_times = measure_parse_times([json_text for row in rows for json_text in (row[1], row[3])], args.repeat)
+
+    print(f"{'':<8}{'encode ms':>18}{'json kB':>18}{'gzip kB':>18}{'parse ms':>18}")
+    print(f"{'step':<8}" + f"{'lists':>10}{'typed':>8}" * 4)
+    for index, (step_id, lists_json, lists_s, typed_json, typed_s) in enumerate(rows):
+        parse = f"{parse_times[2 * index]:>10.2f}{parse_times[2 * index + 1]:>8.2f}" if parse_times else ""
+        print(
+            f"{step_id:<8}"
+            f"{lists_s * 1000:>10.1f}{typed_s * 1000:>8.1f}"
+            f"{len(lists_json) / 1000:>10.0f}{len(typed_json) / 1000:>8.0f}"
+            f"{len(gzip.compress(lists_json.encode())) / 1000:>10.0f}{len(gzip.compress(typed_json.encode())) / 1000:>8.0f}"
+            + parse
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+""" load generator of the step navigation, N clients open the page at the same moment and click through the steps
+
+    every client posts the _dash-update-component requests the browser sends: render_page when the page opens,
+    onclick_step_button for a click on a step arrow (or on a step button), followed by the on_step_changed
+    cascade of the new current_step (and on_step_changed_2 on revisions that resolved it on the server)
+    and, for progressive step changes (PROGRESSIVE_PROXY), the on_refine_interval requests until all
+    proxies of the step are refined. Background callbacks (BACKGROUND_CALLBACKS) are polled until their job is
+    done ("<callback> job" is the time to the result), --supersede clicks again before the figure arrived,
+    which cancels the job.
+    If the browser resolves the graph (STEP_NAVIGATION=cached) the client loads /figures/<product>/<step>.json
+    instead, callbacks the server does not register are skipped. STEP_NAVIGATION=client sends no request per step,
+    its clients open the page again and again.
+
+    reports per request the count, errors, throughput and the p50/p95/p99 latency
+
+    run from the repository root, against a server started in this process (werkzeug, threaded):
+        python -m benchmarks.load_test --clients 20 --duration 30
+    or against a running server, e.g. gunicorn with several workers:
+        python -m benchmarks.load_test --url http://127.0.0.1:8050 --clients 50 --duration 60
+"""
+import argparse
+import gzip
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# the in-process server must not build the figure cache before the clients start
+os.environ.setdefault("FIGURE_CACHE_WARMUP", "0")
+
+from data.catalog import get_step_catalog, product_catalog
+
+# output ids of the callbacks in app.py, as the browser sends them
+# (without the @<hash> dash appends to outputs with allow_duplicate)
+CALLBACK_OUTPUTS = {
+    "render_page": "page.children",
+    "onclick_step_button": "..graph.figure...current_step.data...refine_parts.data..",
+    "on_refine_interval": "..graph.figure...refine_parts.data...refine_interval.max_intervals..",
+    "on_step_changed": (
+        "..div_step_description_stepname.children...div_step_description_steptext.children...div_tools_name.children"
+        "...div_tools_img.src...div_tools_img.srcSet...div_danger_img.src...div_danger_img.srcSet...p_notifs.children...i_notifs.className...div_notifs.className.."
+    ),
+    "on_step_changed_2": '..{"index":["ALL"],"type":"step_button"}.color...{"index":["ALL"],"type":"step_nav_button"}.id..',
+}
+
+
+def stringify_id(component_id) -> str:
+    """ dash's string form of a (pattern-matching) component id
+    """
+
+    if isinstance(component_id, dict):
+        return json.dumps(component_id, sort_keys=True, separators=(",", ":"))
+    return component_id
+
+
+def get_prop(component_id, prop, value=None) -> dict:
+    return {"id": component_id, "property": prop, "value": value}
+
+
+def get_output(component_id, prop) -> dict:
+    return {"id": component_id, "property": prop}
+
+
+###############################
+# CLIENT
+###############################
+
+class Recorder:
+    """ latencies of all clients by request name
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name : str, latency : float, ok : bool, nbytes : int):
+        with self._lock:
+            if ok:
+                self.latencies[name].append(latency)
+                self.bytes[name] += nbytes
+            else:
+                self.errors[name] += 1
+
+
+class Client:
+    """ one simulated browser with a keep-alive connection, it holds the state of the page
+        (current step, ids of the step arrows, click counts) to post the requests the browser would post
+    """
+
+    def __init__(self, url : str, product_key : str, step_keys : List[str], lod : Optional[int],
+                 callbacks : dict, recorder : Recorder, jump_probability : float, think_time_s : float, seed : int,
+                 supersede_probability : float = 0, fetch_figures : bool = False):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.product_key = product_key
+        self.step_keys = step_keys
+        self.lod = lod
+        self.callbacks = callbacks
+        # the browser loads the cached figure of every step (STEP_NAVIGATION=cached)
+        self.fetch_figures = fetch_figures
+        self.recorder = recorder
+        self.jump_probability = jump_probability
+        self.think_time_s = think_time_s
+        self.supersede_probability = supersede_probability
+        self.random = random.Random(seed)
+        # background job of a callback whose result was not awaited, cancelled by the next request
+        self.old_jobs = {}
+
+        self.connection = None
+        self.current_step = step_keys[0]
+        self.refine_parts = {"step": step_keys[0], "parts": []}
+        self.n_intervals = 0
+        self.nav_keys = [step_keys[-1], step_keys[1 % len(step_keys)]]
+        self.step_clicks = [None] * len(step_keys)
+        self.nav_clicks = [None, None]
+
+    def request(self, name : str, method : str, path : str, body : Optional[dict] = None):
+        headers = {"Accept-Encoding": "gzip"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+
+        start = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            ok = response.status in (200, 204, 304)
+            gzipped = response.getheader("Content-Encoding") == "gzip"
+        except (OSError, http.client.HTTPException):
+            self.connection = None
+            data, ok = b"", False
+        latency = time.perf_counter() - start
+        self.recorder.add(name, latency, ok, len(data))
+        if not ok:
+            return None
+        # the transferred bytes are recorded, the caller gets the response body
+        return gzip.decompress(data) if gzipped else data
+
+    def post_callback(self, name : str, outputs, inputs, state, changed_prop_ids, wait : bool = True):
+        """ returns the response body, None if the server does not resolve the callback
+            the result of a background callback is polled like the browser does, unless wait is False
+        """
+
+        if name not in self.callbacks:
+            return None
+        output, interval_ms = self.callbacks[name]
+        body = {"output": output, "outputs": outputs, "inputs": inputs, "state": state, "changedPropIds": changed_prop_ids}
+        old_job = self.old_jobs.pop(name, None)
+
+        start = time.perf_counter()
+        data = self.request(name, "POST", "/_dash-update-component" + (f"?oldJob={old_job}" if old_job else ""), body)
+        if interval_ms is None or not data:
+            return data
+
+        job = json.loads(data)
+        if not wait:
+            self.old_jobs[name] = job["job"]
+            return None
+        while data:
+            time.sleep(interval_ms / 1000)
+            data = self.request(
+                name + " poll", "POST", f"/_dash-update-component?cacheKey={job['cacheKey']}&job={job['job']}", body,
+            )
+            if data and "response" in json.loads(data):
+                break
+        self.recorder.add(name + " job", time.perf_counter() - start, data is not None, 0)
+        return data
+
+    # Page
+
+    def open_page(self):
+        search = f"?product={self.product_key}"
+        self.request("index", "GET", "/" + search)
+        self.post_callback(
+            "render_page",
+            get_output("page", "children"),
+            [get_prop("url", "search", search), get_prop("lod", "data", self.lod)],
+            [],
+            ["url.search"],
+        )
+        self.refine_parts = {"step": self.current_step, "parts": []}
+        self.on_step_changed()
+
+    def get_step_button_ids(self) -> List[dict]:
+        return [{"index": key, "type": "step_button"} for key in self.step_keys]
+
+    def get_nav_button_ids(self) -> List[dict]:
+        return [{"index": key, "type": "step_nav_button"} for key in self.nav_keys]
+
+    def click(self):
+        """ clicks the next-step arrow, or a random step button
+        """
+
+        if self.random.random() < self.jump_probability:
+            index = self.random.randrange(len(self.step_keys))
+            self.step_clicks[index] = (self.step_clicks[index] or 0) + 1
+            triggered_id = self.get_step_button_ids()[index]
+        else:
+            self.nav_clicks[1] = (self.nav_clicks[1] or 0) + 1
+            triggered_id = self.get_nav_button_ids()[1]
+        step_key = triggered_id["index"]
+        # a quick second click: the figure of this step is never awaited
+        superseded = self.random.random() < self.supersede_probability
+
+        if "onclick_step_button" in self.callbacks:
+            data = self.post_callback(
+                "onclick_step_button",
+                [get_output("graph", "figure"), get_output("current_step", "data"), get_output("refine_parts", "data")],
+                [
+                    [get_prop(id, "n_clicks", n) for id, n in zip(self.get_step_button_ids(), self.step_clicks)],
+                    [get_prop(id, "n_clicks", n) for id, n in zip(self.get_nav_button_ids(), self.nav_clicks)],
+                ],
+                [
+                    get_prop("current_step", "data", self.current_step),
+                    get_prop("lod", "data", self.lod),
+                    get_prop("product", "data", self.product_key),
+                    get_prop("refine_parts", "data", self.refine_parts),
+                ],
+                [stringify_id(triggered_id) + ".n_clicks"],
+                wait=not superseded,
+            )
+            if superseded and self.old_jobs:
+                return
+            self.update_refine_parts(data)
+        elif self.fetch_figures:
+            # the graph is resolved in the browser, which loads the cached figure of the step
+            lod = f"?lod={self.lod}" if self.lod is not None else ""
+            self.request("figure", "GET", f"/figures/{self.product_key}/{step_key}.json{lod}")
+        # otherwise the browser switches the step from the geometry it received with the page
+
+        self.current_step = step_key
+        self.on_step_changed()
+        self.refine()
+
+    def update_refine_parts(self, data : Optional[bytes]):
+        # the proxies the server sent with the step change (or that are left after a refinement)
+        if data:
+            self.refine_parts = json.loads(data)["response"].get("refine_parts", {}).get("data", self.refine_parts)
+
+    def refine(self):
+        """ the refinement requests of a progressive step change, one after the other
+        """
+
+        while "on_refine_interval" in self.callbacks and self.refine_parts["step"] == self.current_step and self.refine_parts["parts"]:
+            self.n_intervals += 1
+            data = self.post_callback(
+                "on_refine_interval",
+                [get_output("graph", "figure"), get_output("refine_parts", "data"), get_output("refine_interval", "max_intervals")],
+                [get_prop("current_step", "data", self.current_step), get_prop("refine_interval", "n_intervals", self.n_intervals)],
+                [
+                    get_prop("refine_parts", "data", self.refine_parts),
+                    get_prop("lod", "data", self.lod),
+                    get_prop("product", "data", self.product_key),
+                ],
+                ["refine_interval.n_intervals"],
+            )
+            if data is None:
+                break
+            self.update_refine_parts(data)
+
+    def on_step_changed(self):
+        """ the callbacks triggered by the new current_step, posted one after the other
+        """
+
+        self.post_callback(
+            "on_step_changed",
+            [get_output(id, prop) for id, prop in (
+                ("div_step_description_stepname", "children"), ("div_step_description_steptext", "children"),
+                ("div_tools_name", "children"), ("div_tools_img", "src"), ("div_tools_img", "srcSet"), ("div_danger_img", "src"), ("div_danger_img", "srcSet"),
+                ("p_notifs", "children"), ("i_notifs", "className"), ("div_notifs", "className"),
+            )],
+            [get_prop("current_step", "data", self.current_step)],
+            [get_prop("product", "data", self.product_key)],
+            ["current_step.data"],
+        )
+        self.post_callback(
+            "on_step_changed_2",
+            [
+                [get_output(id, "color") for id in self.get_step_button_ids()],
+                [get_output(id, "id") for id in self.get_nav_button_ids()],
+            ],
+            [get_prop("current_step", "data", self.current_step)],
+            [
+                [get_prop(id, "id", id) for id in self.get_step_button_ids()],
+                [get_prop(id, "id", id) for id in self.get_nav_button_ids()],
+                get_prop("product", "data", self.product_key),
+            ],
+            ["current_step.data"],
+        )
+        # the step arrows now point to the previous and next step
+        index = self.step_keys.index(self.current_step)
+        self.nav_keys = [self.step_keys[index - 1], self.step_keys[(index + 1) % len(self.step_keys)]]
+
+    def run(self, start_barrier : threading.Barrier, deadline : float):
+        start_barrier.wait()
+        self.open_page()
+        if not (self.fetch_figures or "onclick_step_button" in self.callbacks or "on_step_changed" in self.callbacks):
+            # the steps are switched in the browser without any request, only the page load is measured
+            while time.perf_counter() < deadline:
+                self.open_page()
+            return
+
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            self.click()
+            self.recorder.add("step navigation", time.perf_counter() - start, True, 0)
+            if self.think_time_s:
+                time.sleep(self.random.uniform(0, 2 * self.think_time_s))
+
+
+###############################
+# SERVER AND REPORT
+###############################
+
+def start_server():
+    """ starts the app on a free localhost port in a background thread and returns its url
+    """
+
+    from werkzeug.serving import make_server
+
+    from app import create_app
+    from warmup import readiness
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    # "dev" warms the caches in a thread (awaited below), "prod" would also gc.freeze() the objects of the clients
+    server = make_server("127.0.0.1", 0, create_app("dev").server, threaded=True)
+    readiness.wait()
+    if readiness.error:
+        raise RuntimeError(f"warmup failed: {readiness.error}")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def get_dependencies(url : str) -> List[dict]:
+    """ the callbacks of the server, as the browser receives them from /_dash-dependencies
+    """
+
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    connection.request("GET", "/_dash-dependencies", headers={"Accept-Encoding": "gzip"})
+    response = connection.getresponse()
+    data = response.read()
+    if response.getheader("Content-Encoding") == "gzip":
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+def get_registered_callbacks(dependencies : List[dict]) -> dict:
+    """ names of the callbacks of CALLBACK_OUTPUTS the server resolves, their output ids and the
+        poll interval (ms) of background callbacks (None for the others)
+    """
+
+    outputs = {
+        re.sub(r"@[0-9a-f]{32}", "", dependency["output"]): (dependency["output"], (dependency.get("long") or {}).get("interval"))
+        for dependency in dependencies if not dependency.get("clientside_function")
+    }
+    return {name: outputs[output] for name, output in CALLBACK_OUTPUTS.items() if output in outputs}
+
+
+def fetches_figures(dependencies : List[dict]) -> bool:
+    """ whether the browser loads the step figures from /figures (clientside steps.fetch_step_figure)
+    """
+
+    return any(
+        (dependency.get("clientside_function") or {}).get("function_name") == "fetch_step_figure"
+        for dependency in dependencies
+    )
+
+
+def report(recorder : Recorder, elapsed_s : float, n_clients : int) -> dict:
+    results = []
+    print(f"{n_clients} clients, {elapsed_s:.1f} s")
+    print(f"{'request':<28}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'kB/req':>9}")
+    for name in sorted(set(recorder.latencies) | set(recorder.errors), key=lambda name: (name == "step navigation", name)):
+        latencies_ms = np.array(recorder.latencies[name]) * 1000
+        count = len(latencies_ms)
+        p50, p95, p99, maximum = np.percentile(latencies_ms, [50, 95, 99, 100]) if count else (np.nan,) * 4
+        result = {
+            "name": name,
+            "count": count,
+            "errors": recorder.errors[name],
+            "throughput": count / elapsed_s,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(maximum),
+            "bytes_per_request": recorder.bytes[name] / count if count else 0,
+        }
+        results.append(result)
+        print(
+            f"{name:<28}{count:>8}{result['errors']:>8}{result['throughput']:>9.1f}"
+            f"{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}{maximum:>9.1f}{result['bytes_per_request'] / 1000:>9.1f}"
+        )
+    return {"clients": n_clients, "elapsed_s": elapsed_s, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="url of a running server, by default the app is started in this process")
+    parser.add_argument("--clients", type=int, default=10, help="number of simulated clients")
+    parser.add_argument("--duration", type=float, default=20, help="seconds every client clicks through the steps")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause in seconds between two clicks")
+    parser.add_argument("--jump", type=float, default=0.1, help="probability that a client clicks a random step button instead of the next arrow")
+    parser.add_argument("--supersede", type=float, default=0.0, help="probability that a client clicks again before the figure arrived (background callbacks)")
+    parser.add_argument("--product", help="product key, the default product if not set")
+    parser.add_argument("--lod", type=int, help="level of detail the clients request")
+    parser.add_argument("--output", help="json file of the results")
+    args = parser.parse_args()
+
+    url = args.url or start_server()
+    product_key = product_catalog.get_product(args.product).key
+    step_keys = get_step_catalog(product_key).keys()
+    dependencies = get_dependencies(url)
+    callbacks = get_registered_callbacks(dependencies)
+    fetch_figures = fetches_figures(dependencies)
+    print(f"{url}, product {product_key}, server callbacks: {', '.join(sorted(callbacks)) or 'none'}")
+
+    recorder = Recorder()
+    # all clients open the page at the same moment, like a shift starting step 1
+    start_barrier = threading.Barrier(args.clients + 1)
+    clients = [
+        Client(url, product_key, step_keys, args.lod, callbacks, recorder, args.jump, args.think_time, seed,
+               args.supersede, fetch_figures)
+        for seed in range(args.clients)
+    ]
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=client.run, args=(start_barrier, deadline), daemon=True) for client in clients]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+
+    results = report(recorder, time.perf_counter() - start, args.clients)
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(dict(results, url=args.url or "in-process", product=product_key, lod=args.lod), fp, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+""" measures the cold start of the app in fresh processes and checks it against a time budget
+
+    - import: importing app.py (modules only, nothing is built)
+    - create_app: creating the app and warming its caches (APP_ENV=prod)
+    - first page: the requests of the first page load (index, layout, render_page callback)
+    and checks that none of the modules the app must not import at startup is loaded
+
+    exits with 1 if a median exceeds its budget, so it can guard the startup time like a test:
+        python -m benchmarks.startup_budget [--runs 5] [--import-budget 1.0] [--startup-budget 3.0] [--page-budget 0.5]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# unused at runtime, they only cost import time
+FORBIDDEN_MODULES = ("pandas", "tkinter", "turtle")
+
+RENDER_PAGE_BODY = {
+    "output": "page.children",
+    "outputs": {"id": "page", "property": "children"},
+    "inputs": [{"id": "url", "property": "search", "value": ""}, {"id": "lod", "property": "data", "value": None}],
+    "state": [],
+    "changedPropIds": ["url.search"],
+}
+
+
+def measure():
+    """ runs in the worker process, returns the timings in seconds and the forbidden modules that were imported
+    """
+
+    start = time.perf_counter()
+    import app
+    import_s = time.perf_counter() - start
+    imported = [name for name in FORBIDDEN_MODULES if name in sys.modules]
+
+    start = time.perf_counter()
+    dash_app = app.create_app("prod")
+    startup_s = time.perf_counter() - start
+
+    client = dash_app.server.test_client()
+    start = time.perf_counter()
+    responses = [
+        client.get("/"),
+        client.get("/_dash-layout"),
+        client.post("/_dash-update-component", json=RENDER_PAGE_BODY),
+    ]
+    page_s = time.perf_counter() - start
+    failed = [response.status_code for response in responses if response.status_code != 200]
+
+    return {"import": import_s, "create_app": startup_s, "first page": page_s, "imported": imported, "failed": failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh processes")
+    parser.add_argument("--import-budget", type=float, default=1.0, help="seconds to import app.py")
+    parser.add_argument("--startup-budget", type=float, default=3.0, help="seconds to create the app and warm its caches")
+    parser.add_argument("--page-budget", type=float, default=0.5, help="seconds of the first page load")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure()))
+        return 0
+
+    runs = [
+        json.loads(subprocess.check_output([sys.executable, "-m", "benchmarks.startup_budget", "--worker"]).splitlines()[-1])
+        for _ in range(args.runs)
+    ]
+
+    failed = False
+    print(f"{'':<12}{'median s':>10}{'max s':>10}{'budget s':>10}")
+    for name, budget in (("import", args.import_budget), ("create_app", args.startup_budget), ("first page", args.page_budget)):
+        timings = [run[name] for run in runs]
+        median = statistics.median(timings)
+        exceeded = median > budget
+        failed = failed or exceeded
+        print(f"{name:<12}{median:>10.3f}{max(timings):>10.3f}{budget:>10.3f}{'  EXCEEDED' if exceeded else ''}")
+
+    imported = sorted({name for run in runs for name in run["imported"]})
+    if imported:
+        print(f"imported at startup: {', '.join(imported)}")
+    errors = sorted({status for run in runs for status in run["failed"]})
+    if errors:
+        print(f"first page load failed: status {', '.join(map(str, errors))}")
+
+    return 1 if failed or imported or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
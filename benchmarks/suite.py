@@ -0,0 +1,253 @@
+""" benchmark suite of the mesh, figure and callback hot paths, run against the bundled data
+
+    times every benchmark, records the peak python memory (tracemalloc) of one run and
+    the size of the serialized result, and writes all results as json:
+        python -m benchmarks.suite run [--output results.json] [--repeat 5] [--filter callbacks]
+    compares the results of two revisions:
+        python -m benchmarks.suite compare before.json after.json
+
+    the server callbacks of app.py are called directly with synthetic inputs, the figure cache is not warmed
+"""
+import argparse
+import datetime
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, List
+
+import numpy as np
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from plotly.io.json import to_json_plotly
+
+
+class Benchmark:
+    """ a function to time, with the group and parameter it is reported under
+        setup runs before every run and is not timed
+    """
+
+    __slots__ = ("group", "name", "param", "function", "setup")
+
+    def __init__(self, group : str, name : str, param : str, function : Callable, setup : Callable = None):
+        self.group = group
+        self.name = name
+        self.param = param
+        self.function = function
+        self.setup = setup
+
+
+def get_payload_size(result) -> int:
+    """ bytes of the json the server would send for a result
+    """
+
+    try:
+        return len(to_json_plotly(result).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+def run_benchmark(benchmark : Benchmark, repeat : int) -> dict:
+    """ times repeat runs after one untimed run (which fills the caches the benchmark does not clear)
+    """
+
+    if benchmark.setup is not None:
+        benchmark.setup()
+    benchmark.function()
+
+    timings = []
+    for _ in range(repeat):
+        if benchmark.setup is not None:
+            benchmark.setup()
+        start = time.perf_counter()
+        benchmark.function()
+        timings.append(time.perf_counter() - start)
+
+    # one more run to measure the memory, tracing slows it down
+    if benchmark.setup is not None:
+        benchmark.setup()
+    tracemalloc.start()
+    result = benchmark.function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings_ms = np.array(timings) * 1000
+    return {
+        "group": benchmark.group,
+        "name": benchmark.name,
+        "param": benchmark.param,
+        "runs": repeat,
+        "min_ms": float(timings_ms.min()),
+        "median_ms": float(np.median(timings_ms)),
+        "mean_ms": float(timings_ms.mean()),
+        "peak_kb": peak / 1024,
+        "payload_bytes": get_payload_size(result),
+    }
+
+
+###############################
+# BENCHMARKS
+###############################
+
+def with_context(function : Callable, triggered_prop_id : str = None, triggered_value=None) -> Callable:
+    """ calls a callback function as dash does, with the callback context of a triggering input
+    """
+
+    triggered_inputs = [{"prop_id": triggered_prop_id, "value": triggered_value}] if triggered_prop_id else []
+
+    def call(*args):
+        token = context_value.set(AttributeDict(triggered_inputs=triggered_inputs))
+        try:
+            return function(*args)
+        finally:
+            context_value.reset(token)
+
+    return call
+
+
+def get_benchmarks() -> List[Benchmark]:
+    from dash_obj_in_3dmesh import geometry_tools
+
+    import app
+    import obj_parser
+    from data.catalog import get_step_catalog, product_catalog
+    from helper_functions import get_3d_fig, get_figure_data
+    from mesh_cache import mesh_cache
+    from mesh_store import get_part_names
+
+    benchmarks = []
+    step_catalog = get_step_catalog()
+    steps = step_catalog.steps()
+    product_key = product_catalog.get_product().key
+
+    # Meshes, the reference parser and its vectorized replacement
+    for name in get_part_names():
+        benchmarks += [
+            Benchmark("mesh", "geometry_tools.import_geometry", name,
+                      lambda name=name: geometry_tools.import_geometry([name])),
+            Benchmark("mesh", "obj_parser.import_geometry", name,
+                      lambda name=name: obj_parser.import_geometry([name])),
+        ]
+
+    # Figures, every step with a cold (emptied) and a warm mesh cache
+    for step in steps:
+        names = step.object_names
+        benchmarks += [
+            Benchmark("figure", "get_figure_data (cold)", step.key, lambda names=names: get_figure_data(names), setup=mesh_cache.clear),
+            Benchmark("figure", "get_figure_data", step.key, lambda names=names: get_figure_data(names)),
+            Benchmark("figure", "get_3d_fig", step.key, lambda key=step.key: get_3d_fig(key)),
+            Benchmark("figure", "to_json_plotly(get_3d_fig)", step.key, lambda key=step.key: to_json_plotly(get_3d_fig(key))),
+        ]
+
+    # Callbacks
+    def step_button(step_id):
+        return f'{{"index":"{step_id}","type":"step_button"}}.n_clicks'
+
+    step_ids = [step.key for step in steps]
+
+    for previous_step, step in zip(steps, steps[1:]):
+        onclick_step_button = with_context(app.onclick_step_button, step_button(step.key), 1)
+        benchmarks.append(Benchmark(
+            "callback", "onclick_step_button", f"{previous_step.key}->{step.key}",
+            lambda previous_step=previous_step, onclick_step_button=onclick_step_button:
+                onclick_step_button([1] * len(step_ids), [None, None], previous_step.key, None, product_key),
+        ))
+    benchmarks.append(Benchmark(
+        "callback", "onclick_step_button", f"{steps[-1].key}->{steps[0].key}",
+        lambda: with_context(app.onclick_step_button, step_button(steps[0].key), 1)(
+            [1] * len(step_ids), [None, None], steps[-1].key, None, product_key),
+    ))
+
+    for step in steps:
+        on_step_changed = with_context(app.on_step_changed, "current_step.data", step.key)
+        benchmarks.append(Benchmark(
+            "callback", "on_step_changed", step.key,
+            lambda key=step.key, function=on_step_changed: function(key, product_key),
+        ))
+
+    render_page = with_context(app.render_page, "url.search", "")
+    benchmarks.append(Benchmark("callback", "render_page", "default product", lambda: render_page("", None)))
+
+    return benchmarks
+
+
+###############################
+# RUN AND COMPARE
+###############################
+
+def get_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args):
+    benchmarks = [
+        benchmark for benchmark in get_benchmarks()
+        if not args.filter or args.filter in f"{benchmark.group} {benchmark.name}"
+    ]
+
+    results = []
+    for benchmark in benchmarks:
+        result = run_benchmark(benchmark, args.repeat)
+        results.append(result)
+        print(
+            f"{result['group']:<10}{result['name']:<30}{result['param']:<22}"
+            f"{result['median_ms']:>10.2f} ms{result['peak_kb']:>10.0f} kB peak{result['payload_bytes'] / 1000:>10.1f} kB json"
+        )
+
+    output = {
+        "revision": get_revision(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "results": results,
+    }
+    with open(args.output, "w") as fp:
+        json.dump(output, fp, indent=1)
+    print(f"\nmax rss {output['max_rss_kb'] / 1024:.0f} MB, {len(results)} results written to {args.output}")
+
+
+def compare(args):
+    with open(args.before) as fp:
+        before = json.load(fp)
+    with open(args.after) as fp:
+        after = json.load(fp)
+
+    def key(result):
+        return result["group"], result["name"], result["param"]
+
+    before_results = {key(result): result for result in before["results"]}
+    print(f"{before['revision']} -> {after['revision']}, median times")
+    for result in after["results"]:
+        previous = before_results.get(key(result))
+        if previous is None:
+            continue
+        ratio = result["median_ms"] / previous["median_ms"] if previous["median_ms"] else float("nan")
+        print(
+            f"{result['group']:<10}{result['name']:<30}{result['param']:<22}"
+            f"{previous['median_ms']:>10.2f}{result['median_ms']:>10.2f} ms{ratio:>8.2f}x"
+            f"{previous['payload_bytes'] / 1000:>10.1f}{result['payload_bytes'] / 1000:>10.1f} kB"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and write the results")
+    run_parser.add_argument("--output", default="benchmark_results.json", help="json file of the results")
+    run_parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    run_parser.add_argument("--filter", help="only run benchmarks whose group or name contains this text")
+
+    compare_parser = subparsers.add_parser("compare", help="compare the results of two runs")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+
+    args = parser.parse_args()
+    run(args) if args.command == "run" else compare(args)
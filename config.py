@@ -0,0 +1,120 @@
+import os
+
+# =======================
+# SETTINGS
+# =======================
+# every setting can be overridden by an environment variable of the same name
+
+
+def _get_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def _get_floats(name, default):
+    return tuple(float(value) for value in os.environ.get(name, default).split(","))
+
+
+def _get_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
+def _get_choice(name, default, choices):
+    value = os.environ.get(name, default)
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {choices}, got {value!r}")
+    return value
+
+
+# "dev": python app.py with the dash debugger and reloader, caches warmed in the background
+# "prod": served by gunicorn (wsgi.py), caches warmed before the workers are forked
+APP_ENV = _get_choice("APP_ENV", "dev", ("dev", "prod"))
+
+# serve the css/js built by python asset_build.py build (if it exists) instead of the files in assets/
+ASSET_BUILD = _get_bool("ASSET_BUILD", True)
+
+# sqlite product catalog (created from the bundled csv files if missing, see data/catalog.py)
+CATALOG_PATH = os.environ.get("CATALOG_PATH", os.path.join(".", "data", "catalog.sqlite"))
+# product shown without ?product= url parameter, empty: the first product of the catalog
+DEFAULT_PRODUCT = os.environ.get("DEFAULT_PRODUCT", "")
+# number of products whose steps are kept in memory
+CATALOG_CACHED_PRODUCTS = int(_get_float("CATALOG_CACHED_PRODUCTS", 16))
+
+# memory budget of the process-wide parsed-mesh cache (megabytes)
+MESH_CACHE_BUDGET_MB = _get_float("MESH_CACHE_BUDGET_MB", 256)
+
+# seconds a cached mesh is trusted before its obj/mtl files are stat-ed again
+MESH_CACHE_REVALIDATE_S = _get_float("MESH_CACHE_REVALIDATE_S", 2)
+
+# vertices closer than this are merged when the meshes are loaded (obj units), negative: no welding
+MESH_WELD_TOLERANCE = _get_float("MESH_WELD_TOLERANCE", 1e-6)
+
+# parts that are the same mesh moved and rotated are stored once (see mesh_instances.py),
+# largest vertex deviation relative to the size of the part, negative: every part is stored on its own
+MESH_INSTANCE_TOLERANCE = _get_float("MESH_INSTANCE_TOLERANCE", 1e-5)
+
+# share of the faces kept in every level of detail (LOD 0 is the full resolution)
+LOD_RATIOS = _get_floats("LOD_RATIOS", "1,0.5,0.25,0.1")
+# level of detail of the first page load and of clients without a ?lod= parameter or device hint
+DEFAULT_LOD = int(_get_float("DEFAULT_LOD", 0))
+
+# parsing of the obj/mtl files that are missing in the binary stores at startup (see mesh_warmup.py)
+#   "process": a pool of processes, "thread": a pool of threads (the parser mostly runs numpy, which releases the GIL),
+#   "serial": one part after the other
+MESH_WARMUP_EXECUTOR = _get_choice("MESH_WARMUP_EXECUTOR", "process", ("process", "thread", "serial"))
+# number of workers, 0: one per cpu core
+MESH_WARMUP_WORKERS = int(_get_float("MESH_WARMUP_WORKERS", 0))
+
+# parts hidden inside other parts in every view direction (see geometry_index.py):
+#   "keep": drawn like all others, "drop": not sent, "downgrade": sent in the lowest level of detail
+HIDDEN_PARTS = _get_choice("HIDDEN_PARTS", "keep", ("keep", "drop", "downgrade"))
+# rays per side of the ray grid of the visibility test
+GEOMETRY_INDEX_RAYS = _get_float("GEOMETRY_INDEX_RAYS", 128)
+# place the camera so the parts of the step fill the view, instead of the fixed eye (2, 2, 2)
+CAMERA_AUTOFIT = _get_bool("CAMERA_AUTOFIT", False)
+
+# draw all parts with the same material as one trace (see mesh_batch.py)
+# the graph is then redrawn completely on step changes and hover and legend no longer tell the parts apart,
+# STEP_NAVIGATION=client keeps one trace per part
+BATCH_TRACES = _get_bool("BATCH_TRACES", False)
+
+# encoding of the mesh arrays sent to the browser:
+#   "typed": base64 typed arrays (float32 positions, uint16/uint32 indices), decoded by plotly.js >= 2.28
+#   "json": plotly's own json encoding (json lists of numbers with plotly < 6)
+FIGURE_TRANSPORT = _get_choice("FIGURE_TRANSPORT", "typed", ("typed", "json"))
+
+# where step changes are resolved:
+#   "server": the step callbacks run on the server and patch the graph
+#   "cached": the browser loads the precompressed figure of the step from /figures/<step_id>.json
+#   "client": all part geometry is sent once with the page, steps are switched in the browser
+STEP_NAVIGATION = _get_choice("STEP_NAVIGATION", "server", ("server", "cached", "client"))
+
+# build the step figures in background callbacks (a process per request, see background_jobs.py),
+# superseded builds are cancelled. Needs diskcache, multiprocess and psutil
+BACKGROUND_CALLBACKS = _get_bool("BACKGROUND_CALLBACKS", False)
+# results and job registry of the background callbacks, shared by all workers
+BACKGROUND_CACHE_PATH = os.environ.get("BACKGROUND_CACHE_PATH", os.path.join(".", "cache", "background"))
+# milliseconds between the requests of the browser for the result of a background callback
+BACKGROUND_POLL_MS = int(_get_float("BACKGROUND_POLL_MS", 100))
+
+# progressive step changes (STEP_NAVIGATION=server): the parts added by a big step change are sent as coarse
+# proxies first and replaced by their full geometry in the following updates, a few parts per update
+#   "off": always the full geometry, "lod": the lowest level of detail, "box": the bounding box of every part
+PROGRESSIVE_PROXY = _get_choice("PROGRESSIVE_PROXY", "off", ("off", "lod", "box"))
+# number of added parts from which a step change is sent progressively
+PROGRESSIVE_MIN_PARTS = int(_get_float("PROGRESSIVE_MIN_PARTS", 4))
+# parts replaced per update and milliseconds between an update and the request of the next
+PROGRESSIVE_BATCH_PARTS = int(_get_float("PROGRESSIVE_BATCH_PARTS", 2))
+PROGRESSIVE_INTERVAL_MS = int(_get_float("PROGRESSIVE_INTERVAL_MS", 50))
+
+# build the serialized and compressed figure of every step at startup
+FIGURE_CACHE_WARMUP = _get_bool("FIGURE_CACHE_WARMUP", True)
+# memory budget of the cached figures in all their encodings (megabytes)
+FIGURE_CACHE_BUDGET_MB = _get_float("FIGURE_CACHE_BUDGET_MB", 128)
+FIGURE_CACHE_GZIP_LEVEL = int(_get_float("FIGURE_CACHE_GZIP_LEVEL", 9))
+FIGURE_CACHE_BROTLI_QUALITY = int(_get_float("FIGURE_CACHE_BROTLI_QUALITY", 9))
+
+# latency and payload histograms of the callbacks and requests, served at METRICS_PATH (see metrics.py)
+METRICS_ENABLED = _get_bool("METRICS_ENABLED", True)
+METRICS_PATH = os.environ.get("METRICS_PATH", "/metrics")
+# one json log line per request (logger "digital_assembly.requests")
+METRICS_LOG = _get_bool("METRICS_LOG", False)
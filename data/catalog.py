@@ -0,0 +1,330 @@
+""" sqlite catalog of all products with their steps, step parts and materials
+    only the rows of the selected product are read, its steps are kept in memory for
+    the most recently used config.CATALOG_CACHED_PRODUCTS products
+
+    import the csv files of a product (again):
+        python -m data.catalog import doggo --name Spielzeughund --variant "mit Wackelaugen" \
+            --steps data/step_data.csv --materials data/materials.csv
+    list the products of the catalog:
+        python -m data.catalog list
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from typing import List, Optional
+
+import config
+from data.step_catalog import STEPS_ENCODING, STEPS_PATH, Step, StepCatalog, make_steps, read_step_rows
+
+MATERIALS_PATH = os.path.join(".", "data", "materials.csv")
+
+# the bundled product, imported when the catalog does not exist yet
+BUNDLED_PRODUCT = {
+    "key": "doggo",
+    "name": "Spielzeughund",
+    "variant": "mit Wackelaugen",
+    "steps_path": STEPS_PATH,
+    "materials_path": MATERIALS_PATH,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    variant TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    name TEXT,
+    description TEXT,
+    notifications TEXT,
+    tools TEXT,
+    tools_img_path TEXT,
+    PRIMARY KEY (product_id, position),
+    UNIQUE (product_id, key)
+);
+CREATE TABLE IF NOT EXISTS step_parts (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    step_position INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    part_name TEXT NOT NULL,
+    PRIMARY KEY (product_id, step_position, position)
+);
+CREATE TABLE IF NOT EXISTS materials (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    category TEXT,
+    name TEXT NOT NULL,
+    color TEXT,
+    PRIMARY KEY (product_id, position)
+);
+"""
+
+
+class Product:
+    """ one row of the products table
+    """
+
+    __slots__ = ("key", "name", "variant")
+
+    def __init__(self, key, name, variant):
+        self.key = key
+        self.name = name
+        self.variant = variant
+
+
+class Material:
+    """ one row of the material list of a product
+    """
+
+    __slots__ = ("key", "category", "name", "color")
+
+    def __init__(self, key, category, name, color):
+        self.key = key
+        self.category = category
+        self.name = name
+        self.color = color
+
+
+def read_material_rows(path : str = MATERIALS_PATH) -> List[dict]:
+    with open(path, newline="", encoding=STEPS_ENCODING) as fp:
+        return list(csv.DictReader(fp, delimiter=";"))
+
+
+class ProductCatalog:
+    """ read access to the sqlite catalog, every query opens its own connection
+        so the catalog can be used from all threads of the server
+    """
+
+    def __init__(self, path : str = config.CATALOG_PATH, cached_products : int = config.CATALOG_CACHED_PRODUCTS):
+        self.path = path
+        self.cached_products = cached_products
+
+        self._step_catalogs = OrderedDict()
+        # (mtime of the catalog file, key of the default product)
+        self._default = None
+        self._lock = threading.Lock()
+
+    def reset_after_fork(self):
+        """ new locks of the catalog and of the cached step catalogs
+        """
+
+        self._lock = threading.Lock()
+        for step_catalog in self._step_catalogs.values():
+            step_catalog.reset_after_fork()
+
+    def _ensure_catalog(self):
+        if not os.path.exists(self.path):
+            with self._lock:
+                if not os.path.exists(self.path):
+                    import_product(**BUNDLED_PRODUCT, path=self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        self._ensure_catalog()
+        connection = sqlite3.connect(self.path)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def get_products(self) -> List[Product]:
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT key, name, variant FROM products ORDER BY id").fetchall()
+        return [Product(row["key"], row["name"], row["variant"]) for row in rows]
+
+    def get_product(self, key : Optional[str] = None) -> Product:
+        """ returns the product with the key, the default product if key is None
+            (config.DEFAULT_PRODUCT, or the first product of the catalog), raises KeyError for unknown keys
+        """
+
+        with closing(self._connect()) as connection:
+            if key is not None:
+                row = connection.execute("SELECT key, name, variant FROM products WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    raise KeyError(f"unknown product {key!r}")
+            else:
+                row = connection.execute(
+                    "SELECT key, name, variant FROM products WHERE key = ?", (config.DEFAULT_PRODUCT,)
+                ).fetchone()
+                if row is None:
+                    row = connection.execute("SELECT key, name, variant FROM products ORDER BY id LIMIT 1").fetchone()
+        return Product(row["key"], row["name"], row["variant"])
+
+    def has_step(self, product_key : str, step_key : str) -> bool:
+        """ whether the product has a step with the key, without reading its steps
+        """
+
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT 1 FROM steps JOIN products ON products.id = steps.product_id "
+                "WHERE products.key = ? AND steps.key = ?",
+                (product_key, step_key),
+            ).fetchone()
+        return row is not None
+
+    def get_default_key(self) -> str:
+        """ key of the default product, looked up again after the catalog file changed
+        """
+
+        self._ensure_catalog()
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        default = self._default
+        if default is None or default[0] != mtime_ns:
+            default = self._default = (mtime_ns, self.get_product().key)
+        return default[1]
+
+    def has_product(self, key : str) -> bool:
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT 1 FROM products WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def read_steps(self, product_key : str) -> List[Step]:
+        with closing(self._connect()) as connection:
+            step_rows = connection.execute(
+                "SELECT steps.* FROM steps JOIN products ON products.id = steps.product_id "
+                "WHERE products.key = ? ORDER BY steps.position",
+                (product_key,),
+            ).fetchall()
+            part_rows = connection.execute(
+                "SELECT step_parts.step_position, step_parts.part_name "
+                "FROM step_parts JOIN products ON products.id = step_parts.product_id "
+                "WHERE products.key = ? ORDER BY step_parts.step_position, step_parts.position",
+                (product_key,),
+            ).fetchall()
+        if not step_rows:
+            raise KeyError(f"unknown product {product_key!r}")
+
+        object_names = {}
+        for part_row in part_rows:
+            object_names.setdefault(part_row["step_position"], []).append(part_row["part_name"])
+
+        rows = []
+        for step_row in step_rows:
+            row = dict(step_row)
+            row["object_names"] = object_names.get(step_row["position"], [])
+            rows.append(row)
+        return make_steps(rows)
+
+    def get_materials(self, product_key : str) -> List[Material]:
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT materials.position, materials.category, materials.name, materials.color "
+                "FROM materials JOIN products ON products.id = materials.product_id "
+                "WHERE products.key = ? ORDER BY materials.position",
+                (product_key,),
+            ).fetchall()
+        return [Material(row["position"], row["category"], row["name"], row["color"]) for row in rows]
+
+    def get_step_catalog(self, product_key : Optional[str] = None) -> StepCatalog:
+        """ returns the steps of a product (of the default product if product_key is None)
+            the steps are read from the catalog on first use and again after the catalog file changed,
+            raises KeyError for unknown products
+        """
+
+        if product_key is None:
+            product_key = self.get_default_key()
+
+        with self._lock:
+            step_catalog = self._step_catalogs.get(product_key)
+            if step_catalog is not None:
+                self._step_catalogs.move_to_end(product_key)
+                return step_catalog
+
+        # unknown keys (e.g. a wrong ?product= parameter) must not evict the steps of real products
+        if not self.has_product(product_key):
+            raise KeyError(f"unknown product {product_key!r}")
+
+        with self._lock:
+            step_catalog = self._step_catalogs.get(product_key)
+            if step_catalog is None:
+                step_catalog = StepCatalog(self.path, read_steps=lambda path: self.read_steps(product_key))
+                self._step_catalogs[product_key] = step_catalog
+                while len(self._step_catalogs) > self.cached_products:
+                    self._step_catalogs.popitem(last=False)
+            else:
+                self._step_catalogs.move_to_end(product_key)
+        return step_catalog
+
+
+###############################
+# IMPORT
+###############################
+
+def import_product(key : str, name : str, variant : Optional[str], steps_path : str, materials_path : str,
+                   path : str = config.CATALOG_PATH):
+    """ imports (or replaces) a product from its step csv and material csv
+    """
+
+    step_rows = read_step_rows(steps_path)
+    material_rows = read_material_rows(materials_path)
+
+    with closing(sqlite3.connect(path)) as connection, connection:
+        connection.executescript(SCHEMA)
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute("DELETE FROM products WHERE key = ?", (key,))
+        product_id = connection.execute(
+            "INSERT INTO products (key, name, variant) VALUES (?, ?, ?)", (key, name, variant)
+        ).lastrowid
+
+        connection.executemany(
+            "INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (product_id, position, row["key"], row["name"] or None, row["description"] or None,
+                 row["notifications"] or None, row["tools"] or None, row["tools_img_path"] or None)
+                for position, row in enumerate(step_rows)
+            ],
+        )
+        connection.executemany(
+            "INSERT INTO step_parts VALUES (?, ?, ?, ?)",
+            [
+                (product_id, step_position, position, part_name)
+                for step_position, row in enumerate(step_rows)
+                for position, part_name in enumerate(row["object_names"])
+            ],
+        )
+        connection.executemany(
+            "INSERT INTO materials VALUES (?, ?, ?, ?, ?)",
+            [
+                (product_id, position, row["category"] or None, row["name"], row["color"] or None)
+                for position, row in enumerate(material_rows)
+            ],
+        )
+
+    return len(step_rows), len(material_rows)
+
+
+# shared by all requests of the process
+product_catalog = ProductCatalog()
+
+
+def get_step_catalog(product_key : Optional[str] = None) -> StepCatalog:
+    return product_catalog.get_step_catalog(product_key)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import products into the sqlite catalog")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="import the csv files of a product")
+    import_parser.add_argument("key", help="key of the product, e.g. used in ?product=<key>")
+    import_parser.add_argument("--name", required=True, help="name of the product")
+    import_parser.add_argument("--variant", help="variant of the product")
+    import_parser.add_argument("--steps", default=STEPS_PATH, help="step csv of the product")
+    import_parser.add_argument("--materials", default=MATERIALS_PATH, help="material csv of the product")
+
+    subparsers.add_parser("list", help="list the products of the catalog")
+    parser.add_argument("--catalog", default=config.CATALOG_PATH, help="path of the catalog file")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        n_steps, n_materials = import_product(args.key, args.name, args.variant, args.steps, args.materials, args.catalog)
+        print(f"imported {args.key}: {n_steps} steps, {n_materials} materials into {args.catalog}")
+    else:
+        catalog = ProductCatalog(args.catalog)
+        for product in catalog.get_products():
+            print(f"{product.key:<24}{product.name} ({product.variant})")
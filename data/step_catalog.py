@@ -0,0 +1,150 @@
+""" assembly steps of a product, loaded once into read-only step records
+    the source (step csv or product catalog) is only read again after its mtime changed
+"""
+import csv
+import os
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from metrics import timed_stage
+
+STEPS_PATH = os.path.join(".", "data", "step_data.csv")
+STEPS_ENCODING = "ISO-8859-1"
+
+
+class Step:
+    """ one assembly step of a product, empty cells are None
+        previous_key and next_key link to the neighbouring steps (wrapping around at the ends)
+    """
+
+    __slots__ = (
+        "key", "name", "object_names", "description", "notifications", "tools", "tools_img_path",
+        "position", "previous_key", "next_key",
+    )
+
+    def __init__(self, key, name, object_names, description, notifications, tools, tools_img_path,
+                 position, previous_key, next_key):
+        for attribute, value in zip(self.__slots__, (
+            key, name, object_names, description, notifications, tools, tools_img_path,
+            position, previous_key, next_key,
+        )):
+            object.__setattr__(self, attribute, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self):
+        return f"Step({self.key!r}, {self.name!r})"
+
+
+def _get_cell(row : dict, column : str) -> Optional[str]:
+    value = row.get(column)
+    return value if value else None
+
+
+def make_steps(rows : List[dict]) -> List[Step]:
+    """ creates the linked step records of the rows of a product, in step order
+        object_names of every row is a sequence of part names
+    """
+
+    keys = [row["key"] for row in rows]
+    steps = []
+    for position, row in enumerate(rows):
+        steps.append(Step(
+            key=row["key"],
+            name=_get_cell(row, "name"),
+            object_names=tuple(row["object_names"]),
+            description=_get_cell(row, "description"),
+            notifications=_get_cell(row, "notifications"),
+            tools=_get_cell(row, "tools"),
+            tools_img_path=_get_cell(row, "tools_img_path"),
+            position=position,
+            previous_key=keys[position - 1],
+            next_key=keys[(position + 1) % len(keys)],
+        ))
+    return steps
+
+
+def read_step_rows(path : str = STEPS_PATH) -> List[dict]:
+    """ reads the rows of a step csv
+    """
+
+    with open(path, newline="", encoding=STEPS_ENCODING) as fp:
+        rows = list(csv.DictReader(fp, delimiter=";"))
+
+    for row in rows:
+        # comma-separated part names, e.g. "HolzquaderL2, VerbindungsstueckS1"
+        row["object_names"] = row["object_names"].replace(" ", "").split(",")
+    return rows
+
+
+def read_steps(path : str = STEPS_PATH) -> List[Step]:
+    """ parses a step csv into step records, in the order of the file
+    """
+
+    return make_steps(read_step_rows(path))
+
+
+class StepCatalog:
+    """ all steps of a product with lookup by key
+        read_steps(path) loads the steps, path is watched for changes
+    """
+
+    def __init__(self, path : str = STEPS_PATH, read_steps : Callable[[str], List[Step]] = read_steps):
+        self.path = path
+        self.read_steps = read_steps
+
+        self._steps : Tuple[Step, ...] = ()
+        self._steps_by_key : Dict[str, Step] = {}
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    def _validate(self):
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        if mtime_ns == self._mtime_ns:
+            return
+
+        with self._lock:
+            if mtime_ns == self._mtime_ns:
+                return
+            with timed_stage("read_steps"):
+                steps = tuple(self.read_steps(self.path))
+            # swapped together, readers never see a half loaded catalog
+            self._steps, self._steps_by_key = steps, {step.key: step for step in steps}
+            self._mtime_ns = mtime_ns
+            self.loads += 1
+
+    def get(self, key : str) -> Step:
+        """ returns the step with the key, raises KeyError for unknown keys
+        """
+
+        self._validate()
+        return self._steps_by_key[key]
+
+    def steps(self) -> Tuple[Step, ...]:
+        self._validate()
+        return self._steps
+
+    def keys(self) -> List[str]:
+        return [step.key for step in self.steps()]
+
+    def get_part_names(self) -> List[str]:
+        """ returns every part that occurs in any step, in the order of its first appearance
+        """
+
+        return list(dict.fromkeys(name for step in self.steps() for name in step.object_names))
+
+    def __contains__(self, key) -> bool:
+        self._validate()
+        return key in self._steps_by_key
+
+    def __iter__(self) -> Iterator[Step]:
+        return iter(self.steps())
+
+    def __len__(self) -> int:
+        return len(self.steps())
+
@@ -0,0 +1,229 @@
+import glob
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+import brotli
+from flask import Flask, Response, abort, request
+from plotly.io.json import to_json_plotly
+
+import config
+from data.catalog import get_step_catalog, product_catalog
+from helper_functions import get_3d_fig
+from mesh_lod import get_lod
+from metrics import timed_stage
+from obj_parser import GEOMETRY_PATH
+
+
+def get_data_signature(catalog_path : str = config.CATALOG_PATH, geometry_path : str = GEOMETRY_PATH) -> tuple:
+    """ returns mtime and size of the product catalog and of all obj/mtl files
+    """
+
+    paths = [catalog_path]
+    paths += sorted(glob.glob(os.path.join(geometry_path, "*.obj")))
+    paths += sorted(glob.glob(os.path.join(geometry_path, "*.mtl")))
+
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class CachedFigure:
+    """ serialized figure of a step in every encoding the server sends
+    """
+
+    __slots__ = ("identity", "gzip", "br", "etag")
+
+    def __init__(self, figure_json : bytes):
+        self.identity = figure_json
+        self.gzip = gzip.compress(figure_json, compresslevel=config.FIGURE_CACHE_GZIP_LEVEL)
+        self.br = brotli.compress(figure_json, quality=config.FIGURE_CACHE_BROTLI_QUALITY)
+        self.etag = hashlib.sha1(figure_json).hexdigest()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.identity) + len(self.gzip) + len(self.br)
+
+
+class FigureCache:
+    """ serialized and compressed 3D figure of the requested steps of every product, least recently used
+        figures are evicted once the memory budget is exceeded
+        the cache is dropped when the product catalog or any obj/mtl file changes
+    """
+
+    def __init__(
+        self,
+        build_figure : Callable = get_3d_fig,
+        budget_bytes : int = int(config.FIGURE_CACHE_BUDGET_MB * 1024 * 1024),
+        catalog_path : str = config.CATALOG_PATH,
+        geometry_path : str = GEOMETRY_PATH,
+        revalidate_s : float = config.MESH_CACHE_REVALIDATE_S,
+    ):
+        self.build_figure = build_figure
+        self.budget_bytes = budget_bytes
+        self.catalog_path = catalog_path
+        self.geometry_path = geometry_path
+        self.revalidate_s = revalidate_s
+
+        self._figures : Dict[tuple, CachedFigure] = OrderedDict()
+        # figures that are being built, requests for them wait for the same build
+        self._building : Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self.nbytes = 0
+        self.builds = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def reset_after_fork(self):
+        """ new lock, the builds running in threads of the parent process are not waited for
+        """
+
+        self._lock = threading.Lock()
+        self._building = {}
+
+    def _validate(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.revalidate_s:
+            return
+        self._checked_at = now
+
+        signature = get_data_signature(self.catalog_path, self.geometry_path)
+        if signature != self._signature:
+            if self._signature is not None:
+                self.invalidations += 1
+            self._signature = signature
+            self._figures.clear()
+            self.nbytes = 0
+            # builds started before the change are not cached
+            self._building = {}
+
+    def warm(self, lod : int = config.DEFAULT_LOD):
+        """ builds the figure of every step of the default product
+            (other products and levels of detail are built on their first request)
+        """
+
+        product_key = product_catalog.get_default_key()
+        for step_id in get_step_catalog(product_key).keys():
+            self.get(product_key, step_id, lod)
+
+    def get(self, product_key : str, step_id : str, lod : int = 0) -> CachedFigure:
+        key = (product_key, step_id, lod)
+        with self._lock:
+            self._validate()
+            cached_figure = self._figures.get(key)
+            if cached_figure is not None:
+                self._figures.move_to_end(key)
+                return cached_figure
+
+            future = self._building.get(key)
+            if future is None:
+                future = self._building[key] = Future()
+                building = self._building
+            else:
+                building = None
+
+        if building is None:
+            return future.result()
+
+        # Build outside of the lock so cached figures can be served meanwhile
+        try:
+            with timed_stage("build_figure"):
+                figure = self.build_figure(step_id, lod, product=product_key)
+            with timed_stage("serialize_figure"):
+                figure_json = to_json_plotly(figure).encode("utf-8")
+            cached_figure = CachedFigure(figure_json)
+        except BaseException as error:
+            with self._lock:
+                building.pop(key, None)
+            future.set_exception(error)
+            raise
+
+        with self._lock:
+            building.pop(key, None)
+            self.builds += 1
+            # not cached if the data changed during the build
+            if building is self._building:
+                self._insert(key, cached_figure)
+        future.set_result(cached_figure)
+        return cached_figure
+
+    def _insert(self, key, cached_figure : CachedFigure):
+        if key in self._figures:
+            self.nbytes -= self._figures.pop(key).nbytes
+        self._figures[key] = cached_figure
+        self.nbytes += cached_figure.nbytes
+
+        # keep at least the newest figure, even if it alone exceeds the budget
+        while self.nbytes > self.budget_bytes and len(self._figures) > 1:
+            self.nbytes -= self._figures.popitem(last=False)[1].nbytes
+            self.evictions += 1
+
+    def get_response(self, product_key : str, step_id : str) -> Response:
+        """ answers a figure request with the smallest encoding the client accepts
+            and with 304 if the client already has the figure
+        """
+
+        try:
+            step_catalog = get_step_catalog(product_key)
+            known_step = step_id in step_catalog
+        except KeyError:
+            known_step = False
+        if not known_step:
+            abort(404)
+        cached_figure = self.get(product_key, step_id, get_lod(request.args.get("lod")))
+
+        if "br" in request.accept_encodings:
+            encoding, body = "br", cached_figure.br
+        elif "gzip" in request.accept_encodings:
+            encoding, body = "gzip", cached_figure.gzip
+        else:
+            encoding, body = None, cached_figure.identity
+
+        # every encoding is a different representation and gets its own etag
+        etag = cached_figure.etag + ("-" + encoding if encoding else "")
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype="application/json")
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.headers["Vary"] = "Accept-Encoding"
+        # the browser may keep the figure, but has to ask (cheaply) whether it is still current
+        response.headers["Cache-Control"] = "no-cache"
+
+        return response
+
+    def register_route(self, server : Flask):
+        """ serves the cached figures at /figures/<product_key>/<step_id>.json?lod=<lod>
+        """
+
+        server.add_url_rule("/figures/<product_key>/<step_id>.json", "figures", self.get_response)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._figures),
+                "nbytes": self.nbytes,
+                "budget_bytes": self.budget_bytes,
+                "builds": self.builds,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "bytes": sum(len(f.identity) for f in self._figures.values()),
+                "gzip_bytes": sum(len(f.gzip) for f in self._figures.values()),
+                "br_bytes": sum(len(f.br) for f in self._figures.values()),
+            }
+
+
+# shared by all requests of the process
+figure_cache = FigureCache()
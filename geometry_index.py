@@ -0,0 +1,259 @@
+""" geometry index of the steps: bounding box of every part, the parts of a step that are hidden inside
+    other parts and the camera that fits the step into the view
+
+    the parts are tested with orthographic ray casts from VIEW_DIRECTIONS (the faces, edges and corners of a cube).
+    The rays are cast as a grid of config.GEOMETRY_INDEX_RAYS x GEOMETRY_INDEX_RAYS rays over the step, all
+    triangles are intersected with the rays that pass through their bounding box. A part is hidden if, from every
+    direction, rays hit it and another part was hit first by each of them. A part that no ray of a direction hit
+    (small parts between the rays) counts as visible
+
+    print the hidden parts and the camera of every step:
+        python geometry_index.py report [--product <key>]
+"""
+import argparse
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+import config
+from mesh_cache import mesh_cache
+from mesh_store import get_file_signature
+
+VIEW_DIRECTIONS = np.array(
+    [direction for direction in itertools.product((-1, 0, 1), repeat=3) if any(direction)], dtype=float,
+)
+VIEW_DIRECTIONS /= np.linalg.norm(VIEW_DIRECTIONS, axis=1)[:, None]
+
+# default direction of the camera (seen from the front, right and top, y is up)
+EYE_DIRECTION = np.array([1.0, 1.0, 1.0]) / math.sqrt(3)
+# vertical field of view of plotly's 3d scenes
+FOVY = math.pi / 4
+# plotly pads the autorange of every axis by 1/32 of its range on both sides
+AXIS_PADDING = 1 / 16
+
+
+def get_bounds(vertices : np.ndarray) -> np.ndarray:
+    """ axis-aligned bounding box [[min x, min y, min z], [max x, max y, max z]]
+    """
+
+    return np.array([vertices.min(axis=0), vertices.max(axis=0)])
+
+
+def _get_basis(direction : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ two unit vectors perpendicular to the direction and to each other
+    """
+
+    helper = np.array([1.0, 0.0, 0.0]) if abs(direction[0]) < 0.9 else np.array([0.0, 1.0, 0.0])
+    u = np.cross(direction, helper)
+    u /= np.linalg.norm(u)
+    return u, np.cross(direction, u)
+
+
+def cast_rays(vertices : np.ndarray, triangles : np.ndarray, direction : np.ndarray, resolution : int) -> Tuple[np.ndarray, np.ndarray]:
+    """ indices of the triangles that are the nearest hit of at least one ray of the grid
+        and indices of the triangles hit by any ray
+        vertices: (n, 3), triangles: (m, 3) vertex indices
+    """
+
+    u, v = _get_basis(direction)
+    # position of every vertex on the ray grid and its depth along the rays
+    a, b, depth = vertices @ u, vertices @ v, vertices @ direction
+    a_min, b_min = a.min(), b.min()
+    cell = max(a.max() - a_min, b.max() - b_min) / resolution or 1.0
+    a = (a - a_min) / cell - 0.5
+    b = (b - b_min) / cell - 0.5
+
+    ta, tb, td = a[triangles], b[triangles], depth[triangles]
+    # rays (at integer grid positions) within the bounding box of each triangle
+    a0 = np.ceil(ta.min(axis=1)).astype(np.int64)
+    a1 = np.floor(ta.max(axis=1)).astype(np.int64)
+    b0 = np.ceil(tb.min(axis=1)).astype(np.int64)
+    b1 = np.floor(tb.max(axis=1)).astype(np.int64)
+    widths = np.maximum(a1 - a0 + 1, 0)
+    counts = widths * np.maximum(b1 - b0 + 1, 0)
+
+    triangle = np.repeat(np.arange(len(triangles)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    ray_a = a0[triangle] + offset % np.maximum(widths[triangle], 1)
+    ray_b = b0[triangle] + offset // np.maximum(widths[triangle], 1)
+
+    # barycentric coordinates of the rays in their triangles
+    (pa0, pa1, pa2), (pb0, pb1, pb2) = ta[triangle].T, tb[triangle].T
+    area = (pa1 - pa0) * (pb2 - pb0) - (pa2 - pa0) * (pb1 - pb0)
+    epsilon = 1e-9
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w1 = ((ray_a - pa0) * (pb2 - pb0) - (pa2 - pa0) * (ray_b - pb0)) / area
+        w2 = ((pa1 - pa0) * (ray_b - pb0) - (ray_a - pa0) * (pb1 - pb0)) / area
+        hit = (area != 0) & (w1 >= -epsilon) & (w2 >= -epsilon) & (w1 + w2 <= 1 + epsilon)
+
+    triangle, ray_a, ray_b, w1, w2 = triangle[hit], ray_a[hit], ray_b[hit], w1[hit], w2[hit]
+    d0, d1, d2 = td[triangle].T
+    hit_depth = d0 + w1 * (d1 - d0) + w2 * (d2 - d0)
+
+    # the nearest hit of every ray
+    ray = ray_b * (resolution + 2) + ray_a
+    order = np.lexsort((hit_depth, ray))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = ray[order][1:] != ray[order][:-1]
+    return np.unique(triangle[order][first]), np.unique(triangle)
+
+
+def get_visible_parts(meshes : Sequence[Tuple[np.ndarray, np.ndarray]], resolution : int = None) -> np.ndarray:
+    """ mask of the meshes ((vertices, triangles) per part) that are seen from at least one view direction,
+        or that no ray of a view direction hit
+    """
+
+    resolution = resolution or int(config.GEOMETRY_INDEX_RAYS)
+    offsets = np.cumsum([0] + [len(vertices) for vertices, _ in meshes])
+    vertices = np.concatenate([np.asarray(vertices, dtype=float) for vertices, _ in meshes])
+    triangles = np.concatenate([
+        np.asarray(triangles, dtype=np.int64) + offset for (_, triangles), offset in zip(meshes, offsets)
+    ])
+    part_of_triangle = np.repeat(np.arange(len(meshes)), [len(triangles) for _, triangles in meshes])
+
+    visible = np.zeros(len(meshes), dtype=bool)
+    for direction in VIEW_DIRECTIONS:
+        nearest, hit = cast_rays(vertices, triangles, direction, resolution)
+        visible[part_of_triangle[nearest]] = True
+        # parts between the rays were not sampled, they are not known to be hidden
+        sampled = np.zeros(len(meshes), dtype=bool)
+        sampled[part_of_triangle[hit]] = True
+        visible |= ~sampled
+        if visible.all():
+            break
+    return visible
+
+
+def get_camera(bounds : np.ndarray) -> dict:
+    """ camera of a plotly scene (aspectmode "data") that shows the whole bounding box,
+        looking at it from EYE_DIRECTION
+
+        plotly scales every axis to range / (geometric mean of the ranges), so the eye
+        is placed in these units at the distance the padded box fits into the field of view
+    """
+
+    ranges = np.maximum(bounds[1] - bounds[0], 1e-9)
+    aspect = ranges / np.exp(np.log(ranges).mean()) * (1 + AXIS_PADDING)
+    distance = 0.5 * np.linalg.norm(aspect) / math.sin(FOVY / 2)
+    x, y, z = (round(float(value), 4) for value in EYE_DIRECTION * distance)
+    return {
+        "eye": {"x": x, "y": y, "z": z},
+        "up": {"x": 0, "y": 1, "z": 0},
+    }
+
+
+class GeometryIndex:
+    """ bounding boxes of the parts (from the full resolution meshes) and the hidden parts of the part lists
+        of the steps, computed on first use and kept until the obj/mtl files of a part change
+        (the files are stat-ed again after revalidate_s like in MeshCache)
+    """
+
+    def __init__(self, max_steps : int = 256, revalidate_s : float = config.MESH_CACHE_REVALIDATE_S):
+        self.max_steps = max_steps
+        self.revalidate_s = revalidate_s
+        # part name: (file signature, time it was taken)
+        self._signatures : Dict[str, Tuple[tuple, float]] = {}
+        self._bounds : Dict[str, Tuple[tuple, np.ndarray]] = {}
+        self._hidden = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    def _get_mesh(self, name : str) -> Tuple[np.ndarray, np.ndarray]:
+        trace = mesh_cache.get(name, 0)[0]
+        vertices = np.column_stack([trace.x, trace.y, trace.z])
+        triangles = np.column_stack([trace.i, trace.j, trace.k])
+        return vertices, triangles
+
+    def _get_signature(self, name : str) -> tuple:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._signatures.get(name)
+        if entry is not None and now - entry[1] < self.revalidate_s:
+            return entry[0]
+
+        signature = get_file_signature(name)
+        with self._lock:
+            self._signatures[name] = (signature, now)
+        return signature
+
+    def get_part_bounds(self, name : str) -> np.ndarray:
+        signature = self._get_signature(name)
+        with self._lock:
+            entry = self._bounds.get(name)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        bounds = get_bounds(self._get_mesh(name)[0])
+        with self._lock:
+            self._bounds[name] = (signature, bounds)
+        return bounds
+
+    def get_bounds(self, names : Sequence[str]) -> np.ndarray:
+        """ bounding box of the parts of a step
+        """
+
+        part_bounds = np.array([self.get_part_bounds(name) for name in names])
+        return np.array([part_bounds[:, 0].min(axis=0), part_bounds[:, 1].max(axis=0)])
+
+    def get_camera(self, names : Sequence[str]) -> dict:
+        return get_camera(self.get_bounds(names))
+
+    def get_hidden_parts(self, names : Sequence[str]) -> frozenset:
+        """ the parts of a step (its cumulative part list) that are not seen from any view direction
+        """
+
+        key = tuple((name, self._get_signature(name)) for name in names)
+        with self._lock:
+            hidden = self._hidden.get(key)
+            if hidden is not None:
+                self._hidden.move_to_end(key)
+                return hidden
+
+        hidden = frozenset()
+        if len(names) > 1:
+            visible = get_visible_parts([self._get_mesh(name) for name in names])
+            hidden = frozenset(name for name, seen in zip(names, visible) if not seen)
+
+        with self._lock:
+            self._hidden[key] = hidden
+            self.builds += 1
+            while len(self._hidden) > self.max_steps:
+                self._hidden.popitem(last=False)
+        return hidden
+
+
+# shared by all callbacks of the process
+geometry_index = GeometryIndex()
+
+
+def print_report(product_key : str = None):
+    # imported here, the report needs the step data
+    from data.catalog import get_step_catalog
+
+    print(f"{'step':<10}{'parts':>6}{'hidden':>8}{'ms':>8}  eye / hidden parts")
+    for step in get_step_catalog(product_key):
+        start = time.perf_counter()
+        hidden = geometry_index.get_hidden_parts(step.object_names)
+        duration_ms = (time.perf_counter() - start) * 1000
+        eye = geometry_index.get_camera(step.object_names)["eye"]
+        print(
+            f"{step.key:<10}{len(step.object_names):>6}{len(hidden):>8}{duration_ms:>8.1f}"
+            f"  ({eye['x']:.2f}, {eye['y']:.2f}, {eye['z']:.2f}) {', '.join(sorted(hidden))}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hidden parts and camera of every step")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--product", default=None, help="key of the product (default product if omitted)")
+    args = parser.parse_args()
+
+    print_report(args.product)
@@ -0,0 +1,14 @@
+""" gunicorn settings of the production server (wsgi.py), overridable by environment variables
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("THREADS", 2))
+timeout = int(os.environ.get("TIMEOUT", 60))
+
+# import the app and warm its caches once in the master, the workers share them copy-on-write
+preload_app = True
+
+accesslog = os.environ.get("ACCESS_LOG", None)
@@ -1,12 +1,23 @@
-from operator import invert
-from dash import html
+from dash import html, no_update, Patch
 import dash_bootstrap_components as dbc
+import numpy as np
 import plotly.graph_objects as go
-from typing import List
+from typing import List, Sequence, Tuple
 
-from dash_obj_in_3dmesh import geometry_tools
+import config
+from asset_build import BANNER_IMAGES, BANNER_SIZES, get_image_sources
+from data.catalog import get_step_catalog
+from geometry_index import geometry_index
+from mesh_batch import batch_traces
+from mesh_cache import mesh_cache
+from obj_parser import make_mesh3d
+from typed_arrays import encode_traces
 
-from data.mock_data import get_steps
+# the 12 triangles of the faces of a box, on the corners of get_box_vertices
+BOX_TRIANGLES = np.array([
+    [0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5], [0, 4, 5], [0, 5, 1],
+    [2, 3, 7], [2, 7, 6], [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3],
+], dtype=np.uint8)
 
 def make_div_minimizable(div, minimize_to, align, div_title=""):
     """ takes a div and encapsulates it in a div that contains a minimize button
@@ -158,8 +169,12 @@ def invert_direction(direction):
         return "up"
     
 
-def get_3d_fig(step_id):
+def get_3d_fig(step_id, lod=0, batch=None, product=None, transport=None):
     """ define settings of the 3D figure
+        lod selects the level of detail of the part meshes (see mesh_lod.py)
+        batch merges the parts of the same material into one trace (default: config.BATCH_TRACES)
+        product is the key of the product in the catalog (default product if None)
+        transport is the encoding of the mesh arrays (default: config.FIGURE_TRANSPORT)
     """
       
     axis_template = {
@@ -202,37 +217,269 @@ def get_3d_fig(step_id):
     }
     
     # Get the object names for the step (excel-file)
-    df_steps = get_steps()
-    object_names = df_steps.loc[step_id]["object_names"]
+    object_names = get_step_catalog(product).get(step_id).object_names
+    if config.CAMERA_AUTOFIT:
+        plot_layout["scene"]["camera"] = geometry_index.get_camera(object_names)
 
-    figure_data = get_figure_data(object_names)
+    figure_data = get_parts_figure_data(get_step_parts(object_names, lod))
+    if config.BATCH_TRACES if batch is None else batch:
+        figure_data = batch_traces(figure_data)
+    figure_data = get_transport_data(figure_data, transport)
     
     fig = go.Figure(
         data = figure_data,
-        layout=plot_layout
+        layout=plot_layout,
+        _validate=False,    # keeps the typed array specs of the traces as they are
     )
     
     return fig
 
 
-def get_figure_data(figure_names : List[str]) -> List[go.Mesh3d]:
+def get_step_parts(object_names : List[str], lod : int = 0) -> List[Tuple[str, int]]:
+    """ (part name, level of detail) of the traces of a step,
+        the parts hidden inside others are dropped or shown in the lowest level of detail (config.HIDDEN_PARTS)
+    """
+
+    if config.HIDDEN_PARTS == "keep":
+        return [(name, lod) for name in object_names]
+
+    hidden = geometry_index.get_hidden_parts(object_names)
+    if config.HIDDEN_PARTS == "drop":
+        return [(name, lod) for name in object_names if name not in hidden]
+    lowest_lod = len(config.LOD_RATIOS) - 1
+    return [(name, lowest_lod if name in hidden else lod) for name in object_names]
+
+
+def get_step_diff(previous_names : List[str], names : List[str]):
+    """ compares the parts of two steps
+        returns the trace indices to delete from the previous figure and the part names to append,
+        or None if the new part order can't be reached by deleting and appending traces
+    """
+
+    names_set = set(names)
+    removed_indices = [index for index, name in enumerate(previous_names) if name not in names_set]
+    kept_names = [name for name in previous_names if name in names_set]
+
+    kept_set = set(kept_names)
+    added_names = [name for name in names if name not in kept_set]
+
+    if kept_names + added_names != list(names):
+        return None
+
+    return removed_indices, added_names
+
+
+def get_progressive_fig_patch(previous_step_id, step_id, lod=0, product=None, unrefined=(), progressive=None):
+    """ returns the update of the 3D figure shown for previous_step_id to the figure of step_id
+        only the traces of parts that differ between both steps are sent,
+        a complete figure is returned if the steps can't be patched into each other
+        if PROGRESSIVE_MIN_PARTS parts or more are added they are sent as proxies
+        (see get_part_proxy), to be replaced by get_refinement_patch
+        unrefined: the parts of the previous figure that are still shown as proxies
+        progressive: send proxies (default: config.PROGRESSIVE_PROXY is not "off")
+        returns the update and the names of the parts of the new figure that are shown as proxies
+    """
+
+    # batched traces hold several parts, they can't be added or removed one by one
+    if config.BATCH_TRACES:
+        return get_3d_fig(step_id, lod, product=product), []
+
+    step_catalog = get_step_catalog(product)
+    previous_names = step_catalog.get(previous_step_id).object_names
+    names = step_catalog.get(step_id).object_names
+
+    # a part that becomes hidden (or visible again) is replaced in its other level of detail
+    parts = get_step_parts(names, lod)
+    diff = get_step_diff(get_step_parts(previous_names, lod), parts)
+    if diff is None:
+        return get_3d_fig(step_id, lod, product=product), []
+
+    removed_indices, added_parts = diff
+    # proxies of the previous step that are kept stay in the figure until they are refined
+    added_names = {name for name, _ in added_parts}
+    unrefined = [name for name, _ in parts if name in set(unrefined) and name not in added_names]
+    if not removed_indices and not added_parts:
+        return no_update, unrefined
+
+    if config.PROGRESSIVE_PROXY != "off" if progressive is None else progressive:
+        if len(added_parts) >= config.PROGRESSIVE_MIN_PARTS:
+            unrefined += [name for name, part_lod in added_parts if has_part_proxy(part_lod)]
+
+    patched_fig = Patch()
+    # delete from the back, so the remaining indices stay valid
+    for index in reversed(removed_indices):
+        del patched_fig["data"][index]
+    if added_parts:
+        patched_fig["data"].extend(get_transport_data(get_parts_figure_data(added_parts, proxy_names=unrefined)))
+    if config.CAMERA_AUTOFIT:
+        camera = geometry_index.get_camera(names)
+        if camera != geometry_index.get_camera(previous_names):
+            patched_fig["layout"]["scene"]["camera"] = camera
+
+    return patched_fig, unrefined
+
+
+def get_refinement_patch(step_id, refined_names : Sequence[str], lod=0, product=None):
+    """ returns the update that replaces the proxies of the parts refined_names of a step by their traces
+    """
+
+    refined_names = set(refined_names)
+    patched_fig = Patch()
+    for index, part in enumerate(get_step_parts(get_step_catalog(product).get(step_id).object_names, lod)):
+        if part[0] in refined_names:
+            patched_fig["data"][index] = get_transport_data(get_parts_figure_data([part]))[0]
+    return patched_fig
+
+
+def has_part_proxy(lod : int) -> bool:
+    # the proxy of a part already in the lowest level of detail would not be any smaller
+    return config.PROGRESSIVE_PROXY == "box" or lod < len(config.LOD_RATIOS) - 1
+
+
+def get_box_vertices(bounds : np.ndarray) -> np.ndarray:
+    """ the 8 corners of an axis-aligned bounding box (see geometry_index.get_bounds)
+    """
+
+    return np.array([[x, y, z] for x in bounds[:, 0] for y in bounds[:, 1] for z in bounds[:, 2]], dtype=np.float32)
+
+
+def get_part_proxy(name : str) -> List[go.Mesh3d]:
+    """ coarse stand-in of a part, sent first by progressive step changes (config.PROGRESSIVE_PROXY)
+        "lod": the part in the lowest level of detail, "box": its bounding box in the color of its first face
+    """
+
+    lowest_lod = len(config.LOD_RATIOS) - 1
+    traces = get_figure_data([name], lowest_lod)
+    if config.PROGRESSIVE_PROXY != "box":
+        return traces
+
+    trace = traces[0]
+    box = make_mesh3d(
+        get_box_vertices(geometry_index.get_part_bounds(name)), BOX_TRIANGLES,
+        (trace.facecolor[0],) * len(BOX_TRIANGLES), trace.opacity, trace.name,
+    )
+    set_part_appearance(box, name)
+    return [box]
+
+
+def get_step_details(step_id, product=None):
+    """ returns the step name, description, tools, images and notifications
+        in the order of the outputs of the on_step_changed callback
+    """
+
+    step = get_step_catalog(product).get(step_id)
+
+    notifs = step.notifications
+    if notifs is not None:
+        i_notifs_class = "fa-solid fa-triangle-exclamation"
+        div_notifs_class = "border_div_notifs"
+    else:
+        i_notifs_class = ""
+        div_notifs_class = "no_border_div_notifs"
+
+    # webp variants in the displayed sizes if the assets were built (asset_build.py)
+    tools_img_name, danger_img_name = get_step_image_names(step)
+    step_tools_img, step_tools_srcset = get_image_sources(tools_img_name) if tools_img_name else ("", "")
+    danger_img, danger_srcset = get_image_sources(danger_img_name) if danger_img_name else ("", "")
+
+    return (
+        step.name, step.description, step.tools, step_tools_img, step_tools_srcset, danger_img, danger_srcset,
+        notifs, i_notifs_class, div_notifs_class,
+    )
+
+
+def get_step_image_names(step):
+    """ file names (in assets/img) of the tools image and the danger image of a step, None if it has none
+    """
+
+    return step.tools_img_path, "danger.png" if step.key == "step14" else None
+
+
+def get_step_images(product=None):
+    """ src, srcset and sizes of every image of the steps of a product, for the browser to preload them
+    """
+
+    images = {}
+    for step in get_step_catalog(product):
+        for name in get_step_image_names(step):
+            if name and name not in images:
+                src, srcset = get_image_sources(name)
+                images[name] = {"src": src, "srcset": srcset, "sizes": BANNER_SIZES if name in BANNER_IMAGES else ""}
+    return list(images.values())
+
+
+def get_client_steps_data(lod=0, product=None):
+    """ collects everything the browser needs to switch steps without the server:
+        the traces of all parts, the figure layout and per step its part names and details
+    """
+
+    step_catalog = get_step_catalog(product)
+    steps = step_catalog.steps()
+    names = step_catalog.get_part_names()
+    fig = get_3d_fig(steps[0].key, lod, batch=False, product=product)
+
+    return {
+        "traces": [trace.to_plotly_json() for trace in get_transport_data(get_figure_data(names, lod))],
+        "layout": fig.layout.to_plotly_json(),
+        "steps": {
+            step.key: {
+                # one trace per part, hidden parts can only be dropped
+                "object_names": [name for name, _ in get_step_parts(step.object_names)],
+                "camera": geometry_index.get_camera(step.object_names) if config.CAMERA_AUTOFIT else None,
+                "details": get_step_details(step.key, product),
+            }
+            for step in steps
+        },
+    }
+
+
+def get_figure_data(figure_names : List[str], lod : int = 0) -> List[go.Mesh3d]:
     """ import obj and mtl-files and sets appearance of each element
+        parsed meshes are served from the process-wide mesh cache
     """
 
-    figure_data : List[go.Mesh3d] = geometry_tools.import_geometry(figure_names)
+    figure_data : List[go.Mesh3d] = []
+    for name in figure_names:
+        figure_data.extend(mesh_cache.get(name, lod))
     
-    # legend attributes
     for figure, name in zip(figure_data, figure_names):
-        figure.showlegend = True
-        figure.name=name
-        figure.lighting={
-            "ambient": 0.8,
-            "diffuse": 1,
-            "facenormalsepsilon": 0,
-            "fresnel": 0,
-            "roughness": 0.5,
-            "specular": 0.2,
-            "vertexnormalsepsilon": 0,
-        }
-
-    return figure_data
\ No newline at end of file
+        set_part_appearance(figure, name)
+
+    return figure_data
+
+
+def set_part_appearance(figure : go.Mesh3d, name : str):
+    # legend attributes
+    figure.showlegend = True
+    figure.name=name
+    figure.lighting={
+        "ambient": 0.8,
+        "diffuse": 1,
+        "facenormalsepsilon": 0,
+        "fresnel": 0,
+        "roughness": 0.5,
+        "specular": 0.2,
+        "vertexnormalsepsilon": 0,
+    }
+
+
+def get_parts_figure_data(parts : List[Tuple[str, int]], proxy_names : Sequence[str] = ()) -> List[go.Mesh3d]:
+    """ same as get_figure_data for parts in different levels of detail ((name, lod) pairs, see get_step_parts)
+        the parts of proxy_names are replaced by their proxies (see get_part_proxy)
+    """
+
+    proxy_names = set(proxy_names)
+    figure_data : List[go.Mesh3d] = []
+    for name, lod in parts:
+        figure_data.extend(get_part_proxy(name) if name in proxy_names else get_figure_data([name], lod))
+    return figure_data
+
+
+def get_transport_data(figure_data : List[go.Mesh3d], transport : str = None) -> List[go.Mesh3d]:
+    """ encodes the mesh arrays of the traces for the browser
+        "typed": base64 typed arrays (see typed_arrays.py), "json": left to plotly's json encoder
+    """
+
+    if (transport or config.FIGURE_TRANSPORT) == "typed":
+        return encode_traces(figure_data)
+    return figure_data
@@ -1,14 +1,35 @@
-from ctypes import alignment
-from turtle import width
 from dash import html
 from dash import dcc
 import dash_bootstrap_components as dbc
-import pandas as pd
 
-from helper_functions import get_3d_fig, make_div_minimizable
-from data.mock_data import get_parts, get_steps
+import config
+from asset_build import BANNER_SIZES
+from helper_functions import get_3d_fig, get_client_steps_data, get_step_images, make_div_minimizable
+from metrics import IMAGE_TIMING_PATH, MODEL_TIMING_PATH
+from data.catalog import get_step_catalog, product_catalog
+
+def get_app_layout():
+    """ the page is rendered by the render_page callback, once the product (?product= url parameter)
+        and the level of detail of the client (?lod= url parameter or device hint) are known
+    """
+
+    return html.Div(
+        children=[
+            dcc.Location(id="url", refresh=True),
+            dcc.Store(id="lod"),
+            html.Div(id="page"),
+        ],
+    )
+
+
+def get_main_layout(product_key=None, lod=config.DEFAULT_LOD):
+    """ layout of the assembly instructions of a product, only its own steps and materials are loaded
+        (raises KeyError for unknown products)
+    """
+
+    product = product_catalog.get_product(product_key)
+    first_step_id = get_step_catalog(product.key).steps()[0].key
 
-def get_main_layout():
     main_div = html.Div(
         children=[
             dbc.Row(
@@ -23,23 +44,63 @@ def get_main_layout():
             dbc.Row(
                 id="row_body",
                 children=[
-                    get_col_body_left(),
-                    get_col_body_center(),
-                    get_col_body_right(),
+                    get_col_body_left(product),
+                    get_col_body_center(product.key, first_step_id, lod),
+                    get_col_body_right(product.key),
                 ],
                 style={"height": "85vh"}    # 85 percent of screen
             ),
-            dcc.Store(id="current_step", data="step1"),
-            dcc.Store(id="minimized_divs", data=[])
+            dcc.Store(id="product", data=product.key),
+            dcc.Store(id="current_step", data=first_step_id),
+            dcc.Store(id="minimized_divs", data=[]),
+            dcc.Store(id="step_images", data={
+                "images": get_step_images(product.key),
+                "product": product.key,
+                "report_url": IMAGE_TIMING_PATH.lstrip("/") if config.METRICS_ENABLED else None,
+            }),
+            dcc.Store(id="step_images_preloaded", data=False),
+            *get_client_steps_stores(product.key, lod),
+            *get_progressive_stores(product.key, first_step_id),
         ],
     )
     
     return main_div
 
 
-def get_3d_graph():
+def get_client_steps_stores(product_key, lod):
+    """ in clientside step navigation the geometry of all parts is sent once with the page
+    """
+
+    if config.STEP_NAVIGATION != "client":
+        return []
+
+    return [dcc.Store(id="client_steps", data=get_client_steps_data(lod, product_key))]
+
+
+def get_progressive_stores(product_key, step_id):
+    """ in server step navigation: the parts of the current step that are still shown as proxies,
+        the interval that requests their refinement and the timing of the step changes, see app.on_refine_interval
+    """
+
+    if config.STEP_NAVIGATION != "server":
+        return []
+
+    stores = [
+        dcc.Store(id="refine_parts", data={"step": step_id, "parts": []}),
+        dcc.Store(id="model_timing", data={
+            "product": product_key,
+            "report_url": MODEL_TIMING_PATH.lstrip("/") if config.METRICS_ENABLED else None,
+        }),
+    ]
+    if config.PROGRESSIVE_PROXY != "off":
+        # restarted by every refinement update, so the next request is only sent once the update arrived
+        stores.append(dcc.Interval(id="refine_interval", interval=config.PROGRESSIVE_INTERVAL_MS, max_intervals=0))
+    return stores
+
+
+def get_3d_graph(product_key, step_id, lod):
     
-    fig = get_3d_fig("step1")
+    fig = get_3d_fig(step_id, lod, product=product_key)
     
     graph = dcc.Graph(
         id="graph",
@@ -54,36 +115,33 @@ def get_3d_graph():
 # LEFT COLUMN
 ###############################
 
-def get_col_body_left():
+def get_col_body_left(product):
     return dbc.Col(
         id="col_body_left",
         children=[
-            *get_div_productmetadata(),
-            *get_div_materiallist(),
+            *get_div_productmetadata(product),
+            *get_div_materiallist(product.key),
         ],
         width=3,
         class_name="col-body",
     )
     
-def get_div_productmetadata():
+def get_div_productmetadata(product):
     div = html.Div(
         id="div_productmetadata",
         children=[
             html.Table([
                 html.Tr([
                     html.Th(html.Span("Bezeichnung")),
-                    html.Td(html.Span("Spielzeughund")),
+                    html.Td(html.Span(product.name)),
                 ]),
                 html.Tr([
                     html.Th(html.Span("Variante")),
                     html.Td(
                         dcc.Dropdown(
                             id="dd_product_variant",
-                            options=[
-                                {"label": "mit Wackelaugen", "value": 1},
-                                {"label": "ohne Wackelaugen", "disabled": True, "value": 2},
-                            ],
-                            value=1,
+                            options=get_product_options(product),
+                            value=product.key,
                             searchable=True,
                             clearable=False,
                         ),
@@ -97,20 +155,40 @@ def get_div_productmetadata():
     minimizable_div, minimized_div = make_div_minimizable(div, "left", align="start", div_title="Produkt")
     return minimizable_div, minimized_div
 
-def get_materials_accordion():
-    df_parts = get_parts()
+def get_product_options(product):
+    """ dropdown options of all products of the catalog,
+        variants of the shown product are listed by their variant name only
+    """
+
+    options = []
+    for other_product in product_catalog.get_products():
+        if other_product.name == product.name:
+            label = other_product.variant or other_product.name
+        else:
+            label = f"{other_product.name} ({other_product.variant})" if other_product.variant else other_product.name
+        options.append({"label": label, "value": other_product.key})
+    return options
+
+
+def get_materials_accordion(product_key):
+    materials = product_catalog.get_materials(product_key)
+    
+    # group the materials by category, sorted by category name
+    categories = {}
+    for material in materials:
+        categories.setdefault(material.category, []).append(material)
     
     accordion_items = []
-    for groupname, rows in df_parts.groupby("category"):
+    for groupname, rows in sorted(categories.items()):
         
         table_rows = []
 
-        for _, row in rows.iterrows():
+        for row in rows:
             table_row = html.Tr(
                 [
-                    html.Td(row["name"]),
-                    # html.Td(row["color"], style={"background-color": row["color"]}),
-                    html.Td(style={"background-color": row["color"], "width": "3em"}),
+                    html.Td(row.name),
+                    # html.Td(row.color, style={"background-color": row.color}),
+                    html.Td(style={"background-color": row.color, "width": "3em"}),
                 ]
             )
             table_rows.append(table_row)
@@ -129,20 +207,21 @@ def get_materials_accordion():
     return dbc.Accordion(accordion_items, style={"width": "100%"}, always_open=True)
 
 
-def get_materials_table():
+def get_materials_table(product_key):
     table_header = [
         html.Thead(html.Tr([html.Th(""), html.Th("Material")]))
     ]
     
-    df_parts = get_parts()
+    materials = product_catalog.get_materials(product_key)
     
     table_rows = []
 
-    for key, part_row in df_parts.iterrows():
+    for part_row in materials:
+        key = part_row.key
         table_row = html.Tr(
             [
                 html.Td(key),
-                html.Td(part_row["name"]),
+                html.Td(part_row.name),
             ],
             id={"type":"tr", "index": key}
         )
@@ -154,14 +233,14 @@ def get_materials_table():
     return table
 
     
-def get_div_materiallist():
+def get_div_materiallist(product_key):
     div = html.Div(
         id="div_materiallist",
         children=[
             html.Div(
                 children=[
-                    # get_materials_table()
-                    get_materials_accordion(),
+                    # get_materials_table(product_key)
+                    get_materials_accordion(product_key),
                 ],
                 style={
                     "display": "flex",
@@ -179,7 +258,7 @@ def get_div_materiallist():
 ###############################
 # CENTERED COLUMN
 ###############################
-def get_col_body_center():
+def get_col_body_center(product_key, step_id, lod):
     return dbc.Col(
         id="col_body_center",
         children=dbc.Container(
@@ -198,7 +277,7 @@ def get_col_body_center():
                             style= {"display": "flex", "align-items": "center", "justify-content": "center"}
                         ),
                         dbc.Col(
-                            children=get_3d_graph(), 
+                            children=get_3d_graph(product_key, step_id, lod), 
                             width=10
                         ),
                         dbc.Col(
@@ -252,12 +331,12 @@ def get_div_step_description():
 ###############################
 # RIGHT COLUMN
 ###############################
-def get_col_body_right():
+def get_col_body_right(product_key):
     return dbc.Col(
         id="col_body_right",
         children=[
             *get_div_tools(),
-            *get_div_steplist(),   
+            *get_div_steplist(product_key),   
         ],
         width=3,
         class_name="col-body",
@@ -283,12 +362,12 @@ def get_div_tools():
     return minimizable_div, minimized_div
 
     
-def get_div_steplist():
+def get_div_steplist(product_key):
     div = html.Div(
         id="div_steplist",
         children=[
             html.Div(
-                children=[get_steplist_table()],
+                children=[get_steplist_table(product_key)],
                 style={                    
                     "display": "flex",
                     "overflow-y": "auto",
@@ -302,20 +381,19 @@ def get_div_steplist():
     return minimizable_div, minimized_div
     
 
-def get_steplist_table():
+def get_steplist_table(product_key):
 
-    df_steps = get_steps()
-    
     table_rows = []
 
-    for key, step_row in df_steps.iterrows():
+    for step in get_step_catalog(product_key):
+        key = step.key
         
         # define button content
         button_content = [
-            html.Span(step_row["name"])
+            html.Span(step.name)
         ]
         
-        if not pd.isna(step_row["notifications"]):
+        if step.notifications is not None:
             # alternative CD
             button_content.insert(0, html.I(className="fa-solid fa-triangle-exclamation", style={"color": "#59C9A5"}))
             # button_content.insert(0, html.I(className="fa-solid fa-triangle-exclamation", style={"color": "#F59C1B"}))
@@ -401,7 +479,7 @@ def get_top_col_body_right():
     return dbc.Col(
         id="top_col_body_right",
         children=[            
-            html.Img(id="div_danger_img", style={"width": "85%"},),
+            html.Img(id="div_danger_img", sizes=BANNER_SIZES, style={"width": "85%"},),
         ],
         width=3,
         class_name="top-col-body",
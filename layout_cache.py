@@ -0,0 +1,85 @@
+""" serialized snapshots of the main layout, the page of a product is built once per level of detail
+    and afterwards sent from its snapshot, until the product catalog or any obj/mtl file changes
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from plotly.io.json import to_json_plotly
+
+import config
+from data.catalog import product_catalog
+from figure_cache import get_data_signature
+from html_structure import get_main_layout
+from metrics import timed_stage
+from obj_parser import GEOMETRY_PATH
+
+
+class LayoutCache:
+    """ plain json data of the main layout by product and level of detail, least recently used
+        layouts are dropped beyond max_entries
+        the data is what dash would send for the components, the renderer builds the same page from it
+    """
+
+    def __init__(
+        self,
+        max_entries : int = 64,
+        catalog_path : str = config.CATALOG_PATH,
+        geometry_path : str = GEOMETRY_PATH,
+        revalidate_s : float = config.MESH_CACHE_REVALIDATE_S,
+    ):
+        self.max_entries = max_entries
+        self.catalog_path = catalog_path
+        self.geometry_path = geometry_path
+        self.revalidate_s = revalidate_s
+
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self.builds = 0
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    def _validate(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.revalidate_s:
+            return
+        self._checked_at = now
+
+        signature = get_data_signature(self.catalog_path, self.geometry_path)
+        if signature != self._signature:
+            self._signature = signature
+            self._layouts.clear()
+
+    def get(self, product_key : str = None, lod : int = config.DEFAULT_LOD):
+        """ returns the main layout of a product (the default product if product_key is None or unknown)
+            the returned data is shared and must not be modified
+        """
+
+        # a wrong ?product= parameter shows the default product
+        if product_key is None or not product_catalog.has_product(product_key):
+            product_key = product_catalog.get_default_key()
+        key = (product_key, lod)
+        with self._lock:
+            self._validate()
+            layout = self._layouts.get(key)
+            if layout is not None:
+                self._layouts.move_to_end(key)
+                return layout
+
+        with timed_stage("build_layout"):
+            layout = json.loads(to_json_plotly(get_main_layout(product_key, lod)))
+
+        with self._lock:
+            self._layouts[key] = layout
+            self.builds += 1
+            while len(self._layouts) > self.max_entries:
+                self._layouts.popitem(last=False)
+        return layout
+
+
+# shared by all requests of the process
+layout_cache = LayoutCache()
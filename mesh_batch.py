@@ -0,0 +1,74 @@
+""" merges the part traces of a figure that share a material into one Mesh3d trace per material
+    plotly draws every trace with its own WebGL buffers, fewer traces draw faster
+
+    batching gives up the identification of the parts in hover and legend: a batched trace has
+    no hover text or legend entry per part. trace.meta holds the lookup table of the batch
+    (one name per part and the first vertex and face of every part) for code that needs it
+"""
+from typing import List
+
+import numpy as np
+import plotly.graph_objects as go
+
+from obj_parser import get_index_dtype
+
+
+def get_material_key(trace : go.Mesh3d) -> tuple:
+    """ returns the trace-wide appearance of a part trace,
+        parts with the same key can be drawn as one trace (face colors are per face anyway)
+    """
+
+    return (trace.opacity, trace.flatshading, trace.color)
+
+
+def merge_traces(traces : List[go.Mesh3d]) -> go.Mesh3d:
+    """ concatenates the vertex and face buffers of part traces into a single trace
+        the face indices of every part are shifted by the number of vertices in front of it
+    """
+
+    vertex_counts = np.array([len(trace.x) for trace in traces])
+    face_counts = np.array([len(trace.i) for trace in traces])
+    vertex_starts = np.concatenate(([0], np.cumsum(vertex_counts)[:-1]))
+    face_starts = np.concatenate(([0], np.cumsum(face_counts)[:-1]))
+
+    index_dtype = get_index_dtype(int(vertex_counts.sum()))
+
+    def concatenate_indices(attribute):
+        return np.concatenate([
+            np.asarray(trace[attribute], dtype=index_dtype) + index_dtype(vertex_start)
+            for trace, vertex_start in zip(traces, vertex_starts)
+        ])
+
+    names = [trace.name for trace in traces]
+    facecolor = []
+    for trace in traces:
+        facecolor.extend(trace.facecolor)
+
+    merged = go.Mesh3d(traces[0], _validate=False)
+    merged.update(
+        x=np.concatenate([np.asarray(trace.x) for trace in traces]),
+        y=np.concatenate([np.asarray(trace.y) for trace in traces]),
+        z=np.concatenate([np.asarray(trace.z) for trace in traces]),
+        i=concatenate_indices("i"),
+        j=concatenate_indices("j"),
+        k=concatenate_indices("k"),
+        facecolor=tuple(facecolor),
+        name=", ".join(names),
+        meta={
+            "parts": names,
+            "vertex_starts": vertex_starts.tolist(),
+            "face_starts": face_starts.tolist(),
+        },
+    )
+    return merged
+
+
+def batch_traces(traces : List[go.Mesh3d]) -> List[go.Mesh3d]:
+    """ returns one trace per material, in the order the materials first occur in traces
+    """
+
+    groups = {}
+    for trace in traces:
+        groups.setdefault(get_material_key(trace), []).append(trace)
+
+    return [merge_traces(group) for group in groups.values()]
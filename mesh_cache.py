@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Union
+
+import plotly.graph_objects as go
+
+import config
+from mesh_instances import PartInstance
+from mesh_lod import load_lod_instance
+from metrics import timed_stage
+from mesh_store import GEOMETRY_PATH, get_file_signature
+
+# rough python size of one facecolor entry ([r, g, b] list of ints)
+FACECOLOR_BYTES = 120
+
+
+def get_traces_nbytes(traces : List[go.Mesh3d]) -> int:
+    """ estimates the memory held by the arrays of mesh traces
+    """
+
+    nbytes = 0
+    for trace in traces:
+        for attribute in ("x", "y", "z", "i", "j", "k"):
+            values = trace[attribute]
+            if values is not None:
+                nbytes += getattr(values, "nbytes", len(values) * 8)
+        if trace.facecolor is not None:
+            nbytes += len(trace.facecolor) * FACECOLOR_BYTES
+
+    return nbytes
+
+
+class _CacheEntry:
+    __slots__ = ("signature", "instance", "shape_key", "checked_at")
+
+    def __init__(self, signature, instance, shape_key, checked_at):
+        self.signature = signature
+        self.instance = instance
+        self.shape_key = shape_key
+        self.checked_at = checked_at
+
+
+class MeshCache:
+    """ process-wide LRU cache of parsed part meshes
+        entries are keyed by part name and level of detail and validated against the mtime and size of the part files,
+        least recently used parts are evicted once the memory budget is exceeded
+        congruent parts share the traces of their shape (see mesh_instances.py), whose memory is counted once
+    """
+
+    def __init__(
+        self,
+        loader : Callable[[str, int], Union[PartInstance, List[go.Mesh3d]]] = load_lod_instance,
+        budget_bytes : int = int(config.MESH_CACHE_BUDGET_MB * 1024 * 1024),
+        revalidate_s : float = config.MESH_CACHE_REVALIDATE_S,
+        path : str = GEOMETRY_PATH,
+    ):
+        self.loader = loader
+        self.budget_bytes = budget_bytes
+        self.revalidate_s = revalidate_s
+        self.path = path
+
+        self._entries : Dict[tuple, _CacheEntry] = OrderedDict()
+        # shape key: [number of cached parts of the shape, bytes of its traces]
+        self._shapes : Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self, name : str, lod : int = 0) -> List[go.Mesh3d]:
+        """ returns fresh copies of the mesh traces of a part
+            (the copies may be modified by the caller without touching the cache)
+        """
+
+        return self._get_instance(name, lod).expand()
+
+    def _get_instance(self, name : str, lod : int) -> PartInstance:
+        now = time.monotonic()
+        key = (name, lod)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.checked_at < self.revalidate_s:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.instance
+
+        # The entry is unknown or has not been validated for a while
+        signature = get_file_signature(name, self.path)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.signature == signature:
+                    entry.checked_at = now
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.instance
+
+                # The files changed on disk
+                self._remove(key)
+                self.invalidations += 1
+            self.misses += 1
+
+        # Parse outside of the lock so other parts can be served meanwhile
+        with timed_stage("load_part"):
+            instance = self.loader(name, lod)
+        if not isinstance(instance, PartInstance):
+            instance = PartInstance(instance)
+        self._insert(key, _CacheEntry(signature, instance, instance.shape_key or key, now))
+
+        return instance
+
+    def put(self, name : str, lod : int, traces : List[go.Mesh3d], signature : tuple):
+        """ caches traces loaded elsewhere (see mesh_warmup.py)
+            signature: file signature of the part taken before its files were parsed
+        """
+
+        key = (name, lod)
+        self._insert(key, _CacheEntry(signature, PartInstance(traces), key, time.monotonic()))
+
+    def __contains__(self, key : tuple) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def _insert(self, key, entry : _CacheEntry):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            shape = self._shapes.get(entry.shape_key)
+            if shape is None:
+                shape = self._shapes[entry.shape_key] = [0, get_traces_nbytes(entry.instance.traces)]
+                self.nbytes += shape[1]
+            shape[0] += 1
+            self._evict()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        shape = self._shapes[entry.shape_key]
+        shape[0] -= 1
+        if shape[0] == 0:
+            del self._shapes[entry.shape_key]
+            self.nbytes -= shape[1]
+
+    def _evict(self):
+        # keep at least the newest entry, even if it alone exceeds the budget
+        while self.nbytes > self.budget_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._shapes.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        """ returns the hit/miss counters and the memory use of the cache
+        """
+
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "shapes": len(self._shapes),
+                "nbytes": self.nbytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# shared by all callbacks of the process
+mesh_cache = MeshCache()
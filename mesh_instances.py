@@ -0,0 +1,106 @@
+""" instances of congruent parts: parts whose meshes are the same shape at a different place and orientation
+    (e.g. the five VerbindungsstueckS) are stored once as a base mesh plus a 4x4 rigid transform per part,
+    see mesh_store.build_store. The cache keeps the base mesh once and places it when a figure is built
+
+    two meshes are congruent if they have the same faces, materials and colors and their vertices
+    (in the same order, as written by the exporter) differ by a rotation and a translation,
+    found with the Kabsch algorithm
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import plotly.graph_objects as go
+
+import config
+from obj_parser import ObjMesh
+
+
+def get_rigid_transform(base_vertices : np.ndarray, vertices : np.ndarray, tolerance : float) -> Optional[np.ndarray]:
+    """ 4x4 matrix of the rotation and translation that moves base_vertices onto vertices (corresponding by index),
+        None if no rigid transform does within tolerance (in obj units)
+    """
+
+    if base_vertices.shape != vertices.shape or len(vertices) < 3:
+        return None
+
+    base_vertices = base_vertices.astype(np.float64)
+    vertices = vertices.astype(np.float64)
+    base_center, center = base_vertices.mean(axis=0), vertices.mean(axis=0)
+    u, _, vt = np.linalg.svd((base_vertices - base_center).T @ (vertices - center))
+    # a proper rotation, never a mirror image
+    d = np.sign(np.linalg.det(vt.T @ u.T)) or 1.0
+    rotation = vt.T @ np.diag([1.0, 1.0, d]) @ u.T
+
+    transform = np.eye(4)
+    transform[:3, :3] = rotation
+    transform[:3, 3] = center - rotation @ base_center
+    if np.abs(transform_vertices(base_vertices, transform) - vertices).max() > tolerance:
+        return None
+    return transform
+
+
+def transform_vertices(vertices : np.ndarray, transform : np.ndarray) -> np.ndarray:
+    return vertices @ transform[:3, :3].T + transform[:3, 3]
+
+
+def _get_candidate_key(mesh : ObjMesh) -> tuple:
+    """ meshes with different keys can't be congruent
+    """
+
+    return (
+        len(mesh.vertices), mesh.faces.tobytes(), mesh.face_materials.tobytes(),
+        tuple(map(tuple, mesh.get_face_colors())), float(mesh.get_opacity()),
+    )
+
+
+def find_instances(meshes : Dict[str, ObjMesh], tolerance : float = config.MESH_INSTANCE_TOLERANCE) -> Dict[str, Tuple[str, Optional[np.ndarray]]]:
+    """ maps every part to the part whose mesh is its base and the transform from the base, None for the base itself
+        tolerance: relative to the size of the mesh, negative: every part is its own base
+    """
+
+    instances = {}
+    bases : Dict[tuple, List[str]] = {}
+    for name, mesh in meshes.items():
+        instances[name] = (name, None)
+        if tolerance < 0:
+            continue
+        candidates = bases.setdefault(_get_candidate_key(mesh), [])
+        size = np.ptp(mesh.vertices, axis=0).max() if len(mesh.vertices) else 0
+        for base_name in candidates:
+            transform = get_rigid_transform(meshes[base_name].vertices, mesh.vertices, tolerance * size)
+            if transform is not None:
+                instances[name] = (base_name, transform)
+                break
+        else:
+            candidates.append(name)
+    return instances
+
+
+class PartInstance:
+    """ the traces of a part: the traces of its base mesh (shared by all instances of the shape)
+        placed by a rigid transform, or the part's own traces if transform is None
+        shape_key identifies the base mesh, the cache counts its memory once
+    """
+
+    __slots__ = ("traces", "transform", "shape_key")
+
+    def __init__(self, traces : List[go.Mesh3d], transform : Optional[np.ndarray] = None, shape_key = None):
+        self.traces = traces
+        self.transform = transform
+        self.shape_key = shape_key
+
+    def expand(self) -> List[go.Mesh3d]:
+        """ fresh copies of the traces at the place of the part
+            (the copies may be modified by the caller without touching the base mesh)
+        """
+
+        # the base traces were validated when they were created
+        if self.transform is None:
+            return [go.Mesh3d(trace, _validate=False) for trace in self.traces]
+
+        traces = []
+        for trace in self.traces:
+            base_vertices = np.column_stack([trace.x, trace.y, trace.z])
+            x, y, z = transform_vertices(base_vertices, self.transform).astype(base_vertices.dtype).T
+            traces.append(go.Mesh3d(trace, x=x, y=y, z=z, _validate=False))
+        return traces
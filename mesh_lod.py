@@ -0,0 +1,269 @@
+""" level-of-detail meshes of the parts, decimated with quadric error metrics
+
+    build the LOD stores (again) after changing obj/mtl files:
+        python mesh_lod.py build
+    print triangle counts per part and payload sizes per step for every LOD:
+        python mesh_lod.py report
+
+    LOD 0 is the full resolution mesh, LOD n keeps config.LOD_RATIOS[n] of the faces
+"""
+import argparse
+import gzip
+from typing import List
+
+import numpy as np
+import plotly.graph_objects as go
+
+import config
+from mesh_instances import PartInstance
+from mesh_store import STORE_PATH, MeshStore, build_store, get_part_names, mesh_store, read_part
+from obj_parser import GEOMETRY_PATH, ObjMesh, compact_mesh, make_mesh3d
+
+# meshes are not decimated below this number of faces
+MIN_FACES = 8
+MAX_PASSES = 100
+
+
+def get_lod(value) -> int:
+    """ converts a requested LOD (e.g. from a query parameter) into a valid LOD level
+    """
+
+    try:
+        lod = int(value)
+    except (TypeError, ValueError):
+        return config.DEFAULT_LOD
+    return min(max(lod, 0), len(config.LOD_RATIOS) - 1)
+
+
+def get_store_path(lod : int) -> str:
+    if lod == 0:
+        return STORE_PATH
+    return STORE_PATH.replace(".bin", f".lod{lod}.bin")
+
+
+###############################
+# QUADRIC DECIMATION
+###############################
+
+def _get_face_normals(vertices : np.ndarray, faces : np.ndarray) -> np.ndarray:
+    """ returns the (not normalized) normal of every face, its length is twice the face area
+    """
+
+    v0, v1, v2 = vertices[faces[:, 0]], vertices[faces[:, 1]], vertices[faces[:, 2]]
+    return np.cross(v1 - v0, v2 - v0)
+
+
+def _get_vertex_quadrics(vertices : np.ndarray, faces : np.ndarray) -> np.ndarray:
+    """ returns the area weighted sum of the plane quadrics of the faces around every vertex
+    """
+
+    normals = _get_face_normals(vertices, faces)
+    areas = np.linalg.norm(normals, axis=1)
+    valid = areas > 0
+    unit_normals = normals[valid] / areas[valid, None]
+
+    # plane n.x + d = 0 of every face as homogeneous 4-vector
+    planes = np.column_stack([unit_normals, -(unit_normals * vertices[faces[valid, 0]]).sum(axis=1)])
+    face_quadrics = planes[:, :, None] * planes[:, None, :] * areas[valid, None, None]
+
+    quadrics = np.zeros((len(vertices), 4, 4))
+    for corner in range(3):
+        np.add.at(quadrics, faces[valid, corner], face_quadrics)
+    return quadrics
+
+
+def _remove_degenerate_faces(faces : np.ndarray, face_materials : np.ndarray):
+    """ drops faces that collapsed to an edge or a point and faces that occur twice
+    """
+
+    valid = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    faces, face_materials = faces[valid], face_materials[valid]
+
+    _, first_indices = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    first_indices.sort()
+    return faces[first_indices], face_materials[first_indices]
+
+
+def decimate(vertices : np.ndarray, faces : np.ndarray, face_materials : np.ndarray, target_faces : int):
+    """ reduces a triangle mesh to about target_faces faces by collapsing edges with the lowest quadric error
+        every pass collapses a set of edges that share no vertex, all of them at once
+        returns the new vertices, faces and face materials
+    """
+
+    vertices = vertices.astype(np.float64)
+    faces = faces.astype(np.int64)
+    quadrics = _get_vertex_quadrics(vertices, faces)
+
+    # edges (as a * n_vertices + b) whose collapse flipped a face, they are not tried again
+    blocked_edges = np.zeros(0, dtype=np.int64)
+
+    for _ in range(MAX_PASSES):
+        if len(faces) <= target_faces:
+            break
+
+        edges = np.sort(faces[:, [[0, 1], [1, 2], [2, 0]]].reshape(-1, 2), axis=1)
+        edges = np.unique(edges, axis=0)
+        edge_quadrics = quadrics[edges[:, 0]] + quadrics[edges[:, 1]]
+
+        # Candidate positions of the merged vertex: both ends and the midpoint
+        ends = vertices[edges]
+        candidates = np.concatenate([ends, ends.mean(axis=1, keepdims=True)], axis=1)
+        candidates = np.concatenate([candidates, np.ones(candidates.shape[:2] + (1,))], axis=2)
+        errors = np.einsum("eci,eij,ecj->ec", candidates, edge_quadrics, candidates)
+        best = errors.argmin(axis=1)
+        costs = errors[np.arange(len(edges)), best]
+        positions = candidates[np.arange(len(edges)), best, :3]
+        costs[np.isin(edges[:, 0] * len(vertices) + edges[:, 1], blocked_edges)] = np.inf
+
+        # An edge is collapsed if it is the cheapest edge of both its vertices,
+        # so the selected edges never share a vertex
+        ranks = np.empty(len(edges), dtype=np.int64)
+        ranks[np.argsort(costs, kind="stable")] = np.arange(len(edges))
+        vertex_ranks = np.full(len(vertices), len(edges))
+        np.minimum.at(vertex_ranks, edges[:, 0], ranks)
+        np.minimum.at(vertex_ranks, edges[:, 1], ranks)
+        selected = np.flatnonzero((vertex_ranks[edges[:, 0]] == ranks) & (vertex_ranks[edges[:, 1]] == ranks) & np.isfinite(costs))
+        if len(selected) == 0:
+            break
+
+        # every collapse removes about two faces
+        n_collapses = max((len(faces) - target_faces + 1) // 2, 1)
+        selected = selected[np.argsort(ranks[selected])][:n_collapses]
+
+        # Skip collapses that would flip the orientation of a neighbouring face
+        old_normals = _get_face_normals(vertices, faces)
+        while len(selected):
+            kept, removed = edges[selected, 0], edges[selected, 1]
+            new_vertices = vertices.copy()
+            new_vertices[kept] = positions[selected]
+            remap = np.arange(len(vertices))
+            remap[removed] = kept
+            new_faces = remap[faces]
+
+            flipped = (np.einsum("fi,fi->f", old_normals, _get_face_normals(new_vertices, new_faces)) < 0)
+            if not flipped.any():
+                break
+            rejected = np.isin(kept, new_faces[flipped])
+            blocked_edges = np.concatenate([blocked_edges, edges[selected[rejected], 0] * len(vertices) + edges[selected[rejected], 1]])
+            selected = selected[~rejected]
+
+        if len(selected) == 0:
+            continue
+
+        quadrics[kept] += quadrics[removed]
+        vertices = new_vertices
+        faces, face_materials = _remove_degenerate_faces(new_faces, face_materials)
+
+    # Drop the vertices that are no longer used
+    used = np.unique(faces)
+    remap = np.zeros(len(vertices), dtype=np.int64)
+    remap[used] = np.arange(len(used))
+    return vertices[used], remap[faces], face_materials
+
+
+def decimate_mesh(mesh : ObjMesh, ratio : float) -> ObjMesh:
+    """ returns a copy of a parsed mesh with ratio of its faces
+    """
+
+    if ratio >= 1:
+        return mesh
+
+    target_faces = max(int(len(mesh.faces) * ratio), MIN_FACES)
+    vertices, faces, face_materials = decimate(mesh.vertices, mesh.faces, mesh.face_materials, target_faces)
+
+    return ObjMesh(
+        name=mesh.name,
+        vertices=vertices,
+        vertex_colors=np.zeros((len(vertices), 0)),
+        normals=np.zeros((0, 3)),
+        faces=faces,
+        face_materials=face_materials,
+        colors=mesh.colors,
+        opacities=mesh.opacities,
+    )
+
+
+###############################
+# RUNTIME LOADER
+###############################
+
+def create_lod_mesh_data(component : str, path : str = GEOMETRY_PATH, lod : int = 0) -> List[go.Mesh3d]:
+    """ parses and decimates a part on the fly (used if the LOD store is missing or stale)
+    """
+
+    mesh = compact_mesh(decimate_mesh(read_part(component, path), config.LOD_RATIOS[lod]))
+    return [make_mesh3d(mesh.vertices, mesh.faces, mesh.get_face_colors(), mesh.get_opacity(), mesh.name)]
+
+
+def _get_fallback(lod):
+    return lambda component, path: create_lod_mesh_data(component, path, lod)
+
+
+# one memory-mapped store per LOD, LOD 0 is the full resolution store
+lod_stores = [mesh_store] + [
+    MeshStore(get_store_path(lod), fallback=_get_fallback(lod)) for lod in range(1, len(config.LOD_RATIOS))
+]
+
+
+def load_lod_traces(name : str, lod : int = 0) -> List[go.Mesh3d]:
+    """ returns the mesh traces of a part in the requested level of detail
+    """
+
+    return lod_stores[lod].load_traces(name)
+
+
+def load_lod_instance(name : str, lod : int = 0) -> PartInstance:
+    """ returns the traces of the shape of a part in the requested level of detail and the transform of the part
+    """
+
+    return lod_stores[lod].load_instance(name)
+
+
+###############################
+# BUILD AND REPORT
+###############################
+
+def build_lod_stores():
+    for lod, ratio in enumerate(config.LOD_RATIOS):
+        store_path = get_store_path(lod)
+        header = build_store(store_path, transform=lambda mesh: decimate_mesh(mesh, ratio))
+        print(
+            f"LOD {lod} ({ratio:.0%} of the faces): compiled {len(header['parts'])} parts "
+            f"({len(header['shapes'])} shapes) into {store_path}"
+        )
+
+
+def print_report():
+    # imported here, the figures need the step data and the mesh cache
+    from plotly.io.json import to_json_plotly
+    from data.catalog import get_step_catalog
+    from helper_functions import get_3d_fig
+
+    lods = range(len(config.LOD_RATIOS))
+
+    print("triangles per part")
+    print(f"{'part':<24}" + "".join(f"{f'LOD {lod}':>10}" for lod in lods))
+    for name in get_part_names():
+        counts = [len(load_lod_traces(name, lod)[0].i) for lod in lods]
+        print(f"{name:<24}" + "".join(f"{count:>10}" for count in counts))
+
+    print()
+    print("figure payload per step in kB (json / gzip)")
+    print(f"{'step':<8}" + "".join(f"{f'LOD {lod}':>18}" for lod in lods))
+    for step_id in get_step_catalog().keys():
+        sizes = []
+        for lod in lods:
+            figure_json = to_json_plotly(get_3d_fig(step_id, lod)).encode("utf-8")
+            sizes.append(f"{len(figure_json) / 1000:.0f} / {len(gzip.compress(figure_json)) / 1000:.0f}")
+        print(f"{step_id:<8}" + "".join(f"{size:>18}" for size in sizes))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and report the level-of-detail meshes")
+    parser.add_argument("command", choices=["build", "report"])
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_lod_stores()
+    else:
+        print_report()
@@ -0,0 +1,331 @@
+""" compiled binary store of the part meshes in data/obj
+
+    build it (again) after changing obj/mtl files:
+        python mesh_store.py build
+
+    layout of the store file:
+        8 bytes magic, 8 bytes offset of the array data (little endian), json header,
+        followed by the raw arrays, each aligned to ALIGNMENT bytes
+
+    congruent parts (see mesh_instances.py) share the arrays of one shape,
+    every part refers to its shape and the rigid transform that places it
+"""
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import plotly.graph_objects as go
+
+import config
+from mesh_instances import PartInstance, find_instances, transform_vertices
+from obj_parser import GEOMETRY_PATH, ObjMesh, compact_mesh, make_mesh3d, read_objfile, weld_mesh
+
+STORE_PATH = os.path.join(".", "data", "mesh_store.bin")
+
+MAGIC = b"DAMESH02"
+ALIGNMENT = 64
+
+
+def get_file_signature(name : str, path : str = GEOMETRY_PATH) -> tuple:
+    """ returns mtime and size of the obj and mtl file of a part
+        a missing file is represented by None
+    """
+
+    signature = []
+    for extension in (".obj", ".mtl"):
+        try:
+            stat = os.stat(os.path.join(path, name + extension))
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+
+    return tuple(signature)
+
+
+def _to_json_signature(signature):
+    return [list(entry) if entry is not None else None for entry in signature]
+
+
+def read_part(name : str, path : str = GEOMETRY_PATH, weld_tolerance : float = config.MESH_WELD_TOLERANCE) -> ObjMesh:
+    """ parses the obj/mtl files of a part and welds its duplicate vertices
+    """
+
+    mesh = read_objfile(os.path.join(path, name + ".obj"))
+    if weld_tolerance >= 0:
+        mesh = weld_mesh(mesh, weld_tolerance)
+    return mesh
+
+
+def create_part_traces(name : str, path : str = GEOMETRY_PATH) -> List[go.Mesh3d]:
+    """ loads a part from its text files into the same compact trace as the store
+    """
+
+    mesh = compact_mesh(read_part(name, path))
+    return [make_mesh3d(mesh.vertices, mesh.faces, mesh.get_face_colors(), mesh.get_opacity(), mesh.name)]
+
+
+###############################
+# BUILD
+###############################
+
+def _compile_part(name : str, path : str = GEOMETRY_PATH, transform : Callable[[ObjMesh], ObjMesh] = None) -> dict:
+    """ parses the obj/mtl text files of a part and returns its compact arrays
+        transform may change the parsed mesh before it is compiled (e.g. decimate it)
+    """
+
+    return _compile_mesh(read_part(name, path), transform)
+
+
+def _compile_mesh(mesh : ObjMesh, transform : Callable[[ObjMesh], ObjMesh] = None) -> dict:
+    if transform is not None:
+        mesh = transform(mesh)
+    mesh = compact_mesh(mesh)
+
+    # Resolve the material of every face to an index into a small color palette
+    palette : Dict[tuple, int] = {}
+    face_materials = [palette.setdefault(tuple(color), len(palette)) for color in mesh.get_face_colors()]
+    material_dtype = np.uint8 if len(palette) <= np.iinfo(np.uint8).max else np.uint16
+
+    return {
+        "object_name": mesh.name,
+        "opacity": float(mesh.get_opacity()),
+        "colors": [list(color) for color in palette],
+        "arrays": {
+            "vertices": mesh.vertices,
+            "faces": mesh.faces,
+            "face_materials": np.array(face_materials, dtype=material_dtype),
+        },
+    }
+
+
+def get_part_names(path : str = GEOMETRY_PATH) -> List[str]:
+    """ returns the names of all obj files in the geometry directory
+    """
+
+    return sorted(os.path.splitext(os.path.basename(p))[0] for p in glob.glob(os.path.join(path, "*.obj")))
+
+
+def build_store(store_path : str = STORE_PATH, path : str = GEOMETRY_PATH, transform : Callable[[ObjMesh], ObjMesh] = None) -> dict:
+    """ compiles every obj/mtl file of the geometry directory into the binary store,
+        congruent parts are stored once (the shape of the first of them) and placed by their transform
+        returns the header of the written store
+    """
+
+    names = get_part_names(path)
+    meshes = {name: read_part(name, path) for name in names}
+    # the instances are found on the full meshes, decimated copies of the same shape could differ
+    instances = find_instances({name: compact_mesh(mesh) for name, mesh in meshes.items()})
+
+    shapes = {}
+    parts = {}
+    blobs = []
+    offset = 0
+    for name in names:
+        shape_name, rigid_transform = instances[name]
+        if shape_name not in shapes:
+            shape = _compile_mesh(meshes[shape_name], transform)
+            for key, array in shape.pop("arrays").items():
+                array = np.ascontiguousarray(array)
+                shape[key] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+                blobs.append((offset, array))
+                offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+            shapes[shape_name] = shape
+        parts[name] = {
+            "shape": shape_name,
+            "transform": rigid_transform.tolist() if rigid_transform is not None else None,
+            "source": _to_json_signature(get_file_signature(name, path)),
+        }
+
+    header = {"version": 2, "weld_tolerance": config.MESH_WELD_TOLERANCE, "shapes": shapes, "parts": parts}
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    # Write next to the store and swap it in, so running servers never see a half written file
+    tmp_path = store_path + ".tmp"
+    with open(tmp_path, "wb") as fp:
+        fp.write(MAGIC)
+        fp.write(struct.pack("<Q", data_start))
+        fp.write(header_bytes)
+        for blob_offset, array in blobs:
+            fp.seek(data_start + blob_offset)
+            fp.write(array.tobytes())
+        fp.truncate(data_start + offset)
+    os.replace(tmp_path, store_path)
+
+    return header
+
+
+###############################
+# RUNTIME LOADER
+###############################
+
+class MeshStore:
+    """ memory-mapped read access to the compiled mesh store
+        all workers of a server map the same file, so the mesh pages are shared between them.
+        parts that are missing in the store or whose text files changed since the build
+        are parsed from the obj/mtl files instead
+    """
+
+    def __init__(
+        self,
+        store_path : str = STORE_PATH,
+        path : str = GEOMETRY_PATH,
+        fallback : Callable[[str, str], List[go.Mesh3d]] = create_part_traces,
+    ):
+        self.store_path = store_path
+        self.path = path
+        self.fallback = fallback
+
+        self._lock = threading.Lock()
+        self._signature = None
+        self._mmap : Optional[mmap.mmap] = None
+        self._parts : Dict[str, dict] = {}
+        self._shapes : Dict[str, dict] = {}
+        # traces of the shapes, shared by all instances
+        self._shape_traces : Dict[str, List[go.Mesh3d]] = {}
+        self.store_loads = 0
+        self.text_loads = 0
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """ (re-)maps the store file if it was created or rebuilt
+        """
+
+        try:
+            stat = os.stat(self.store_path)
+            signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+
+        if signature == self._signature:
+            return
+        self._signature = signature
+
+        # arrays handed out earlier keep a reference to the old mapping
+        self._mmap = None
+        self._parts = {}
+        self._shapes = {}
+        self._shape_traces = {}
+        if signature is None:
+            return
+
+        with open(self.store_path, "rb") as fp:
+            if fp.read(len(MAGIC)) != MAGIC:
+                return
+            data_start, = struct.unpack("<Q", fp.read(8))
+            header = json.loads(fp.read(data_start - len(MAGIC) - 8).rstrip(b"\0"))
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._data_start = data_start
+        # a store built with other weld settings is rebuilt (or the text files are used)
+        if header.get("weld_tolerance") == config.MESH_WELD_TOLERANCE:
+            self._parts = header["parts"]
+            self._shapes = header["shapes"]
+
+    def _get_array(self, spec : dict) -> np.ndarray:
+        count = int(np.prod(spec["shape"]))
+        array = np.frombuffer(self._mmap, dtype=spec["dtype"], count=count, offset=self._data_start + spec["offset"])
+        return array.reshape(spec["shape"])
+
+    def _get_part(self, name : str) -> Optional[dict]:
+        # the header entry of a part, None if it is missing or stale (call with the lock held)
+        self._refresh()
+        part = self._parts.get(name)
+        if part is None or part["source"] != _to_json_signature(get_file_signature(name, self.path)):
+            return None
+        return part
+
+    def _get_shape(self, shape_name : str) -> dict:
+        shape = self._shapes[shape_name]
+        return {
+            "object_name": shape["object_name"],
+            "opacity": shape["opacity"],
+            "colors": shape["colors"],
+            "vertices": self._get_array(shape["vertices"]),
+            "faces": self._get_array(shape["faces"]),
+            "face_materials": self._get_array(shape["face_materials"]),
+        }
+
+    def get_part(self, name : str) -> Optional[dict]:
+        """ returns the compiled arrays of a part (the vertices placed by its transform)
+            or None if the part is not in the store or the store is stale for it
+        """
+
+        with self._lock:
+            part = self._get_part(name)
+            if part is None:
+                return None
+            arrays = self._get_shape(part["shape"])
+
+        if part["transform"] is not None:
+            vertices = arrays["vertices"]
+            arrays["vertices"] = transform_vertices(vertices, np.array(part["transform"])).astype(vertices.dtype)
+        return arrays
+
+    def load_instance(self, name : str) -> PartInstance:
+        """ returns the traces of the shape of a part and its transform, from the store if possible
+            and the part's own traces from the obj/mtl text files otherwise
+        """
+
+        with self._lock:
+            part = self._get_part(name)
+            if part is not None:
+                shape_name = part["shape"]
+                traces = self._shape_traces.get(shape_name)
+                if traces is None:
+                    traces = self._shape_traces[shape_name] = make_part_traces(self._get_shape(shape_name))
+                shape_key = (self.store_path, self._signature, shape_name)
+
+        if part is None:
+            self.text_loads += 1
+            return PartInstance(self.fallback(name, self.path))
+
+        self.store_loads += 1
+        transform = np.array(part["transform"]) if part["transform"] is not None else None
+        return PartInstance(traces, transform, shape_key)
+
+    def load_traces(self, name : str) -> List[go.Mesh3d]:
+        """ returns the mesh traces of a part, from the store if possible
+            and from the obj/mtl text files otherwise
+        """
+
+        return self.load_instance(name).expand()
+
+
+def make_part_traces(part : dict) -> List[go.Mesh3d]:
+    """ creates the mesh trace of the compiled arrays of a part (see MeshStore.get_part)
+    """
+
+    colors = part["colors"]
+    face_colors = tuple(colors[material] for material in part["face_materials"].tolist())
+    return [make_mesh3d(part["vertices"], part["faces"], face_colors, part["opacity"], part["object_name"])]
+
+
+# shared by all callbacks of the process
+mesh_store = MeshStore()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the obj/mtl files into the binary mesh store")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--output", default=STORE_PATH, help="path of the store file")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        header = build_store(args.output)
+        print(
+            f"compiled {len(header['parts'])} parts ({len(header['shapes'])} shapes) into {args.output} "
+            f"({os.path.getsize(args.output)} bytes)"
+        )
+    else:
+        store = MeshStore(args.output)
+        for name in get_part_names():
+            print(f"{name:<24} {'ok' if store.get_part(name) is not None else 'missing or stale'}")
@@ -0,0 +1,135 @@
+""" parses the part meshes of all steps at startup (or on demand) in parallel,
+    instead of one part at a time in whichever request first needs it
+
+    parts that are in a fresh binary store are memory-mapped (cheap), only the parts whose obj/mtl
+    files have to be parsed are handed to the workers. The workers return the compact arrays of the part
+    (see mesh_store._compile_part), the traces are created and cached in this process.
+
+    print the timing report of a cold warmup:
+        python mesh_warmup.py [--lod 0] [--executor process] [--workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, List, Tuple
+
+import config
+from mesh_cache import mesh_cache
+from mesh_lod import decimate_mesh, lod_stores
+from mesh_store import _compile_part, get_file_signature, make_part_traces
+from metrics import timed_stage
+from obj_parser import GEOMETRY_PATH
+
+
+def get_step_part_names() -> List[str]:
+    """ names of the parts used by the steps of all products
+    """
+
+    # imported here, the catalog is only needed to collect the names
+    from data.catalog import get_step_catalog, product_catalog
+
+    names = set()
+    for product in product_catalog.get_products():
+        names.update(get_step_catalog(product.key).get_part_names())
+    return sorted(names)
+
+
+def parse_part(name : str, lod : int = 0, path : str = GEOMETRY_PATH) -> Tuple[str, dict, float]:
+    """ runs in the worker: parses (and decimates) a part, returns its name, compact arrays and the seconds it took
+    """
+
+    start = time.perf_counter()
+    ratio = config.LOD_RATIOS[lod]
+    transform = (lambda mesh: decimate_mesh(mesh, ratio)) if lod > 0 else None
+    compiled = _compile_part(name, path, transform)
+    part = dict(compiled["arrays"], object_name=compiled["object_name"], opacity=compiled["opacity"], colors=compiled["colors"])
+    return name, part, time.perf_counter() - start
+
+
+def get_worker_count(workers : int, n_parts : int) -> int:
+    return max(1, min(workers or os.cpu_count() or 1, n_parts))
+
+
+def get_executor(executor : str, workers : int) -> Executor:
+    if executor == "thread":
+        return ThreadPoolExecutor(workers, thread_name_prefix="mesh_warmup")
+    # spawned, not forked: the warmup may run in a thread of the server (APP_ENV=dev)
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def warm_meshes(
+    names : Iterable[str],
+    lod : int = config.DEFAULT_LOD,
+    executor : str = config.MESH_WARMUP_EXECUTOR,
+    workers : int = config.MESH_WARMUP_WORKERS,
+    from_store : bool = True,
+) -> dict:
+    """ loads the parts into the mesh cache, parsing the ones missing in the store in parallel
+        executor: "process", "thread" or "serial", workers: 0 for one per cpu core
+        from_store: False parses all parts from their obj/mtl files
+        returns the timing report
+    """
+
+    start = time.perf_counter()
+    names = [name for name in names if (name, lod) not in mesh_cache]
+    to_parse = [name for name in names if not from_store or lod_stores[lod].get_part(name) is None]
+    for name in names:
+        if name not in to_parse:
+            mesh_cache.get(name, lod)
+
+    workers = 1 if executor == "serial" else get_worker_count(workers, len(to_parse))
+    if workers == 1:
+        executor = "serial"
+    # taken before parsing, a file changed meanwhile is parsed again on its next request
+    signatures = {name: get_file_signature(name) for name in to_parse}
+
+    part_s = {}
+    with timed_stage("warm_meshes"):
+        if executor == "serial":
+            for name in to_parse:
+                name, part, seconds = parse_part(name, lod)
+                mesh_cache.put(name, lod, make_part_traces(part), signatures[name])
+                part_s[name] = seconds
+        else:
+            with get_executor(executor, workers) as pool:
+                futures = [pool.submit(parse_part, name, lod) for name in to_parse]
+                for future in futures:
+                    name, part, seconds = future.result()
+                    mesh_cache.put(name, lod, make_part_traces(part), signatures[name])
+                    part_s[name] = seconds
+
+    return {
+        "executor": executor,
+        "workers": workers,
+        "lod": lod,
+        "parts": len(names),
+        "parsed": len(to_parse),
+        "wall_s": time.perf_counter() - start,
+        "parse_s": sum(part_s.values()),
+        "part_s": part_s,
+    }
+
+
+def print_report(report : dict):
+    print(f"{'part':<24}{'parse ms':>10}")
+    for name, seconds in sorted(report["part_s"].items(), key=lambda item: -item[1]):
+        print(f"{name:<24}{seconds * 1000:>10.1f}")
+    print()
+    print(
+        f"LOD {report['lod']}: {report['parts']} parts, {report['parsed']} parsed from obj/mtl "
+        f"({report['executor']}, {report['workers']} workers)"
+    )
+    print(f"wall time {report['wall_s']:.3f} s, parse time summed over the parts {report['parse_s']:.3f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse the part meshes of all steps in parallel and print the timings")
+    parser.add_argument("--lod", type=int, default=config.DEFAULT_LOD, help="level of detail")
+    parser.add_argument("--executor", choices=["process", "thread", "serial"], default=config.MESH_WARMUP_EXECUTOR)
+    parser.add_argument("--workers", type=int, default=config.MESH_WARMUP_WORKERS, help="0: one per cpu core")
+    parser.add_argument("--text", action="store_true", help="parse the obj/mtl files even if the parts are in the store")
+    args = parser.parse_args()
+
+    print_report(warm_meshes(get_step_part_names(), args.lod, args.executor, args.workers, from_store=not args.text))
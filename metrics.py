@@ -0,0 +1,256 @@
+""" latency and payload instrumentation of the server, exposed in the prometheus text format at /metrics
+
+    - every callback: execution time (create_app in app.py wraps them with timed_callback)
+    - every dash request (/_dash-update-component, labelled with its callback): request time and response bytes,
+      the request time includes the serialization of the callback output by dash
+    - stages of the callbacks: reading the steps, loading the part meshes, building and serializing figures
+    - step images, measured in the browser (assets/clientside.js) and posted to IMAGE_TIMING_PATH:
+      time from the step change to the loaded image and its bytes
+    - step models, measured in the browser and posted to MODEL_TIMING_PATH: time from the step click
+      to the first drawn model of the step (proxies of progressive step changes) and to its full geometry
+
+    the numbers are kept per process, with several gunicorn workers every worker has its own /metrics
+"""
+import bisect
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+from flask import Flask, Response, abort, g, has_request_context, request
+
+import config
+
+# upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# the browser posts the timings of the step images here
+IMAGE_TIMING_PATH = config.METRICS_PATH + "/images"
+STEP_IMAGE_IDS = ("div_tools_img", "div_danger_img")
+# and the timings of the step models
+MODEL_TIMING_PATH = config.METRICS_PATH + "/model"
+MODEL_STAGES = ("first", "full")
+
+logger = logging.getLogger("digital_assembly.requests")
+
+
+class Histogram:
+    """ cumulative bucket counts, sum and count of the observed values of one label set
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets : Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value : float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels : Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """ histograms by metric name and label set, plus gauges read from collectors when /metrics is scraped
+    """
+
+    def __init__(self):
+        self._metrics : Dict[str, Tuple[str, Tuple[float, ...]]] = {}
+        self._histograms : Dict[Tuple[str, tuple], Histogram] = {}
+        self._collectors : List[Callable[[], Dict[str, float]]] = []
+        self._lock = threading.Lock()
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    def histogram(self, name : str, help : str, buckets : Tuple[float, ...] = SECONDS_BUCKETS):
+        self._metrics[name] = (help, buckets)
+
+    def observe(self, name : str, value : float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self._metrics[name][1])
+            histogram.observe(value)
+
+    def register_collector(self, collector : Callable[[], Dict[str, float]]):
+        """ collector returns {metric name: value}, it is called on every scrape
+            names ending with _total are counters, all others gauges
+        """
+
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            histograms = sorted(
+                ((key, histogram.counts[:], histogram.sum, histogram.count) for key, histogram in self._histograms.items()),
+                key=lambda item: item[0],
+            )
+
+        written = set()
+        for (name, labels), counts, total, count in histograms:
+            help, buckets = self._metrics[name]
+            if name not in written:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+                written.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for collector in self._collectors:
+            for name, value in collector().items():
+                lines += [f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}", f"{name} {value}"]
+
+        return "\n".join(lines) + "\n"
+
+
+# shared by all requests of the process
+metrics = MetricsRegistry()
+metrics.histogram("dash_callback_duration_seconds", "execution time of the callback function")
+metrics.histogram("dash_request_duration_seconds", "time of the request, including the serialization of the response")
+metrics.histogram("dash_response_bytes", "size of the response body, before it is compressed by Flask-Compress", BYTES_BUCKETS)
+metrics.histogram("dash_stage_duration_seconds", "time spent in a stage of the callbacks")
+metrics.histogram("step_image_seconds", "time from the step change to the loaded step image, measured in the browser")
+metrics.histogram("step_image_bytes", "encoded size of the loaded step image, 0 if the browser did not record it", BYTES_BUCKETS)
+metrics.histogram("step_model_seconds", "time from the step click to the first drawn and to the fully refined model, measured in the browser")
+
+
+@contextmanager
+def timed_stage(stage : str):
+    """ records the duration of the block as dash_stage_duration_seconds{stage=...}
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe("dash_stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+
+def timed_callback(function : Callable) -> Callable:
+    """ wraps a callback function to record its execution time
+    """
+
+    name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if has_request_context():
+            g.metrics_callback = name
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            metrics.observe("dash_callback_duration_seconds", time.perf_counter() - start, callback=name)
+
+    return wrapper
+
+
+###############################
+# SERVER
+###############################
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+
+
+def _after_request(response : Response) -> Response:
+    start = g.pop("metrics_start", None)
+    if start is None or request.path in (config.METRICS_PATH, IMAGE_TIMING_PATH, MODEL_TIMING_PATH):
+        return response
+
+    duration = time.perf_counter() - start
+    callback = g.pop("metrics_callback", None)
+    if request.path.endswith("/_dash-update-component"):
+        labels = {"callback": callback or "unknown"}
+    else:
+        labels = {"route": request.url_rule.rule if request.url_rule else "unmatched"}
+    nbytes = response.calculate_content_length() or 0
+    metrics.observe("dash_request_duration_seconds", duration, **labels)
+    metrics.observe("dash_response_bytes", nbytes, **labels)
+
+    if config.METRICS_LOG:
+        logger.info(json.dumps(dict(
+            labels, method=request.method, path=request.path, status=response.status_code,
+            duration_ms=round(duration * 1000, 3), bytes=nbytes,
+        )))
+    return response
+
+
+def _is_step_key(product : str, step : str) -> bool:
+    # imported here, the step catalog itself is timed by this module
+    from data.catalog import product_catalog
+
+    return product_catalog.has_step(product, step)
+
+
+def _record_image_timing():
+    """ {"product": ..., "step": ..., "image": ..., "seconds": ..., "bytes": ...} posted by the browser (navigator.sendBeacon)
+    """
+
+    try:
+        timing = json.loads(request.get_data())
+        product, step, image = str(timing["product"]), str(timing["step"]), str(timing["image"])
+        seconds, nbytes = float(timing["seconds"]), int(timing["bytes"])
+    except (ValueError, KeyError, TypeError):
+        abort(400)
+    # the labels come from the client, unknown values would grow the registry
+    if image not in STEP_IMAGE_IDS or not _is_step_key(product, step) or not 0 <= seconds < 3600:
+        abort(400)
+
+    metrics.observe("step_image_seconds", seconds, step=step, image=image)
+    metrics.observe("step_image_bytes", nbytes, step=step, image=image)
+    return "", 204
+
+
+def _record_model_timing():
+    """ {"product": ..., "step": ..., "stage": "first" | "full", "seconds": ...} posted by the browser (navigator.sendBeacon)
+    """
+
+    try:
+        timing = json.loads(request.get_data())
+        product, step = str(timing["product"]), str(timing["step"])
+        stage, seconds = str(timing["stage"]), float(timing["seconds"])
+    except (ValueError, KeyError, TypeError):
+        abort(400)
+    if stage not in MODEL_STAGES or not _is_step_key(product, step) or not 0 <= seconds < 3600:
+        abort(400)
+
+    metrics.observe("step_model_seconds", seconds, step=step, stage=stage, proxy=config.PROGRESSIVE_PROXY)
+    return "", 204
+
+
+def instrument_server(server : Flask):
+    """ times the requests of the flask server and serves the metrics at config.METRICS_PATH
+    """
+
+    server.before_request(_before_request)
+    server.after_request(_after_request)
+    server.add_url_rule(
+        config.METRICS_PATH, "metrics",
+        lambda: Response(metrics.render(), mimetype="text/plain; version=0.0.4"),
+    )
+    server.add_url_rule(IMAGE_TIMING_PATH, "image_timing", _record_image_timing, methods=["POST"])
+    server.add_url_rule(MODEL_TIMING_PATH, "model_timing", _record_model_timing, methods=["POST"])
@@ -0,0 +1,309 @@
+""" vectorized parser for the wavefront obj/mtl files in data/obj
+    produces the same Mesh3d traces as dash_obj_in_3dmesh.geometry_tools.import_geometry,
+    but reads every file in one pass and converts it with numpy bulk operations
+"""
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import plotly.graph_objects as go
+
+# directory of the obj/mtl files
+GEOMETRY_PATH = os.path.join(".", "data", "obj")
+
+# diffuse color of faces without (known) material, same default as geometry_tools
+DEFAULT_COLOR = [0, 0, 255]
+
+_BLANKS = np.array([ord(" "), ord("\t"), ord("\r"), ord("\n")], dtype=np.uint8)
+
+class ObjMesh:
+    """ arrays of a single obj file
+        faces are triangles with 0-based vertex indices,
+        face_materials indexes into the colors/opacities of the used materials (-1 is the default material)
+    """
+
+    __slots__ = ("name", "vertices", "vertex_colors", "normals", "faces", "face_materials", "colors", "opacities")
+
+    def __init__(self, name, vertices, vertex_colors, normals, faces, face_materials, colors, opacities):
+        self.name = name
+        self.vertices = vertices
+        self.vertex_colors = vertex_colors
+        self.normals = normals
+        self.faces = faces
+        self.face_materials = face_materials
+        self.colors = colors
+        self.opacities = opacities
+
+    def get_face_colors(self) -> tuple:
+        """ returns the [r, g, b] diffuse color of every face
+        """
+
+        colors = self.colors + [DEFAULT_COLOR]
+        return tuple(colors[material] for material in self.face_materials.tolist())
+
+    def get_opacity(self) -> float:
+        """ the opacity of the object is the one of the material of its first face
+        """
+
+        if len(self.face_materials) == 0:
+            return 1.0
+        return (self.opacities + [1.0])[self.face_materials[0]]
+
+
+def read_mtlfile(filepath : str) -> Dict[str, dict]:
+    """ parses the basic materials of a mtl file
+        colors are converted the same way geometry_tools does (0.5 -> 127)
+    """
+
+    def rgb(values):
+        return [int(float(value) * 255) for value in values.split()]
+
+    materials = {}
+    current = None
+    with open(filepath) as fp:
+        for line in fp:
+            key, _, values = line.strip().partition(" ")
+            if key == "newmtl":
+                current = materials[values.strip()] = {"kd": DEFAULT_COLOR, "tr": 0.0}
+            elif current is None:
+                continue
+            elif key == "Kd":
+                current["kd"] = rgb(values)
+            elif key == "Tr":
+                current["tr"] = float(values)
+            elif key == "d":
+                current["tr"] = 1.0 - float(values)
+
+    return materials
+
+
+def _get_line_mask(chars : np.ndarray, line_starts : np.ndarray, keyword : bytes) -> np.ndarray:
+    """ returns which lines start with a keyword followed by a blank
+    """
+
+    mask = np.ones(len(line_starts), dtype=bool)
+    for offset, char in enumerate(keyword + b" "):
+        line_chars = chars[line_starts + offset]
+        mask &= np.isin(line_chars, _BLANKS) if char == ord(" ") else line_chars == char
+    return mask
+
+
+def _get_line_text(data : bytes, line_starts : np.ndarray, line_index : int, keyword : bytes) -> str:
+    start = line_starts[line_index] + len(keyword)
+    return data[start:data.index(b"\n", start)].decode().strip()
+
+
+def _triangulate(corners : np.ndarray, counts : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ fan-triangulates polygons given as flat corner array and corner count per polygon
+        returns the triangles and the polygon index of every triangle
+    """
+
+    n_triangles = np.maximum(counts - 2, 0)
+    polygon_ids = np.repeat(np.arange(len(counts)), n_triangles)
+    first_corners = np.repeat(np.cumsum(counts) - counts, n_triangles)
+
+    # position of every triangle inside its polygon fan (1 .. n-2)
+    fan_positions = np.arange(len(polygon_ids)) - np.repeat(np.cumsum(n_triangles) - n_triangles, n_triangles) + 1
+
+    triangles = np.column_stack([
+        corners[first_corners],
+        corners[first_corners + fan_positions],
+        corners[first_corners + fan_positions + 1],
+    ])
+    return triangles, polygon_ids
+
+
+def read_objfile(filepath : str) -> ObjMesh:
+    """ parses all objects of an obj file into one mesh
+        the file is handled as one byte array: lines are classified by their keyword,
+        the numbers of all lines of a kind are converted in a single numpy call
+    """
+
+    with open(filepath, "rb") as fp:
+        data = fp.read() + b"\n"
+
+    chars = np.frombuffer(data, dtype=np.uint8)
+    # padding so every line start can be checked for the longest keyword
+    padded_chars = np.frombuffer(data + b" " * 8, dtype=np.uint8)
+    is_newline = chars == ord("\n")
+    line_starts = np.concatenate(([0], np.flatnonzero(is_newline) + 1))[:-1]
+    line_ids = np.cumsum(is_newline) - is_newline
+
+    is_vertex = _get_line_mask(padded_chars, line_starts, b"v")
+    is_normal = _get_line_mask(padded_chars, line_starts, b"vn")
+    is_face = _get_line_mask(padded_chars, line_starts, b"f")
+
+    # Blank out the keywords and the texture/normal references of face corners (1/2/3 -> 1)
+    text = chars.copy()
+    text[line_starts[is_vertex | is_face]] = ord(" ")
+    text[line_starts[is_normal] + 1] = ord(" ")
+    text[line_starts[is_normal]] = ord(" ")
+    is_blank = np.isin(text, _BLANKS)
+    positions = np.arange(len(text))
+    last_slash = np.maximum.accumulate(np.where(text == ord("/"), positions, -1))
+    last_blank = np.maximum.accumulate(np.where(is_blank, positions, -1))
+    is_reference = last_slash > last_blank
+    text[is_reference] = ord(" ")
+    is_blank |= is_reference
+
+    def get_numbers(line_mask, dtype):
+        return np.fromstring(text[line_mask[line_ids]].tobytes(), sep=" ", dtype=dtype)
+
+    # Vertices, optionally followed by a vertex color
+    vertices = get_numbers(is_vertex, np.float64).reshape(int(is_vertex.sum()), -1) if is_vertex.any() else np.zeros((0, 3))
+    vertex_colors = vertices[:, 3:]
+    vertices = vertices[:, :3]
+    normals = get_numbers(is_normal, np.float64).reshape(-1, 3)
+
+    # Faces: count the corners of every polygon and triangulate
+    corners = get_numbers(is_face, np.int64)
+    token_starts = ~is_blank & np.concatenate(([True], is_blank[:-1]))
+    counts = np.bincount(line_ids[token_starts & is_face[line_ids]], minlength=len(line_starts))[is_face]
+
+    # obj indices are 1-based, negative indices count back from the last vertex
+    corners = np.where(corners < 0, corners + len(vertices), corners - 1)
+    faces, polygon_ids = _triangulate(corners, counts)
+
+    # Materials: a usemtl line applies to all following faces
+    materials = {}
+    for line_index in np.flatnonzero(_get_line_mask(padded_chars, line_starts, b"mtllib")):
+        mtl_file = _get_line_text(data, line_starts, line_index, b"mtllib")
+        materials.update(read_mtlfile(os.path.join(os.path.dirname(filepath), mtl_file)))
+
+    names = list(materials)
+    material_ids = {name: material_id for material_id, name in enumerate(names)}
+
+    usemtl_lines = np.flatnonzero(_get_line_mask(padded_chars, line_starts, b"usemtl"))
+    segment_materials = []
+    current_material = -1
+    for line_index in usemtl_lines:
+        # unknown materials keep the previous one, like geometry_tools
+        current_material = material_ids.get(_get_line_text(data, line_starts, line_index, b"usemtl"), current_material)
+        segment_materials.append(current_material)
+
+    # number of polygons in front of every usemtl line
+    segment_starts = np.cumsum(is_face)[usemtl_lines] - is_face[usemtl_lines]
+    segment_ids = np.searchsorted(segment_starts, np.arange(len(counts)), side="right") - 1
+    polygon_materials = np.array(segment_materials + [-1], dtype=np.int64)[segment_ids]
+
+    object_lines = np.flatnonzero(_get_line_mask(padded_chars, line_starts, b"o"))
+
+    return ObjMesh(
+        name=_get_line_text(data, line_starts, object_lines[-1], b"o") if len(object_lines) else None,
+        vertices=vertices,
+        vertex_colors=vertex_colors,
+        normals=normals,
+        faces=faces,
+        face_materials=polygon_materials[polygon_ids],
+        colors=[materials[name]["kd"] for name in names],
+        opacities=[1 - materials[name]["tr"] for name in names],
+    )
+
+
+def get_index_dtype(n_vertices : int):
+    """ smallest unsigned integer type for the face indices of a mesh with n_vertices vertices
+    """
+
+    return np.uint16 if n_vertices <= np.iinfo(np.uint16).max else np.uint32
+
+
+def weld_mesh(mesh : ObjMesh, tolerance : float = 0.0) -> ObjMesh:
+    """ merges vertices that are closer than tolerance (snapped to a grid of that cell size)
+        and drops the triangles that became degenerate (two equal corners or no area)
+        blender exports repeat a position for every normal of it, e.g. at hard edges
+    """
+
+    vertices = mesh.vertices
+    keys = np.round(vertices / tolerance) if tolerance > 0 else vertices
+    _, first_indices, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+
+    # keep the vertices in the order of their first occurrence
+    order = np.argsort(first_indices, kind="stable")
+    remap = np.empty(len(order), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    faces = remap[inverse.reshape(-1)][mesh.faces]
+
+    v0, v1, v2 = (vertices[first_indices[order]][faces[:, corner]] for corner in range(3))
+    areas = np.linalg.norm(np.cross(v1 - v0, v2 - v0), axis=1)
+    valid = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2]) & (areas > 0)
+
+    return ObjMesh(
+        name=mesh.name,
+        vertices=vertices[first_indices[order]],
+        vertex_colors=mesh.vertex_colors[first_indices[order]],
+        normals=mesh.normals,
+        faces=faces[valid],
+        face_materials=mesh.face_materials[valid],
+        colors=mesh.colors,
+        opacities=mesh.opacities,
+    )
+
+
+def compact_mesh(mesh : ObjMesh) -> ObjMesh:
+    """ returns the mesh with float32 positions and the smallest index type that fits
+    """
+
+    return ObjMesh(
+        name=mesh.name,
+        vertices=mesh.vertices.astype(np.float32),
+        vertex_colors=mesh.vertex_colors,
+        normals=mesh.normals,
+        faces=mesh.faces.astype(get_index_dtype(len(mesh.vertices))),
+        face_materials=mesh.face_materials,
+        colors=mesh.colors,
+        opacities=mesh.opacities,
+    )
+
+
+def make_mesh3d(vertices, faces, face_colors, opacity, name=""):
+    """ creates the same Mesh3d trace as geometry_tools.make_ployly_mesh3d
+        the arrays are taken over without validation, so memory-mapped arrays stay shared
+    """
+
+    x, y, z = vertices.T
+    i, j, k = faces.T
+
+    return go.Mesh3d(
+        x=x,
+        y=y,
+        z=z,
+        i=i,
+        j=j,
+        k=k,
+        color="grey",
+        facecolor=face_colors,
+        opacity=opacity,
+        flatshading=False,
+        hoverinfo="none",
+        hovertemplate="",
+        vertexcolor=[],
+        name=name,
+        showscale=False,
+        lighting={
+            "ambient": 0.0,
+            "diffuse": 0.8,
+            "fresnel": 1,
+            "specular": 1.5,
+            "roughness": 1,
+        },
+        lightposition={"x": 1000, "y": 2000, "z": 1000},
+        _validate=False,
+    )
+
+
+def create_mesh_data(component : str, path : str = GEOMETRY_PATH) -> List[go.Mesh3d]:
+    """ create mesh-for-plotly from single obj file
+    """
+
+    mesh = read_objfile(os.path.join(path, component + ".obj"))
+    return [make_mesh3d(mesh.vertices, mesh.faces, mesh.get_face_colors(), mesh.get_opacity(), mesh.name)]
+
+
+def import_geometry(obj_names : List[str], path : str = GEOMETRY_PATH) -> List[go.Mesh3d]:
+    """ drop-in replacement of geometry_tools.import_geometry
+    """
+
+    traces = []
+    for component in obj_names:
+        traces.extend(create_mesh_data(component, path))
+    return traces
@@ -0,0 +1,48 @@
+import glob
+import os
+
+import pytest
+
+from asset_build import ASSETS_PATH, LAYOUT_SOURCES, get_content_words, get_layout_contents, make_is_used
+from data.catalog import product_catalog
+from html_structure import get_main_layout
+
+# classes dash-bootstrap-components adds in the browser for the props of its components
+# ({} is replaced by the value of the prop, True props add the class as it is)
+DBC_PROP_CLASSES = {
+    "Row": {"justify": "justify-content-{}", "align": "align-items-{}"},
+    "Col": {"align": "align-self-{}", "width": "col-{}"},
+    "Button": {"color": "btn-{}", "size": "btn-{}"},
+    "Table": {"bordered": "table-bordered", "striped": "table-striped", "hover": "table-hover", "size": "table-{}"},
+}
+
+
+def get_dbc_classes(layout) -> set:
+    """ the classes dbc generates from the props of the components of a layout
+    """
+
+    classes = set()
+    for component in [layout, *layout._traverse()]:
+        if not type(component).__module__.startswith("dash_bootstrap_components"):
+            continue
+        for prop, class_name in DBC_PROP_CLASSES.get(type(component).__name__, {}).items():
+            value = getattr(component, prop, None)
+            if value is None or value is False:
+                continue
+            classes.add(class_name.format(value))
+            if prop == "color" and getattr(component, "outline", False):
+                classes.add(f"btn-outline-{value}")
+    return classes
+
+
+@pytest.fixture(scope="module")
+def is_used():
+    js_paths = sorted(glob.glob(os.path.join(ASSETS_PATH, "*.js")))
+    return make_is_used(get_content_words(LAYOUT_SOURCES + js_paths, get_layout_contents()))
+
+
+@pytest.mark.parametrize("product_key", [product.key for product in product_catalog.get_products()])
+def test_dbc_classes_of_the_layout_survive_the_purge(is_used, product_key):
+    classes = get_dbc_classes(get_main_layout(product_key))
+    assert "justify-content-between" in classes
+    assert sorted(name for name in classes if not is_used(name)) == []
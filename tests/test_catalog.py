@@ -0,0 +1,59 @@
+import pytest
+
+from data.catalog import BUNDLED_PRODUCT, ProductCatalog, import_product
+from data.step_catalog import read_step_rows
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = str(tmp_path / "catalog.sqlite")
+    import_product(**BUNDLED_PRODUCT, path=path)
+    import_product(
+        "copy", "Kopie", None, BUNDLED_PRODUCT["steps_path"], BUNDLED_PRODUCT["materials_path"], path=path,
+    )
+    return ProductCatalog(path, cached_products=2)
+
+
+def test_import_product(catalog):
+    assert [product.key for product in catalog.get_products()] == [BUNDLED_PRODUCT["key"], "copy"]
+    rows = read_step_rows(BUNDLED_PRODUCT["steps_path"])
+    steps = catalog.get_step_catalog("copy").steps()
+    assert [step.key for step in steps] == [row["key"] for row in rows]
+    assert [list(step.object_names) for step in steps] == [row["object_names"] for row in rows]
+
+
+def test_import_product_replaces_the_product(catalog):
+    import_product("copy", "Kopie 2", "neu", BUNDLED_PRODUCT["steps_path"], BUNDLED_PRODUCT["materials_path"], path=catalog.path)
+    product = catalog.get_product("copy")
+    assert (product.name, product.variant) == ("Kopie 2", "neu")
+    assert len(catalog.get_products()) == 2
+
+
+def test_has_step(catalog):
+    first_step = read_step_rows(BUNDLED_PRODUCT["steps_path"])[0]["key"]
+    assert catalog.has_step("copy", first_step)
+    assert not catalog.has_step("copy", "no-such-step")
+    assert not catalog.has_step("no-such-product", first_step)
+
+
+def test_default_product(catalog):
+    assert catalog.get_product().key == BUNDLED_PRODUCT["key"]
+    assert catalog.get_default_key() == BUNDLED_PRODUCT["key"]
+    assert [step.key for step in catalog.get_step_catalog()] == catalog.get_step_catalog(BUNDLED_PRODUCT["key"]).keys()
+
+
+def test_unknown_product_raises(catalog):
+    assert not catalog.has_product("typo")
+    with pytest.raises(KeyError):
+        catalog.get_product("typo")
+    with pytest.raises(KeyError):
+        catalog.get_step_catalog("typo")
+
+
+def test_unknown_product_does_not_evict_cached_catalogs(catalog):
+    cached = catalog.get_step_catalog(BUNDLED_PRODUCT["key"])
+    catalog.get_step_catalog("copy")
+    for key in ("typo1", "typo2", "typo3"):
+        with pytest.raises(KeyError):
+            catalog.get_step_catalog(key)
+    assert catalog.get_step_catalog(BUNDLED_PRODUCT["key"]) is cached
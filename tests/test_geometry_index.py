@@ -0,0 +1,30 @@
+import numpy as np
+
+from geometry_index import get_visible_parts
+
+# the 12 triangles of the unit cube [0, 1]^3
+CUBE_VERTICES = np.array([[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=float)
+CUBE_TRIANGLES = np.array([
+    [0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5],
+    [0, 4, 5], [0, 5, 1], [2, 3, 7], [2, 7, 6],
+    [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3],
+])
+
+
+def get_cube(size : float, origin=(0, 0, 0)):
+    return CUBE_VERTICES * size + np.array(origin, dtype=float), CUBE_TRIANGLES
+
+
+def test_part_inside_another_is_hidden():
+    visible = get_visible_parts([get_cube(100), get_cube(10, (45, 45, 45))], resolution=128)
+    assert visible.tolist() == [True, False]
+
+
+def test_small_exposed_part_between_the_rays_is_visible():
+    visible = get_visible_parts([get_cube(100), get_cube(0.3, (150, 0, 0))], resolution=128)
+    assert visible.tolist() == [True, True]
+
+
+def test_small_part_beside_another_is_visible():
+    visible = get_visible_parts([get_cube(100), get_cube(5, (102, 50, 50))], resolution=128)
+    assert visible.tolist() == [True, True]
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import mesh_instances
+import obj_parser
+
+# an irregular tetrahedron, its mirror image is not congruent with it
+VERTICES = np.array([[0, 0, 0], [4, 0, 0], [1, 3, 0], [1, 1, 2]], dtype=np.float32)
+FACES = np.array([[0, 2, 1], [0, 1, 3], [1, 2, 3], [0, 3, 2]])
+
+
+def get_rotation(axis, angle):
+    axis = np.asarray(axis, dtype=float) / np.linalg.norm(axis)
+    cross = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    return np.eye(3) + np.sin(angle) * cross + (1 - np.cos(angle)) * cross @ cross
+
+
+def create_mesh(name, vertices):
+    return obj_parser.ObjMesh(
+        name=name, vertices=vertices.astype(np.float32), vertex_colors=np.zeros((0, 3)), normals=np.zeros((0, 3)),
+        faces=FACES, face_materials=np.zeros(len(FACES), dtype=int), colors=[[0.5, 0.5, 0.5]], opacities=[1.0],
+    )
+
+
+@pytest.fixture
+def meshes():
+    rotation, translation = get_rotation([1, 2, 3], 0.7), np.array([10.0, -5.0, 2.5])
+    return {
+        "base": create_mesh("base", VERTICES),
+        "moved": create_mesh("moved", VERTICES @ rotation.T + translation),
+        "mirrored": create_mesh("mirrored", VERTICES * [-1, 1, 1] + translation),
+    }
+
+
+def test_find_instances_places_rotated_copy(meshes):
+    instances = mesh_instances.find_instances(meshes, tolerance=1e-5)
+
+    assert instances["base"] == ("base", None)
+    base_name, transform = instances["moved"]
+    assert base_name == "base"
+    placed = mesh_instances.transform_vertices(meshes["base"].vertices, transform)
+    np.testing.assert_allclose(placed, meshes["moved"].vertices, atol=1e-4)
+
+
+def test_find_instances_rejects_mirrored_copy(meshes):
+    instances = mesh_instances.find_instances(meshes, tolerance=1e-5)
+
+    assert instances["mirrored"] == ("mirrored", None)
+    # the best proper rotation is far off the mirror image
+    assert mesh_instances.get_rigid_transform(VERTICES, meshes["mirrored"].vertices, 0.1) is None
+
+
+def test_find_instances_disabled(meshes):
+    instances = mesh_instances.find_instances(meshes, tolerance=-1)
+
+    assert all(instances[name] == (name, None) for name in meshes)
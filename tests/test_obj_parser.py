@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from dash_obj_in_3dmesh import geometry_tools
+
+import obj_parser
+from mesh_store import get_part_names
+
+
+@pytest.mark.parametrize("name", get_part_names())
+def test_create_mesh_data_matches_geometry_tools(name):
+    # geometry_tools reads data/obj of the working directory
+    expected = geometry_tools.import_geometry([name])
+    actual = obj_parser.create_mesh_data(name)
+
+    assert len(actual) == len(expected)
+    for expected_trace, actual_trace in zip(expected, actual):
+        for attribute in ("x", "y", "z", "i", "j", "k"):
+            np.testing.assert_array_equal(np.asarray(actual_trace[attribute]), np.asarray(expected_trace[attribute]), err_msg=attribute)
+        assert [list(color) for color in actual_trace.facecolor] == [list(color) for color in expected_trace.facecolor]
+        assert actual_trace.opacity == expected_trace.opacity
+        assert actual_trace.name == expected_trace.name
+
+
+def test_weld_mesh_merges_vertices_and_drops_degenerate_triangles():
+    vertices = np.array([
+        [0, 0, 0], [1, 0, 0], [1, 1, 0],
+        [0, 0, 1e-9],  # the same position as vertex 0
+        [0, 1, 0],
+        [2, 0, 0],  # on the line through vertex 0 and 1
+    ], dtype=float)
+    faces = np.array([
+        [0, 1, 2],
+        [3, 2, 4],
+        [0, 3, 1],  # collapses to a line once 3 is merged into 0
+        [0, 1, 5],  # no area
+        [2, 4, 1],
+    ])
+    mesh = obj_parser.ObjMesh(
+        name="fixture", vertices=vertices, vertex_colors=np.zeros((len(vertices), 3)), normals=np.zeros((0, 3)),
+        faces=faces, face_materials=np.arange(len(faces)), colors=[[i, i, i] for i in range(len(faces))],
+        opacities=[1.0] * len(faces),
+    )
+
+    welded = obj_parser.weld_mesh(mesh, 1e-6)
+
+    np.testing.assert_array_equal(welded.vertices, vertices[[0, 1, 2, 4, 5]])
+    np.testing.assert_array_equal(welded.faces, [[0, 1, 2], [0, 2, 3], [2, 3, 1]])
+    # the material of every remaining face is the one of its original face
+    np.testing.assert_array_equal(welded.face_materials, [0, 1, 4])
+    assert welded.get_face_colors() == ([0, 0, 0], [1, 1, 1], [4, 4, 4])
+    assert len(welded.vertex_colors) == len(welded.vertices)
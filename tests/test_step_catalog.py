@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from data.step_catalog import STEPS_ENCODING, StepCatalog, make_steps
+
+HEADER = "key;name;object_names;description;notifications;tools;tools_img_path\n"
+
+
+def write_steps(path, keys):
+    with open(path, "w", encoding=STEPS_ENCODING) as fp:
+        fp.write(HEADER)
+        for key in keys:
+            fp.write(f"{key};Schritt {key};TeilA, TeilB;;;;\n")
+
+
+def touch(path, seconds=1):
+    # a later mtime than the previous write, even on file systems with a coarse clock
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 1_000_000_000))
+
+
+@pytest.fixture
+def steps_path(tmp_path):
+    path = tmp_path / "steps.csv"
+    write_steps(path, ["step1", "step2", "step3"])
+    return str(path)
+
+
+def test_neighbours_wrap_around(steps_path):
+    steps = StepCatalog(steps_path).steps()
+    assert [(step.previous_key, step.key, step.next_key) for step in steps] == [
+        ("step3", "step1", "step2"),
+        ("step1", "step2", "step3"),
+        ("step2", "step3", "step1"),
+    ]
+    assert [step.position for step in steps] == [0, 1, 2]
+    assert steps[0].object_names == ("TeilA", "TeilB")
+
+
+def test_single_step_is_its_own_neighbour():
+    step, = make_steps([{"key": "step1", "object_names": ["TeilA"]}])
+    assert (step.previous_key, step.next_key) == ("step1", "step1")
+
+
+def test_lookup(steps_path):
+    catalog = StepCatalog(steps_path)
+    assert catalog.get("step2").name == "Schritt step2"
+    assert "step3" in catalog and "step4" not in catalog
+    assert len(catalog) == 3
+    with pytest.raises(KeyError):
+        catalog.get("step4")
+
+
+def test_reloaded_after_the_file_changed(steps_path):
+    catalog = StepCatalog(steps_path)
+    assert catalog.keys() == ["step1", "step2", "step3"]
+    catalog.keys()
+    assert catalog.loads == 1
+
+    write_steps(steps_path, ["step1", "step2", "step3", "step4"])
+    touch(steps_path)
+    assert catalog.keys() == ["step1", "step2", "step3", "step4"]
+    assert catalog.get("step1").previous_key == "step4"
+    assert catalog.loads == 2
+
+    # touched without changes: read again, with the same steps
+    touch(steps_path)
+    assert len(catalog) == 4
+    assert catalog.loads == 3
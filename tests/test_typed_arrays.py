@@ -0,0 +1,49 @@
+import json
+
+import numpy as np
+import plotly.graph_objects as go
+import pytest
+
+import typed_arrays
+
+
+@pytest.mark.parametrize("dtype, values", [
+    (np.float32, [0.0, -1.5, 3.25, 1e6]),
+    (np.uint16, [0, 1, 65535]),
+    (np.uint32, [0, 65536, 4294967295]),
+])
+def test_encode_array_round_trip(dtype, values):
+    spec = typed_arrays.encode_array(values, dtype)
+    # the spec goes through the json of the figure
+    decoded = typed_arrays.decode_array(json.loads(json.dumps(spec)))
+
+    assert "shape" not in spec
+    assert decoded.dtype == np.dtype(dtype)
+    np.testing.assert_array_equal(decoded, np.asarray(values, dtype=dtype))
+
+
+def test_encode_array_keeps_shape():
+    array = np.arange(12, dtype=np.float32).reshape(4, 3)
+    spec = typed_arrays.encode_array(array, np.float32)
+
+    assert spec["shape"] == "4,3"
+    np.testing.assert_array_equal(typed_arrays.decode_array(spec), array)
+
+
+def test_decode_array_passes_json_lists():
+    np.testing.assert_array_equal(typed_arrays.decode_array([1, 2, 3]), [1, 2, 3])
+
+
+@pytest.mark.parametrize("n_vertices, index_dtype", [(3, np.uint16), (70000, np.uint32)])
+def test_encode_trace_round_trip(n_vertices, index_dtype):
+    rng = np.random.default_rng(0)
+    x, y, z = rng.random((3, n_vertices))
+    i, j, k = rng.integers(0, n_vertices, (3, 5))
+    trace = typed_arrays.encode_trace(go.Mesh3d(x=x, y=y, z=z, i=i, j=j, k=k))
+
+    for name, values in zip("xyz", (x, y, z)):
+        np.testing.assert_allclose(typed_arrays.decode_array(trace[name]), values.astype(np.float32))
+    for name, values in zip("ijk", (i, j, k)):
+        decoded = typed_arrays.decode_array(trace[name])
+        assert decoded.dtype == np.dtype(index_dtype)
+        np.testing.assert_array_equal(decoded, values)
@@ -0,0 +1,72 @@
+""" base64 typed-array transport of the mesh arrays of the figures
+    plotly.js (>= 2.28) decodes {"dtype": ..., "bdata": ...} objects straight into typed arrays,
+    instead of parsing a json list of decimal numbers for every coordinate and index
+"""
+import base64
+from typing import List
+
+import numpy as np
+import plotly.graph_objects as go
+
+from obj_parser import get_index_dtype
+
+# plotly.js typed array dtypes
+DTYPES = {
+    np.dtype(np.float32): "f4",
+    np.dtype(np.float64): "f8",
+    np.dtype(np.uint8): "u1",
+    np.dtype(np.uint16): "u2",
+    np.dtype(np.uint32): "u4",
+    np.dtype(np.int32): "i4",
+}
+
+
+def encode_array(array, dtype) -> dict:
+    """ returns the plotly typed array spec of an array converted to dtype (little endian),
+        arrays of more than one dimension keep their shape
+    """
+
+    array = np.ascontiguousarray(array, dtype=np.dtype(dtype).newbyteorder("<"))
+    spec = {"dtype": DTYPES[np.dtype(dtype)], "bdata": base64.b64encode(array.tobytes()).decode("ascii")}
+    if array.ndim > 1:
+        spec["shape"] = ",".join(str(size) for size in array.shape)
+    return spec
+
+
+def decode_array(spec) -> np.ndarray:
+    """ inverse of encode_array, json lists are returned as arrays
+    """
+
+    if not isinstance(spec, dict):
+        return np.asarray(spec)
+    dtype = next(dtype for dtype, name in DTYPES.items() if name == spec["dtype"])
+    array = np.frombuffer(base64.b64decode(spec["bdata"]), dtype=dtype.newbyteorder("<"))
+    if "shape" in spec:
+        array = array.reshape([int(size) for size in spec["shape"].split(",")])
+    return array
+
+
+def encode_trace(trace : go.Mesh3d) -> go.Mesh3d:
+    """ returns the mesh trace with its positions (float32) and face indices (uint16/uint32)
+        as typed array specs
+    """
+
+    if isinstance(trace.x, dict):
+        return trace
+
+    index_dtype = get_index_dtype(len(trace.x))
+    # created without validation, the specs are passed through to the json as they are
+    return go.Mesh3d(
+        trace,
+        x=encode_array(trace.x, np.float32),
+        y=encode_array(trace.y, np.float32),
+        z=encode_array(trace.z, np.float32),
+        i=encode_array(trace.i, index_dtype),
+        j=encode_array(trace.j, index_dtype),
+        k=encode_array(trace.k, index_dtype),
+        _validate=False,
+    )
+
+
+def encode_traces(traces : List[go.Mesh3d]) -> List[go.Mesh3d]:
+    return [encode_trace(trace) for trace in traces]
@@ -0,0 +1,90 @@
+""" warmup of the process-wide caches and the readiness of the server
+
+    in production the caches are filled before the gunicorn master forks its workers (preload_app),
+    the workers then share the loaded meshes, steps and figures copy-on-write
+"""
+import gc
+import threading
+import time
+
+from flask import Flask, jsonify
+
+import config
+from figure_cache import figure_cache
+from layout_cache import layout_cache
+from mesh_warmup import get_step_part_names, warm_meshes
+
+
+class Readiness:
+    """ set once the caches are warm, /ready answers 503 until then
+    """
+
+    def __init__(self):
+        self._ready = threading.Event()
+        self.warmup_s = None
+        self.mesh_report = None
+        self.error = None
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait(self, timeout : float = None) -> bool:
+        """ blocks until the caches are warm, returns False on timeout
+        """
+
+        return self._ready.wait(timeout)
+
+    def set_ready(self, warmup_s : float):
+        self.warmup_s = warmup_s
+        self._ready.set()
+
+    def get_response(self):
+        if self.is_ready():
+            meshes = {key: value for key, value in (self.mesh_report or {}).items() if key != "part_s"}
+            return jsonify(status="ready", warmup_s=self.warmup_s, meshes=meshes)
+        status = "failed" if self.error else "warming up"
+        return jsonify(status=status, error=self.error), 503
+
+    def register_route(self, server : Flask):
+        server.add_url_rule("/ready", "ready", self.get_response)
+
+
+# shared by all requests of the process
+readiness = Readiness()
+
+
+def warm_caches(lod : int = config.DEFAULT_LOD):
+    """ reads the steps of all products, loads their part meshes (in parallel, see mesh_warmup.py)
+        and builds the page of the default product,
+        the figures of the default product are built if config.FIGURE_CACHE_WARMUP is set
+    """
+
+    start = time.perf_counter()
+    readiness.mesh_report = warm_meshes(get_step_part_names(), lod)
+    layout_cache.get(lod=lod)
+    if config.FIGURE_CACHE_WARMUP:
+        figure_cache.warm(lod)
+    return time.perf_counter() - start
+
+
+def warm_up(background : bool = False, freeze : bool = False):
+    """ fills the caches and then reports the server ready
+        background: warms in a thread, the server answers requests (slower) meanwhile
+        freeze: moves all objects created so far out of the garbage collector's reach, so the
+        collector of a forked worker does not write to (and thereby copy) the shared pages
+    """
+
+    def run():
+        try:
+            warmup_s = warm_caches()
+        except Exception as error:
+            readiness.error = repr(error)
+            raise
+        if freeze:
+            gc.freeze()
+        readiness.set_ready(warmup_s)
+
+    if background:
+        threading.Thread(target=run, name="warmup", daemon=True).start()
+    else:
+        run()
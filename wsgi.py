@@ -0,0 +1,12 @@
+""" production entry point, served by gunicorn with the settings of gunicorn.conf.py:
+        gunicorn -c gunicorn.conf.py wsgi:server
+    the app is created (and its caches warmed) once in the master process before the workers are forked
+"""
+import os
+
+os.environ.setdefault("APP_ENV", "prod")
+
+from app import create_app
+
+app = create_app()
+server = app.server